@@ -0,0 +1,3 @@
+"""
+Configuration of pytest: the tests import the packages of this directory (harmonisation, l_system) as the scripts do.
+"""
@@ -3,6 +3,7 @@ import math
 import music21.stream
 
 from l_system.rhythm_main import *
+from l_system.duration_grammar import rhythm_array
 from harmonisation.melody_toolkit import *
 
 """
@@ -15,9 +16,11 @@ signature into a 7/8. Then, the decision was later made to ease back into the *B
 """
 
 if __name__ == "__main__":
-    bolero_rhythm = sequence_from_string_bolero(run_bolero_for(3, False))
-    quarter_length = math.floor(len(bolero_rhythm)/4)
-    bolero_rhythm = bolero_rhythm[:quarter_length] + bolero_rhythm[3 * quarter_length:]
+    bolero_rhythm = rhythm_array(rules_bolero(), initial_bolero(), 3, grammar_bolero())
+    # First and last quarters of the bars
+    bolero_bars = BarIndex(bolero_rhythm, "3/4")
+    quarter_bars = math.floor(bolero_bars.nb_bars() / 4)
+    bolero_rhythm = bolero_bars.bars(1, quarter_bars) + bolero_bars.bars(3 * quarter_bars + 1, bolero_bars.nb_bars())
     length = int(len(bolero_rhythm))
     bolero_score = combine_voices(length, bolero_rhythm, [[7 for _ in range(length)]], inst=[instrument.Woodblock()],
                                   time_sig="3/4")
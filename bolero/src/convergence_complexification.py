@@ -3,19 +3,39 @@ import math
 import music21.stream
 
 from l_system.rhythm_main import *
+from l_system.duration_grammar import rhythm_array
 from harmonisation.melody_toolkit import *
+from harmonisation.segments import harmonise_segments
+from harmonisation.checkpoint import PieceJob, run_resumable, CHECKPOINT_INTERVAL
 
 
-def notes_array(tonality, bass, first_chord, length_composition):
+def notes_array(tonality, bass, first_chord, length_composition, parallel=False, processes=None,
+                checkpoint_path=None, checkpoint_interval=CHECKPOINT_INTERVAL):
     """
     Construct 4 parts
     :param tonality: Desired tonality
     :param bass: Bass line in the tonality
     :param first_chord: First chord in the composition
     :param length_composition
+    :param parallel: if True, the segments are harmonised independently in worker processes and then stitched
+    :param processes: number of worker processes in parallel mode, None for as many as CPUs
+    :param checkpoint_path: if given (serial mode only), the job is saved to this file every checkpoint_interval
+                            seconds and after every segment, and resumed from it if it already exists
+    :param checkpoint_interval: time between two checkpoints, in seconds
     :return: array of 4 voices of notes
     """
     voices_arrays = [[], [], [], []]
+    if parallel:
+        for path in harmonise_segments(tonality, [bass] * length_composition, first_chord, processes=processes):
+            path = to_arrays(path)
+            for i in range(4):
+                voices_arrays[i].extend(path[i])
+        return voices_arrays
+
+    if checkpoint_path is not None:
+        return run_resumable(checkpoint_path, lambda: PieceJob(tonality, bass, first_chord, length_composition),
+                             checkpoint_interval)
+
     next_start_chord = first_chord
     for j in range(length_composition):
         next_compos_tree = Node(next_start_chord, 1, [])
@@ -48,8 +68,7 @@ def combine_score_and_rhythm(curr_score: music21.stream.Score, curr_rhythm):
 if __name__ == "__main__":
 
     voices = converter.parse('midi/input_midis/3_16.mid')
-    string_res = run_complex_for(4)
-    sequence = sequence_from_string_complex(string_res)
+    sequence = rhythm_array(rules_complex(), initial_complex(), 4, grammar_complex())
     instruments = [instrument.Piano(), instrument.Piano(), instrument.Piano(), instrument.Piano()]
 
     score_comp = combine_score_and_rhythm(voices, sequence)
@@ -3,8 +3,8 @@ from convergence_complexification import *
 
 def generate_melody(key_melody, bass_melody, start_melody, length_melody, path_string):
     voices = notes_array(key_melody, bass_melody, start_melody, length_melody)
-    string_res = run_slow_for(4)
-    sequence = sequence_from_string_slow(string_res)
+    # run_slow_for runs rules_complex
+    sequence = rhythm_array(rules_complex(), initial_complex(), 4, grammar_slow())
     instruments = [instrument.Piano(), instrument.Piano(), instrument.Piano(), instrument.Piano()]
 
     parts = combine_voices(len(voices[0]), sequence, voices, inst=instruments, time_sig="3/4")
@@ -0,0 +1,233 @@
+import os
+import pickle
+from abc import ABC, abstractmethod
+import random
+import time
+from harmonisation.melody_toolkit import *
+
+"""
+Long harmonisation jobs that can be interrupted and resumed.
+
+``compose`` explores the chord tree recursively and ``notes_array`` chains the segments of a piece, so an interrupted
+run loses everything. Here the same computations are written as jobs that advance one step at a time, where the state
+between two steps (the tree built so far, the frontier of the nodes left to expand, the completed segments) is plain
+data. At regular intervals, the job is written to a checkpoint file together with the state of ``random`` and the
+``transition`` dictionary (which both influence what follows), so resuming from the checkpoint gives exactly the same
+result as a run that was never interrupted. The parameters of the job are saved as well, so that a checkpoint left by
+another job is not resumed by mistake.
+"""
+
+CHECKPOINT_INTERVAL = 60  # seconds between two checkpoints of a running job
+
+
+def save_checkpoint(path: str, job):
+    """
+    Writes a job to a checkpoint file. The file is replaced atomically, so an interruption while writing keeps the
+    previous checkpoint.
+
+    :param path: path of the checkpoint file
+    :param job: the job to save
+    """
+    snapshot = {"job": job, "parameters": job.parameters(), "random_state": random.getstate(),
+                "transition": transition}
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str, parameters=None):
+    """
+    Reads a job from a checkpoint file and restores the state of ``random`` and the ``transition`` dictionary.
+
+    :param path: path of the checkpoint file
+    :param parameters: if given, the parameters (see ResumableJob.parameters) that the saved job must have
+    :return: the saved job, None if there is no checkpoint or if it is the checkpoint of a job with other parameters
+             (then nothing is restored)
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as file:
+        snapshot = pickle.load(file)
+    if parameters is not None and snapshot.get("parameters") != parameters:
+        return None
+    random.setstate(snapshot["random_state"])
+    transition.clear()
+    transition.update(snapshot["transition"])
+    return snapshot["job"]
+
+
+class ResumableJob(ABC):
+    """
+    A computation made of steps, that can be saved to a checkpoint between two of them.
+    """
+
+    @abstractmethod
+    def parameters(self):
+        """
+        :return: what defines the job (comparable with ==), to recognise its checkpoints
+        """
+
+    @abstractmethod
+    def done(self):
+        """
+        :return: whether the job is finished
+        """
+
+    @abstractmethod
+    def step(self):
+        """
+        Advances the job by one step.
+
+        :return: whether a checkpoint should be written right away (e.g. after a segment is completed)
+        """
+
+    @abstractmethod
+    def result(self):
+        """
+        :return: the result of the finished job
+        """
+
+    def run(self, checkpoint_path: str = None, interval: float = CHECKPOINT_INTERVAL):
+        """
+        Runs the job until the end, writing it to checkpoint_path every interval seconds. The checkpoint is deleted
+        once the job is finished.
+
+        :param checkpoint_path: path of the checkpoint file, None to never write one
+        :param interval: time between two checkpoints, in seconds
+        :return: the result of the job
+        """
+        last_checkpoint = time.monotonic()
+        while not self.done():
+            milestone = self.step()
+            if checkpoint_path is not None and (milestone or time.monotonic() - last_checkpoint >= interval):
+                save_checkpoint(checkpoint_path, self)
+                last_checkpoint = time.monotonic()
+
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        return self.result()
+
+
+class CompositionJob(ResumableJob):
+    """
+    Equivalent of ``compose`` which builds the same chord tree, calling ``next_chords`` in the same order, but with an
+    explicit frontier instead of recursive calls.
+    """
+
+    def __init__(self, initial_chord: Chord, bass_line, tonality: Key, prev_cadence: bool = False):
+        """
+        :param initial_chord: initial chord
+        :param bass_line: bass line (a list of notes), without the note of the initial chord
+        :param tonality: key of the harmonization
+        :param prev_cadence: boolean that indicates whether the first chord of bass_line ends a cadence
+        """
+        self.initial_chord = initial_chord
+        self.bass_line = list(bass_line)
+        self.tonality = tonality
+        self.prev_cadence = prev_cadence
+        self.tree = Node(initial_chord, 1, [])
+
+        # Nodes left to expand, the last one first, with the position of their next note in the bass line and their
+        # prev_cadence argument
+        self.frontier = [(self.tree, 0, prev_cadence)] if len(self.bass_line) > 0 else []
+        self.expanded = 0
+
+    def parameters(self):
+        return "composition", self.initial_chord.to_list(), self.bass_line, self.tonality, self.prev_cadence
+
+    def done(self):
+        return len(self.frontier) == 0
+
+    def step(self):
+        node, position, prev_cadence = self.frontier.pop()
+        ton_value = self.tonality.value
+        bass_line = self.bass_line[position:]
+        self.expanded += 1
+
+        if len(bass_line) > 1:
+            next_cadence = len(bass_line) == 2 and bass_line[0] % 12 in (ton_value[DOMINANT], ton_value[LEADING_TONE],
+                                                                         ton_value[MEDIANT])
+            children = []
+            for chord in next_chords(node.root, bass_line[0], bass_line[1], prev_cadence, self.tonality):
+                child = Node(Chord(chord[0], chord[1], chord[2], chord[3]), node.depth + 1, [])
+                node.add_child(child)
+                children.append((child, position + 1, next_cadence))
+            # The first child is expanded first, as in the recursion of compose
+            self.frontier.extend(reversed(children))
+
+        else:
+            for chord in next_chords(node.root, bass_line[0], -1, prev_cadence, self.tonality):
+                node.add_child(Leaf(Chord(chord[0], chord[1], chord[2], chord[3]), node.depth + 1))
+        return False
+
+    def result(self):
+        return self.tree
+
+
+class PieceJob(ResumableJob):
+    """
+    Equivalent of the serial ``notes_array``: harmonises a bass line length_composition times, each segment starting
+    on the last chord of the previous one. A checkpoint is also written after every completed segment.
+    """
+
+    def __init__(self, tonality: Key, bass, first_chord: Chord, length_composition: int):
+        """
+        :param tonality: key of the harmonization
+        :param bass: bass line of a segment, the first note being the one of the starting chord
+        :param first_chord: first chord of the piece
+        :param length_composition: number of segments
+        """
+        self.tonality = tonality
+        self.bass = list(bass)
+        self.first_chord = first_chord
+        self.length_composition = length_composition
+
+        self.voices_arrays = [[], [], [], []]
+        self.completed_segments = 0
+        self.next_start_chord = first_chord
+        self.segment_job = None
+
+    def parameters(self):
+        return "piece", self.tonality, self.bass, self.first_chord.to_list(), self.length_composition
+
+    def done(self):
+        return self.completed_segments == self.length_composition
+
+    def step(self):
+        if self.segment_job is None:
+            self.segment_job = CompositionJob(self.next_start_chord, self.bass[1:], self.tonality)
+            return False
+        if not self.segment_job.done():
+            return self.segment_job.step()
+
+        path = select_path_in_tree_harm(len(self.bass), self.segment_job.result())
+        self.next_start_chord = path[-1]
+        path = to_arrays(path)
+        for i in range(4):
+            self.voices_arrays[i].extend(path[i])
+        self.completed_segments += 1
+        self.segment_job = None
+        return True
+
+    def result(self):
+        return self.voices_arrays
+
+
+def run_resumable(checkpoint_path: str, new_job, interval: float = CHECKPOINT_INTERVAL):
+    """
+    Resumes the job saved in checkpoint_path if it has the same parameters as new_job(), otherwise starts new_job()
+    (and a checkpoint of another job is overwritten).
+
+    :param checkpoint_path: path of the checkpoint file
+    :param new_job: function without arguments that creates the job
+    :param interval: time between two checkpoints, in seconds
+    :return: the result of the job
+    """
+    job = new_job()
+    saved_job = load_checkpoint(checkpoint_path, job.parameters())
+    if saved_job is not None:
+        job = saved_job
+    elif os.path.exists(checkpoint_path):
+        print("the checkpoint " + checkpoint_path + " belongs to another job, starting again")
+    return job.run(checkpoint_path, interval)
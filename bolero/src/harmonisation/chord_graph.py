@@ -0,0 +1,385 @@
+import random
+import time
+from harmonisation.harmonisation import *
+
+"""
+``compose`` stores every harmonisation of a bass line as a separate branch of a chord tree, so a chord reached by
+many different paths is expanded again on every one of them. Here we look at the same search space as a layered graph
+instead: layer ``i`` holds the chords that can harmonise ``bass_line[i]`` and the edges are the transitions accepted
+by ``filter_w_rules``. A (layer, chord) state is expanded only once, and counting, sampling or optimising over all the
+harmonisations becomes a dynamic programming pass over the states instead of a walk over the tree.
+
+As in ``compose``, the bass line does not contain the note of the starting chord.
+"""
+
+
+def cadence_flags(bass_line, tonality):
+    """
+    Computes, for each note of the bass line, the is_final_cadence argument that ``compose`` gives to ``next_chords``
+    when it chains that note.
+
+    :param bass_line: bass line (a list of notes), without the note of the starting chord
+    :param tonality: key of the harmonization
+    :return: list of booleans, one per note of the bass line
+    """
+    ton_value = tonality.value
+    flags = [False] * len(bass_line)
+    if len(bass_line) > 1:
+        penultimate = bass_line[-2] % 12
+        flags[-1] = penultimate == ton_value[DOMINANT] or penultimate == ton_value[LEADING_TONE] \
+            or penultimate == ton_value[MEDIANT]
+    return flags
+
+
+def voice_leading_cost(current_chord: Chord, next_chord: Chord):
+    """
+    Cost of a transition, in semitones: the sum of the movements of all the voices.
+
+    :param current_chord: the current chord
+    :param next_chord: the next chord
+    :return: the cost of chaining both chords
+    """
+    return sum(abs(next_note - current_note)
+               for current_note, next_note in zip(current_chord.to_list(), next_chord.to_list()))
+
+
+def candidate_voicings(bass_note: int, tonality: Key):
+    """
+    All the chords with bass_note at the bass whose notes belong to the chord of that degree and which respect the
+    voice ranges, i.e. every chord that can end a harmonisation on bass_note.
+
+    :param bass_note: the note of the bass
+    :param tonality: key of the harmonization
+    :return: list of chords
+    """
+    simple_chord = Chord.simple_of(bass_note, tonality.value)
+    tenors = [n for n in range(MIN_T, MAX_T + 1) if simple_chord.includes(n)]
+    altos = [n for n in range(MIN_A, MAX_A + 1) if simple_chord.includes(n)]
+    sopranos = [n for n in range(MIN_S, MAX_S + 1) if simple_chord.includes(n)]
+
+    voicings = []
+    for t, a, s in product(tenors, altos, sopranos):
+        chord = Chord(bass_note, t, a, s)
+        if chord.check_ranges():
+            voicings.append(chord)
+    return voicings
+
+
+def start_voicings(bass_note: int, tonality: Key, is_final_cadence: bool = False):
+    """
+    The candidate voicings of bass_note which respect the rules on a single chord (``CHORD_RULES``: ranges, doublings
+    and all the notes present), i.e. the chords that a transition accepted by ``filter_w_rules`` can give.
+
+    :param bass_note: the note of the bass
+    :param tonality: key of the harmonization
+    :param is_final_cadence: whether the chord ends a cadence (rule 0 allows more overtaking then)
+    :return: list of chords
+    """
+    return [chord for chord in candidate_voicings(bass_note, tonality)
+            if check_chord_rules(tuple(chord.to_list()), is_final_cadence, tonality.value)]
+
+
+class ChordGraph:
+    """
+    Layered graph of all the harmonisations of a bass line. States are (chord, layer) pairs where the chord
+    precedes bass_line[layer]; the starting chord precedes layer 0 and the chords of the last layer precede
+    layer len(bass_line).
+    """
+
+    def __init__(self, tonality: Key, bass_line, prev_cadence: bool = False):
+        """
+        :param tonality: key of the harmonization
+        :param bass_line: bass line (a list of notes), without the note of the starting chord
+        :param prev_cadence: boolean that indicates whether the first chord of bass_line ends a cadence
+        """
+        self.tonality = tonality
+        self.bass_line = list(bass_line)
+        self.cadences = cadence_flags(self.bass_line, tonality)
+        if len(self.bass_line) > 0:
+            self.cadences[0] = self.cadences[0] or prev_cadence
+
+        self.edges = {}
+        self.counts = {}
+        self.end_counts_memo = {}
+        self.end_costs_memo = {}
+        self.feasible_memo = {}
+
+    def __len__(self):
+        return len(self.bass_line)
+
+    def successors(self, chord: Chord, layer: int):
+        """
+        :param chord: the chord preceding bass_line[layer]
+        :param layer: index of the next note in the bass line
+        :return: tuple of all the chords which can follow chord on bass_line[layer]
+        """
+        key = (chord, layer)
+        options = self.edges.get(key)
+        if options is None:
+            options = tuple(self.next_options(chord, layer))
+            self.edges[key] = options
+        return options
+
+    def next_options(self, chord: Chord, layer: int):
+        """
+        Computes the transitions of a state (successors stores them). Subclasses can override it to harmonise with
+        other rules or another chord vocabulary.
+
+        :param chord: the chord preceding bass_line[layer]
+        :param layer: index of the next note in the bass line
+        :return: iterable of all the chords which can follow chord on bass_line[layer]
+        """
+        next_next_note = self.bass_line[layer + 1] if layer + 1 < len(self.bass_line) else -1
+        return [Chord.of_tuple(opt) for opt in
+                compute_next_chords(chord, self.bass_line[layer], next_next_note, self.cadences[layer], self.tonality)]
+
+    def count(self, chord: Chord, layer: int = 0):
+        """
+        Number of different harmonisations of bass_line[layer:] following chord (``level()`` of the equivalent tree).
+
+        :param chord: the chord preceding bass_line[layer]
+        :param layer: index of the next note in the bass line
+        :return: the number of harmonisations
+        """
+        if layer == len(self.bass_line):
+            return 1
+        key = (chord, layer)
+        total = self.counts.get(key)
+        if total is None:
+            total = sum(self.count(next_chord, layer + 1) for next_chord in self.successors(chord, layer))
+            self.counts[key] = total
+        return total
+
+    def feasible(self, chord: Chord, layer: int = 0):
+        """
+        Whether bass_line[layer:] has at least one harmonisation following chord. Stops at the first one found.
+
+        :param chord: the chord preceding bass_line[layer]
+        :param layer: index of the next note in the bass line
+        :return: boolean
+        """
+        if layer == len(self.bass_line):
+            return True
+        key = (chord, layer)
+        result = self.feasible_memo.get(key)
+        if result is None:
+            result = self.counts[key] > 0 if key in self.counts else \
+                any(self.feasible(next_chord, layer + 1) for next_chord in self.successors(chord, layer))
+            self.feasible_memo[key] = result
+        return result
+
+    def reachable_layers(self, start_chord: Chord):
+        """
+        Forward pass: the chords that can be reached on each note of the bass line, whether they lead to a complete
+        harmonisation or not. Stops after the first empty layer.
+
+        :param start_chord: the starting chord
+        :return: list of sets of chords, one per layer (shorter than the bass line if a layer is empty)
+        """
+        layers = []
+        current = {start_chord}
+        for layer in range(len(self.bass_line)):
+            current = {next_chord for chord in current for next_chord in self.successors(chord, layer)}
+            layers.append(current)
+            if len(current) == 0:
+                break
+        return layers
+
+    def viable_layers(self, start_chord: Chord):
+        """
+        The chords of each layer that are both reachable from start_chord and lead to a complete harmonisation.
+
+        :param start_chord: the starting chord
+        :return: list of sets of chords, one per layer (all empty if there is no harmonisation)
+        """
+        if not self.feasible(start_chord):
+            return [set() for _ in self.bass_line]
+        layers = []
+        current = {start_chord}
+        for layer in range(len(self.bass_line)):
+            current = {next_chord for chord in current for next_chord in self.successors(chord, layer)
+                       if self.feasible(next_chord, layer + 1)}
+            layers.append(current)
+        return layers
+
+    def end_counts(self, chord: Chord, layer: int = 0):
+        """
+        :param chord: the chord preceding bass_line[layer]
+        :param layer: index of the next note in the bass line
+        :return: dictionary from each reachable final chord to the number of harmonisations ending on it
+        """
+        if layer == len(self.bass_line):
+            return {chord: 1}
+        key = (chord, layer)
+        ends = self.end_counts_memo.get(key)
+        if ends is None:
+            ends = {}
+            for next_chord in self.successors(chord, layer):
+                for end, nb in self.end_counts(next_chord, layer + 1).items():
+                    ends[end] = ends.get(end, 0) + nb
+            self.end_counts_memo[key] = ends
+        return ends
+
+    def end_costs(self, chord: Chord, layer: int = 0):
+        """
+        :param chord: the chord preceding bass_line[layer]
+        :param layer: index of the next note in the bass line
+        :return: dictionary from each reachable final chord to the lowest voice leading cost of reaching it
+        """
+        if layer == len(self.bass_line):
+            return {chord: 0}
+        key = (chord, layer)
+        ends = self.end_costs_memo.get(key)
+        if ends is None:
+            ends = {}
+            for next_chord in self.successors(chord, layer):
+                step = voice_leading_cost(chord, next_chord)
+                for end, cost in self.end_costs(next_chord, layer + 1).items():
+                    if end not in ends or step + cost < ends[end]:
+                        ends[end] = step + cost
+            self.end_costs_memo[key] = ends
+        return ends
+
+    def sample_path(self, start_chord: Chord, end_chord: Chord = None, rng=random):
+        """
+        Draws one harmonisation uniformly among all of them (or among those ending on end_chord).
+
+        :param start_chord: the starting chord
+        :param end_chord: the final chord to reach, None if any final chord is allowed
+        :param rng: source of randomness, the ``random`` module or a ``random.Random``
+        :return: the path of chords, starting chord included; None if there is no harmonisation
+        """
+
+        def weight(chord, layer):
+            if end_chord is None:
+                return self.count(chord, layer)
+            return self.end_counts(chord, layer).get(end_chord, 0)
+
+        if weight(start_chord, 0) == 0:
+            return None
+
+        path = [start_chord]
+        for layer in range(len(self.bass_line)):
+            options = self.successors(path[-1], layer)
+            weights = [weight(next_chord, layer + 1) for next_chord in options]
+            path.append(rng.choices(options, weights)[0])
+        return path
+
+    def best_path(self, start_chord: Chord, end_chord: Chord = None):
+        """
+        Finds the harmonisation with the lowest voice leading cost (ending on end_chord if it is given).
+
+        :param start_chord: the starting chord
+        :param end_chord: the final chord to reach, None if any final chord is allowed
+        :return: the path of chords, starting chord included; None if there is no harmonisation
+        """
+        ends = self.end_costs(start_chord, 0)
+        if end_chord is None:
+            if len(ends) == 0:
+                return None
+            end_chord = min(ends, key=ends.get)
+        elif end_chord not in ends:
+            return None
+
+        path = [start_chord]
+        for layer in range(len(self.bass_line)):
+            current = path[-1]
+            best = None
+            for next_chord in self.successors(current, layer):
+                remaining = self.end_costs(next_chord, layer + 1).get(end_chord)
+                if remaining is not None:
+                    cost = voice_leading_cost(current, next_chord) + remaining
+                    if best is None or cost < best[0]:
+                        best = (cost, next_chord)
+            path.append(best[1])
+        return path
+
+
+def check_bass_line(tonality: Key, bass, start_chord: Chord):
+    """
+    Fast feasibility check of a harmonisation exercise, without building any chord tree.
+
+    :param tonality: key of the harmonization
+    :param bass: bass line, the first note being the one of the starting chord
+    :param start_chord: the starting chord
+    :return: a pair (feasible, position): whether bass can be harmonised from start_chord and, if not, the index in
+             bass of the first note that no chord reachable from start_chord can harmonise
+    """
+    graph = ChordGraph(tonality, bass[1:])
+    if graph.feasible(start_chord):
+        return True, None
+
+    # A harmonisation exists as soon as the last layer can be reached, so one of the layers is empty
+    return False, len(graph.reachable_layers(start_chord))
+
+
+def feasible_start_chords(tonality: Key, bass):
+    """
+    :param tonality: key of the harmonization
+    :param bass: bass line, the first note being the one of the starting chord
+    :return: list of all the voicings of the first note of bass which respect the rules on a single chord and from
+             which bass can be harmonised
+    """
+    graph = ChordGraph(tonality, bass[1:])
+    return [chord for chord in start_voicings(bass[0], tonality) if graph.feasible(chord)]
+
+
+def compose_anytime(tonality: Key, bass, start_chord: Chord, deadline_ms: float):
+    """
+    Anytime harmonisation: a depth-first search which always tries the smoothest transition first (so that the first
+    harmonisation is found greedily), remembers the states without any harmonisation and backtracks from them, then
+    keeps improving the voice leading cost of its best harmonisation (branch and bound) until the deadline.
+
+    :param tonality: key of the harmonization
+    :param bass: bass line, the first note being the one of the starting chord
+    :param start_chord: the starting chord
+    :param deadline_ms: time budget, in milliseconds
+    :return: a pair (path, exhaustive): the best harmonisation found (None if none was found) and whether the search
+             finished before the deadline, i.e. path is the best harmonisation (or there is none)
+    """
+    deadline = time.perf_counter() + deadline_ms / 1000
+    graph = ChordGraph(tonality, bass[1:])
+    path = [start_chord]
+    best = {"cost": None, "path": None}
+    dead = set()
+    timed_out = False
+
+    def search(layer, cost):
+        """
+        :return: True if the state has a harmonisation, False if it has none, None if it was not fully explored
+        """
+        nonlocal timed_out
+        if layer == len(graph):
+            if best["cost"] is None or cost < best["cost"]:
+                best["cost"] = cost
+                best["path"] = list(path)
+            return True
+        if time.perf_counter() > deadline:
+            timed_out = True
+            return None
+
+        chord = path[-1]
+        options = sorted(graph.successors(chord, layer), key=lambda next_chord: voice_leading_cost(chord, next_chord))
+        result = False
+        for next_chord in options:
+            step = voice_leading_cost(chord, next_chord)
+            if timed_out or (best["cost"] is not None and cost + step >= best["cost"]):
+                # The remaining options are not better than the best harmonisation (or there is no time left)
+                return True if result else None
+            if (next_chord, layer + 1) in dead:
+                continue
+
+            path.append(next_chord)
+            found = search(layer + 1, cost + step)
+            path.pop()
+
+            if found is False:
+                dead.add((next_chord, layer + 1))
+            elif found:
+                result = True
+            elif result is False:
+                result = None
+        return result
+
+    search(0, 0)
+    return best["path"], not timed_out
@@ -0,0 +1,257 @@
+import random
+from functools import lru_cache
+import harmonisation.harmonisation as harmonisation
+from harmonisation.chord_graph import *
+
+"""
+Harmonisation of figured basses, i.e. with chords in first and second inversion and seventh chords, while the rest of
+the harmonisation only uses root position triads (``SimplifiedChord``, whose fundamental is the bass).
+
+Generating the cartesian product of every voice and then filtering it, as ``complete_transition`` and
+``filter_w_rules`` do, would be much more expensive with this larger vocabulary. Instead:
+    - the voicings of each (bass note, figure) that respect the rules on a single chord are computed once and indexed
+      by their tenor, so a transition only looks at the voicings within EPSILON of the current chord;
+    - the rules between two chords are evaluated on these candidates only, using the roots of the FiguredChord and
+      not the bass;
+    - the search goes through a ChordGraph, where each (chord, position) state is expanded once.
+
+A figured bass is a list of (note, figure) pairs, the first one being the one of the starting chord.
+
+EPSILON, MAINTAIN_COMMON_NOTES and the ranges are read from ``harmonisation.harmonisation`` at call time (the star
+import only copies their values when this module is loaded), as ``next_chords`` reads them.
+"""
+
+# FIGURES AND THEIR (INVERSION, IS SEVENTH CHORD)
+FIGURES = {"5/3": (0, False),
+           "6": (1, False),
+           "6/3": (1, False),
+           "6/4": (2, False),
+           "7": (0, True),
+           "6/5": (1, True),
+           "4/3": (2, True),
+           "4/2": (3, True),
+           "2": (3, True)}
+
+
+# Class that represents the harmony of a figured bass note: its root, third, fifth and (for seventh chords) seventh,
+# in the range 0 to 11, and its inversion (the chord note at the bass).
+class FiguredChord:
+    def __init__(self, bass_note: int, figure: str, key_degrees: list):
+        inversion, has_seventh = FIGURES[figure]
+        ind_root = (key_degrees.index(bass_note % 12) - 2 * inversion) % 7
+
+        self.figure = figure
+        self.inversion = inversion
+        self.root = key_degrees[ind_root]
+        self.third = key_degrees[(ind_root + 2) % 7]
+        self.fifth = key_degrees[(ind_root + 4) % 7]
+        self.seventh = key_degrees[(ind_root + 6) % 7] if has_seventh else None
+
+    # Returns the notes (0 - 11) of the chord.
+    def notes(self):
+        notes = [self.root, self.third, self.fifth]
+        if self.seventh is not None:
+            notes.append(self.seventh)
+        return notes
+
+    # Returns the notes that every voicing must contain (the fifth of a seventh chord can be omitted).
+    def required_notes(self):
+        if self.seventh is not None:
+            return [self.root, self.third, self.seventh]
+        return [self.root, self.third, self.fifth]
+
+    # Determines whether the (simplified) given note is included in the chord
+    def includes(self, note: int):
+        return note % 12 in self.notes()
+
+
+def figured_chord_rule(current_chord_list, next_chord, current_harmony: FiguredChord, next_harmony: FiguredChord,
+                       next_next_root: int, key_degrees):
+    """
+    Rules between two chords that depend on their roots: the equivalents of rules 3 and 7 (which read the root from
+    the bass) for chords in any inversion, plus the resolution of sevenths.
+
+    :param current_chord_list: the list that represents the current chord
+    :param next_chord: the candidate next chord, as a tuple
+    :param current_harmony: FiguredChord of the current chord
+    :param next_harmony: FiguredChord of the next chord
+    :param next_next_root: root of the chord two positions ahead, -1 if there is not
+    :param key_degrees: the degrees of the key
+    :return: whether next_chord respects the rules
+    """
+    # RULE 3 : LEADING NOTE GOES TO TONIC IF CURRENT GRADE IS III, V OR VII AND THE FOLLOWING IS I, IV OR VI
+    leading_active = current_harmony.root in (key_degrees[DOMINANT], key_degrees[LEADING_TONE], key_degrees[MEDIANT]) \
+        and next_harmony.root in (key_degrees[TONIC], key_degrees[SUBDOMINANT], key_degrees[SUBMEDIANT])
+    if rule_active(3) and leading_active:
+        if not any(curr_note % 12 == key_degrees[LEADING_TONE] and next_chord[i] % 12 == key_degrees[TONIC]
+                   for i, curr_note in enumerate(current_chord_list)):
+            return False
+
+    # RULE 7 : THIRD DUPLICATION IS AUTHORISED WHEN THE DEGREE IS NOT I, IV AND V; AND IS MANDATORY FOR V -> VI AND
+    #          VI -> V IN MINOR TONALITIES (see rule_7)
+    if rule_active(7):
+        third_two_times = [note % 12 for note in next_chord].count(next_harmony.third) == 2
+        third_not_recom = next_harmony.root in (key_degrees[TONIC], key_degrees[SUBDOMINANT], key_degrees[DOMINANT])
+        v_vi = current_harmony.root == key_degrees[DOMINANT] and next_harmony.root == key_degrees[SUBMEDIANT]
+        vi_v_minor = next_harmony.root == key_degrees[SUBMEDIANT] and next_next_root == key_degrees[DOMINANT] \
+            and not is_major(key_degrees)
+        mandatory_third = v_vi or vi_v_minor
+        if not ((mandatory_third and third_two_times)
+                or (not mandatory_third and not (third_not_recom and third_two_times))):
+            return False
+
+    # SEVENTH RESOLUTION : THE SEVENTH GOES DOWN BY STEP WHEN THE HARMONY CHANGES
+    if current_harmony.seventh is not None and next_harmony.root != current_harmony.root:
+        for i, curr_note in enumerate(current_chord_list):
+            if curr_note % 12 == current_harmony.seventh and not 1 <= curr_note - next_chord[i] <= 2:
+                return False
+
+    return True
+
+
+def voicing_respects_rules(voicing, harmony: FiguredChord, key_degrees):
+    """
+    Rules on a single chord (equivalents of rules 1, 2, 4, 5 and 6 for any inversion): the voicing respects the ranges,
+    does not double the leading note nor the seventh, doubles the fifth only for VII and in second inversion (where
+    the fifth is at the bass), and contains the required notes of its harmony.
+
+    :param voicing: the chord, as a tuple
+    :param harmony: its FiguredChord
+    :param key_degrees: the degrees of the key
+    :return: whether the voicing respects the rules
+    """
+    simple_notes_list = [note % 12 for note in voicing]
+
+    if rule_active(1) and simple_notes_list.count(key_degrees[LEADING_TONE]) > 1:
+        return False
+    if rule_active(2) and not Chord.of_tuple(voicing).check_ranges():
+        return False
+    if rule_active(4) and any(simple_notes_list.count(note) > 2 for note in simple_notes_list):
+        return False
+    if rule_active(5):
+        fifth_doubled = simple_notes_list.count(harmony.fifth) == 2
+        must_double = harmony.inversion == 2 or (harmony.root == key_degrees[LEADING_TONE] and harmony.seventh is None)
+        if fifth_doubled != must_double or simple_notes_list.count(harmony.fifth) > 2:
+            return False
+        if harmony.seventh is not None and simple_notes_list.count(harmony.seventh) > 1:
+            return False
+    if rule_active(6) and any(note not in simple_notes_list for note in harmony.required_notes()):
+        return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def figured_voicings(bass_note: int, figure: str, tonality: Key, signature):
+    """
+    Index of all the voicings of a figured bass note respecting the rules on a single chord.
+
+    :param bass_note: the note of the bass
+    :param figure: the figure of the note
+    :param tonality: key of the harmonization
+    :param signature: rules_signature() at call time, so that changing the rules gives a new index
+    :return: dictionary from a tenor note to the list of (alto, soprano, voicing) with that tenor
+    """
+    key_degrees = tonality.value
+    harmony = FiguredChord(bass_note, figure, key_degrees)
+    tenors = [n for n in range(harmonisation.MIN_T, harmonisation.MAX_T + 1) if harmony.includes(n)]
+    altos = [n for n in range(harmonisation.MIN_A, harmonisation.MAX_A + 1) if harmony.includes(n)]
+    sopranos = [n for n in range(harmonisation.MIN_S, harmonisation.MAX_S + 1) if harmony.includes(n)]
+
+    by_tenor = {}
+    for t, a, s in product(tenors, altos, sopranos):
+        voicing = (bass_note, t, a, s)
+        if voicing_respects_rules(voicing, harmony, key_degrees):
+            by_tenor.setdefault(t, []).append((a, s, voicing))
+    return by_tenor
+
+
+def candidates_within_epsilon(current_chord: Chord, by_tenor, fixed=(-1, -1, -1)):
+    """
+    The indexed voicings whose upper voices are all within EPSILON of the current chord (the candidates that
+    ``complete_transition`` would have produced).
+
+    :param current_chord: the current chord
+    :param by_tenor: index of voicings, as returned by figured_voicings
+    :param fixed: the tenor, alto and soprano notes kept from the current chord, -1 for the undetermined ones (see
+    MAINTAIN_COMMON_NOTES in ``next_chords``)
+    :return: list of voicings, as tuples
+    """
+    epsilon = harmonisation.EPSILON
+    fixed_t, fixed_a, fixed_s = fixed
+    tenors = all_in_epsilon(current_chord.t) if fixed_t == -1 else (fixed_t,)
+    candidates = []
+    for t in tenors:
+        for a, s, voicing in by_tenor.get(t, ()):
+            if (a == fixed_a if fixed_a != -1 else abs(a - current_chord.a) <= epsilon) \
+                    and (s == fixed_s if fixed_s != -1 else abs(s - current_chord.s) <= epsilon):
+                candidates.append(voicing)
+    return candidates
+
+
+class FiguredChordGraph(ChordGraph):
+    """
+    ChordGraph of a figured bass, with inversions and seventh chords.
+    """
+
+    def __init__(self, tonality: Key, figured_bass):
+        """
+        :param tonality: key of the harmonization
+        :param figured_bass: list of (note, figure) pairs, the first one being the one of the starting chord
+        """
+        super().__init__(tonality, [note for note, figure in figured_bass[1:]])
+        key_degrees = tonality.value
+        self.figures = [figure for note, figure in figured_bass]
+        self.harmonies = [FiguredChord(note, figure, key_degrees) for note, figure in figured_bass]
+
+        # The final cadence is decided from the root of the penultimate chord instead of its bass
+        if len(figured_bass) > 2:
+            penultimate = self.harmonies[-2].root
+            self.cadences[-1] = penultimate in (key_degrees[DOMINANT], key_degrees[LEADING_TONE],
+                                                key_degrees[MEDIANT])
+
+    def next_options(self, chord: Chord, layer: int):
+        key_degrees = self.tonality.value
+        current_chord_list = chord.to_list()
+        current_harmony = self.harmonies[layer]
+        next_harmony = self.harmonies[layer + 1]
+        next_next_root = self.harmonies[layer + 2].root if layer + 2 < len(self.harmonies) else -1
+        is_final_cadence = self.cadences[layer]
+
+        by_tenor = figured_voicings(self.bass_line[layer], self.figures[layer + 1], self.tonality, rules_signature())
+
+        # As in next_chords, the common notes (but the leading note) are kept when the bass moves
+        fixed = (-1, -1, -1)
+        if harmonisation.MAINTAIN_COMMON_NOTES and chord.b != self.bass_line[layer]:
+            fixed = tuple(note if next_harmony.includes(note) and note % 12 != key_degrees[LEADING_TONE] else -1
+                          for note in current_chord_list[1:])
+
+        # Rules between two chords which do not depend on the roots, with the fallback of filter_w_rules: when rule 11
+        # is active but does not apply, rule 10 is applied even if it is not active
+        pair_rules = [RULES[n] for n in (0, 8, 9, 10) if rule_active(n)]
+        if rule_active(11):
+            if is_final_cadence and current_harmony.root != key_degrees[LEADING_TONE]:
+                pair_rules.append(rule_11)
+            elif not rule_active(10):
+                pair_rules.append(rule_10)
+
+        options = []
+        for next_chord in candidates_within_epsilon(chord, by_tenor, fixed):
+            if all(rule(current_chord_list, next_chord, next_next_root, is_final_cadence, key_degrees)
+                   for rule in pair_rules) \
+                    and figured_chord_rule(current_chord_list, next_chord, current_harmony, next_harmony,
+                                           next_next_root, key_degrees):
+                options.append(Chord.of_tuple(next_chord))
+        return options
+
+
+def harmonise_figured_bass(tonality: Key, figured_bass, start_chord: Chord, rng=random):
+    """
+    Draws one harmonisation of a figured bass uniformly among all of them.
+
+    :param tonality: key of the harmonization
+    :param figured_bass: list of (note, figure) pairs, the first one being the one of the starting chord
+    :param start_chord: the starting chord
+    :param rng: source of randomness, the ``random`` module or a ``random.Random``
+    :return: the path of chords, starting chord included; None if there is no harmonisation
+    """
+    return FiguredChordGraph(tonality, figured_bass).sample_path(start_chord, rng=rng)
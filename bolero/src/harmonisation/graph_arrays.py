@@ -0,0 +1,117 @@
+import numpy as np
+from harmonisation.chord_graph import *
+
+"""
+Choosing many harmonisations one after the other with ``select_path_in_tree_harm`` follows Python pointers node by
+node. Here the harmonisation graph of a bass line is exported, layer by layer, into NumPy arrays in CSR format
+(for each chord of a layer, the slice of its edges towards the next layer, with their weights), so that thousands of
+random walks can advance together, one layer at a time, with array operations only.
+"""
+
+COUNT_WEIGHTS = "count"  # every complete harmonisation has the same probability
+UNIFORM_WEIGHTS = "uniform"  # every next chord (leading to a complete harmonisation) has the same probability
+
+
+class LayeredCSR:
+    """
+    CSR export of a harmonisation graph. Layer 0 only holds the starting chord and layer i + 1 the chords of
+    bass_line[i] that lie on a complete harmonisation.
+
+    chords[i] is an (n_i, 4) array of the chords of layer i (bass, tenor, alto, soprano), and the edges from the
+    chord of row r of layer i are indices[i][indptr[i][r]:indptr[i][r + 1]] (rows of layer i + 1), with the
+    probabilities weights[i][indptr[i][r]:indptr[i][r + 1]].
+    """
+
+    def __init__(self, chords, indptr, indices, weights):
+        self.chords = chords
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+        # Cumulated probabilities of each row shifted by the row index: row r covers ]r, r + 1], which lets one
+        # searchsorted call choose the next edge of every walker at once
+        self.thresholds = []
+        for layer in range(len(indices)):
+            rows = np.repeat(np.arange(len(indptr[layer]) - 1), np.diff(indptr[layer]))
+            cumulated = np.cumsum(weights[layer])
+            row_starts = np.concatenate(([0.0], cumulated))[indptr[layer][:-1]]
+            thresholds = rows + cumulated - row_starts[rows]
+            thresholds[indptr[layer][1:] - 1] = np.arange(1, len(indptr[layer]))
+            self.thresholds.append(thresholds)
+
+    def __len__(self):
+        return len(self.chords)
+
+
+def export_csr(graph: ChordGraph, start_chord: Chord, weighting: str = COUNT_WEIGHTS):
+    """
+    Exports the harmonisations of a chord graph from start_chord into a LayeredCSR.
+
+    :param graph: the chord graph of the bass line
+    :param start_chord: the starting chord
+    :param weighting: COUNT_WEIGHTS or UNIFORM_WEIGHTS
+    :return: the LayeredCSR, None if there is no harmonisation
+    """
+    if not graph.feasible(start_chord):
+        return None
+
+    layers = [[start_chord]] + [list(layer) for layer in graph.viable_layers(start_chord)]
+    rows_of = [{chord: row for row, chord in enumerate(layer)} for layer in layers]
+
+    chords, indptr, indices, weights = [], [], [], []
+    for layer, layer_chords in enumerate(layers):
+        chords.append(np.array([chord.to_list() for chord in layer_chords], dtype=np.int64))
+        if layer == len(layers) - 1:
+            break
+
+        layer_indptr = [0]
+        layer_indices = []
+        layer_weights = []
+        for chord in layer_chords:
+            next_chords = [next_chord for next_chord in graph.successors(chord, layer)
+                           if next_chord in rows_of[layer + 1]]
+            if weighting == COUNT_WEIGHTS:
+                row_weights = [graph.count(next_chord, layer + 1) for next_chord in next_chords]
+            else:
+                row_weights = [1] * len(next_chords)
+            total = sum(row_weights)
+
+            layer_indices.extend(rows_of[layer + 1][next_chord] for next_chord in next_chords)
+            layer_weights.extend(weight / total for weight in row_weights)
+            layer_indptr.append(len(layer_indices))
+
+        indptr.append(np.array(layer_indptr, dtype=np.intp))
+        indices.append(np.array(layer_indices, dtype=np.intp))
+        weights.append(np.array(layer_weights, dtype=np.float64))
+
+    return LayeredCSR(chords, indptr, indices, weights)
+
+
+def sample_walks(csr: LayeredCSR, n_samples: int, seed=None):
+    """
+    Draws n_samples harmonisations at once by advancing all the random walks together, layer by layer.
+
+    :param csr: the exported harmonisation graph
+    :param n_samples: number of harmonisations to draw
+    :param seed: seed (or numpy.random.Generator) of the sampling
+    :return: (n_samples, length, 4) array of notes, where length is the length of the bass line starting chord
+             included, and the last axis holds the bass, tenor, alto and soprano
+    """
+    rng = np.random.default_rng(seed)
+    walks = np.empty((n_samples, len(csr), 4), dtype=np.int64)
+
+    rows = np.zeros(n_samples, dtype=np.intp)
+    walks[:, 0] = csr.chords[0][rows]
+    for layer in range(len(csr) - 1):
+        edges = np.searchsorted(csr.thresholds[layer], rows + rng.random(n_samples), side='right')
+        rows = csr.indices[layer][edges]
+        walks[:, layer + 1] = csr.chords[layer + 1][rows]
+    return walks
+
+
+def walk_to_arrays(walk):
+    """
+    :param walk: (length, 4) array of one harmonisation, as in the result of sample_walks
+    :return: list of the 4 voices, as returned by ``to_arrays``
+    """
+    return np.asarray(walk).T.tolist()
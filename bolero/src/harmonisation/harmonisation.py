@@ -1,5 +1,6 @@
 from itertools import product
 from enum import Enum
+from collections import OrderedDict
 
 """
 We decided to do the implementation from scratch, i.e. not to use ``music21`` library elements as notes or chords, 
@@ -365,6 +366,259 @@ class Empty(ChordTree):
         print("Empty")
 
 
+###########################################
+#              HARMONIC RULES             #
+###########################################
+
+# Each rule is a predicate on one candidate next_chord (a tuple), given the current chord (a list), the note that
+# represents the degree two positions ahead (-1 if there is not), whether next_chord is the final chord of a cadence
+# and the degrees of the key. Since every rule only looks at one candidate at a time, applying them one after the
+# other is the same as keeping the candidates accepted by all the active rules.
+
+# RULE 0 : NO BIG OVERTAKING BETWEEN VOICES
+def rule_0(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    # Intervals between adjacent voices
+    b_t_interval = next_chord[1] - next_chord[0]
+    t_a_interval = next_chord[2] - next_chord[1]
+    a_s_interval = next_chord[3] - next_chord[2]
+
+    # The allowed overtaking between voices depends on whether there is a cadence or not
+    not_big_overtake_b_t = b_t_interval >= OVERTAKING_NO_CADENCE if is_final_cadence else b_t_interval >= OVERTAKING_CADENCE
+    not_big_overtake_t_a = t_a_interval >= OVERTAKING_NO_CADENCE if is_final_cadence else t_a_interval >= OVERTAKING_CADENCE
+    not_big_overtake_a_s = a_s_interval >= OVERTAKING_NO_CADENCE if is_final_cadence else a_s_interval >= OVERTAKING_CADENCE
+
+    return not_big_overtake_b_t and not_big_overtake_t_a and not_big_overtake_a_s
+
+
+# RULE 1 : NO DUPLICATION OF THE LEADING NOTE
+def rule_1(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    ack = 0
+    for note in next_chord:
+        if note % 12 == key_degrees[LEADING_TONE]:
+            ack += 1
+    return 0 <= ack < 2
+
+
+# RULE 2 : CHORDS RESPECT CORRECT RANGES
+def rule_2(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    return Chord.of_tuple(next_chord).check_ranges()
+
+
+# RULE 3 : LEADING NOTE GOES TO TONIC IF CURRENT GRADE IS III, V OR VII
+#          AND THE FOLLOWING IS I, IV OR VI
+def rule_3(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    prev_fund = Chord.simple_of(current_chord_list[0], key_degrees).fundamental
+    current_fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
+
+    # Determines whether the leading notes is considered active (need to resolve)
+    leading_active = (prev_fund == key_degrees[DOMINANT] or prev_fund == key_degrees[LEADING_TONE] or prev_fund ==
+                      key_degrees[MEDIANT]) \
+                     and (current_fund == key_degrees[TONIC] or current_fund == key_degrees[SUBDOMINANT]
+                          or current_fund == key_degrees[SUBMEDIANT])
+
+    for i, curr_note in enumerate(current_chord_list):
+        if not leading_active or \
+                (curr_note % 12 == key_degrees[LEADING_TONE] and next_chord[i] % 12 == key_degrees[TONIC]
+                 and leading_active):
+            return True
+    return False
+
+
+# RULE 4 : A NOTE CANNOT APPEAR MORE THAT 2 TIMES IN A SAME CHORD
+def rule_4(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
+    correct_dupl = True
+
+    for note in simple_notes_list:
+        if simple_notes_list.count(note) > 2:
+            correct_dupl = False
+
+    return correct_dupl
+
+
+# RULE 5 : THE FIFTH NOTE HAS TO BE REPEATED FOR VII DEGREE AND CANNOT BE REPEATED OTHERWISE
+def rule_5(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
+    fifth = Chord.simple_of(next_chord[0], key_degrees).fifth
+    simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
+
+    if fund % 12 == key_degrees[LEADING_TONE]:
+        return simple_notes_list.count(fifth) == 2
+    return simple_notes_list.count(fifth) < 2
+
+
+# RULE 6 : ALL NOTES OF THE CHORD ARE PRESENT
+def rule_6(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    simple_next_chord = Chord.simple_of(next_chord[0], key_degrees)
+    simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
+
+    return simple_next_chord.fundamental in simple_notes_list and simple_next_chord.third in simple_notes_list \
+        and simple_next_chord.fifth in simple_notes_list
+
+
+# RULE 7 : THIRD DUPLICATION IS AUTHORISED WHEN THE DEGREE IS NOT I, IV AND V; AND IS MANDATORY WHEN
+#               V -> VI chaining in major and minor tonalities (3rd duplicated in VI)
+#               VI -> V chaining in minor tonality (3rd duplicated in VI)
+#               VII -> I (already implemented because of the 1st and 5st rules, 3rd dup. in VII)
+def rule_7(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    prev_fund = Chord.simple_of(current_chord_list[0], key_degrees).fundamental
+    next_fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
+    third = Chord.simple_of(next_chord[0], key_degrees).third
+    simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
+
+    third_two_times = simple_notes_list.count(third) == 2
+
+    # Third duplication not recommended
+    third_not_recom = next_fund == key_degrees[TONIC] or next_fund == key_degrees[SUBDOMINANT] \
+                      or next_fund == key_degrees[DOMINANT]
+
+    # V -> VI chaining in major and minor tonalities (3rd dup. in VI)
+    v_vi = prev_fund == key_degrees[DOMINANT] and next_fund == key_degrees[SUBMEDIANT]
+
+    # VI -> V chaining in minor tonality (3rd dup. in VI)
+    vi_v_minor = next_fund == key_degrees[SUBMEDIANT] and \
+                 next_next_degree == key_degrees[DOMINANT] and not is_major(key_degrees)
+
+    mandatory_third = v_vi or vi_v_minor
+
+    return (mandatory_third and third_two_times) or (not mandatory_third and not (third_not_recom and third_two_times))
+
+
+# RULE 8 : FOURTH AUGMENTED INTERVAL NOT ALLOWED
+def rule_8(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    has_augm_interval = False
+    for i, current_note_i in enumerate(current_chord_list):
+
+        # Current note (and next note) are the leading note
+        current_note_leading = current_note_i % 12 == key_degrees[LEADING_TONE]
+        next_note_leading = next_chord[i] % 12 == key_degrees[LEADING_TONE]
+
+        # Ascending augmented forth interval
+        aug_forth_asc = current_note_i % 12 == key_degrees[SUBDOMINANT] and \
+                        next_note_leading and \
+                        next_chord[i] - current_note_i == 6
+
+        # Descending augmented forth interval
+        aug_forth_des = current_note_leading and \
+                        next_chord[i] % 12 == key_degrees[SUBDOMINANT] and \
+                        current_note_i - next_chord[i] == 6
+
+        # Ascending augmented second interval
+        aug_second_asc = current_note_i % 12 == key_degrees[SUBMEDIANT] and \
+                         next_note_leading and \
+                         next_chord[i] - current_note_i == 3
+
+        # Descending augmented second interval
+        aug_second_des = current_note_leading and \
+                         next_chord[i] % 12 == key_degrees[SUBDOMINANT] and \
+                         current_note_i - next_chord[i] == 3
+
+        # Ascending augmented fifth interval
+        aug_fifth_asc = current_note_i % 12 == key_degrees[MEDIANT] and \
+                        next_note_leading and \
+                        next_chord[i] - current_note_i == 8
+
+        # Descending augmented fifth interval
+        aug_fifth_des = current_note_leading and \
+                        next_chord[i] % 12 == key_degrees[MEDIANT] and \
+                        current_note_i - next_chord[i] == 8
+
+        # If the key is major, augmented intervals can only be fourths
+        if is_major(key_degrees):
+            if aug_forth_asc or aug_forth_des:
+                has_augm_interval = True
+
+        # If the key is minor, augmented intervals can be fourths, fifths and seconds
+        else:
+            if aug_forth_asc or aug_forth_des or aug_second_asc or aug_second_des \
+                    or aug_fifth_asc or aug_fifth_des:
+                has_augm_interval = True
+
+    return not has_augm_interval
+
+
+# RULE 9 : TWO CONSECUTIVE FOURTHS, FIFTHS AND OCTAVES ARE NOT ALLOWED
+def rule_9(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    # Compares for the not allowed consecutive intervals between the two chords
+    # for all the possible pairs of voices (voice i and a higher voice j)
+    for i, note_current_i in enumerate(current_chord_list):
+        for j in range(i, 4):
+            if i != j:
+                # There is no common note
+                mov = current_chord_list[j] != next_chord[j] or note_current_i != next_chord[i]
+
+                interval_current = (current_chord_list[j] - note_current_i) % 12
+                interval_next = (next_chord[j] - next_chord[i]) % 12
+                if interval_current == interval_next and mov and \
+                        (interval_current == UNISON or interval_current == PERFECT_FOURTH_INTERVAL or
+                         interval_current == PERFECT_FIFTH_INTERVAL):
+                    return False
+    return True
+
+
+# RULE 10 : DIRECT FOURTHS, FIFTHS AND OCTAVES ARE NOT ALLOWED
+def rule_10(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    # Compares for the not allowed direct intervals between the two chords
+    # for all the possible pairs of voices (voice i and a higher voice j)
+    for i, note_current_i in enumerate(current_chord_list):
+        for j in range(i, 4):
+            if i != j:
+
+                # An interval is considered direct if both voices change in the same direction
+                # and both for more of a tone
+                interval_next = (next_chord[j] - next_chord[i]) % 12
+                change_chords_i = next_chord[i] - note_current_i
+                change_chords_j = next_chord[j] - current_chord_list[j]
+
+                if ((change_chords_i > 2 and change_chords_j > 2) or (
+                        change_chords_i < -2 and change_chords_j < -2)) \
+                        and (interval_next == UNISON or interval_next == PERFECT_FOURTH_INTERVAL
+                             or interval_next == PERFECT_FIFTH_INTERVAL):
+                    return False
+    return True
+
+
+# RULE 11 : LEADING NOTE AND TONIC NOTE IN THE SOPRANO IF IT IS THE FINAL CADENCE
+def rule_11(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees):
+    return current_chord_list[3] % 12 == key_degrees[LEADING_TONE] and next_chord[3] % 12 == key_degrees[TONIC]
+
+
+# Rule 11 only constrains the final cadence, when the current bass is not the leading note. Otherwise, an active rule 11
+# keeps the chords which pass rule 10, even if rule 10 itself is not active.
+def rule_11_applies(current_chord_list, is_final_cadence, key_degrees):
+    return is_final_cadence and current_chord_list[0] % 12 != key_degrees[LEADING_TONE]
+
+
+RULES = [rule_0, rule_1, rule_2, rule_3, rule_4, rule_5, rule_6, rule_7, rule_8, rule_9, rule_10, rule_11]
+
+# Rules which only look at the next chord (and rule 0 at is_final_cadence), so that they can check a chord on its own
+CHORD_RULES = (0, 1, 2, 4, 5, 6)
+
+# Parameters, besides its RULE_n_ACTIVE constant, on which the result of a rule depends
+RULE_PARAMETERS = {0: ("OVERTAKING_CADENCE", "OVERTAKING_NO_CADENCE"),
+                   2: ("MIN_B", "MAX_B", "MIN_T", "MAX_T", "MIN_A", "MAX_A", "MIN_S", "MAX_S")}
+
+
+# Returns whether the n-th rule is active, reading the RULE_n_ACTIVE constant at call time.
+def rule_active(n: int):
+    return globals()["RULE_{}_ACTIVE".format(n)]
+
+
+# Returns whether the chord (a tuple) is accepted by the active rules of CHORD_RULES, e.g. for a starting chord.
+def check_chord_rules(chord, is_final_cadence, key_degrees):
+    return all(RULES[n](chord, chord, -1, is_final_cadence, key_degrees) for n in CHORD_RULES if rule_active(n))
+
+
+# Returns the current values of the parameters the n-th rule depends on.
+def rule_parameters(n: int):
+    return tuple(globals()[name] for name in RULE_PARAMETERS.get(n, ()))
+
+
+# Returns the current state of every rule switch and rule parameter.
+def rules_signature():
+    return tuple((rule_active(n), rule_parameters(n)) for n in range(len(RULES)))
+
+
 ###########################################
 #          HARMONISATION METHODS          #
 ###########################################
@@ -427,266 +681,106 @@ def filter_w_rules(current_chord_list, options, next_next_degree, is_final_caden
     """
     key_degrees = key_rules_input.value
 
+    def apply(rule, chords):
+        return {next_chord for next_chord in chords
+                if rule(current_chord_list, next_chord, next_next_degree, is_final_cadence, key_degrees)}
+
     # The temporary set that changes with respect to the rules
     temp = options.copy()
-    ##############################################
-    # RULE 0 : NO BIG OVERTAKING BETWEEN VOICES
-    temp0 = set()
-    for next_chord in temp:
-
-        # Intervals between adjacent voices
-        b_t_interval = next_chord[1] - next_chord[0]
-        t_a_interval = next_chord[2] - next_chord[1]
-        a_s_interval = next_chord[3] - next_chord[2]
-
-        # The allowed overtaking between voices depends on whether there is a cadence or not
-        not_big_overtake_b_t = b_t_interval >= OVERTAKING_NO_CADENCE if is_final_cadence else b_t_interval >= OVERTAKING_CADENCE
-        not_big_overtake_t_a = t_a_interval >= OVERTAKING_NO_CADENCE if is_final_cadence else t_a_interval >= OVERTAKING_CADENCE
-        not_big_overtake_a_s = a_s_interval >= OVERTAKING_NO_CADENCE if is_final_cadence else a_s_interval >= OVERTAKING_CADENCE
-
-        if not_big_overtake_b_t and not_big_overtake_t_a and not_big_overtake_a_s:
-            temp0.add(next_chord)
-    temp = temp0 if RULE_0_ACTIVE else temp
-
-    ##############################################
-    # RULE 1 : NO DUPLICATION OF THE LEADING NOTE
-    temp1 = set()
-    for next_chord in temp:
-        ack = 0
-        for note in next_chord:
-            if note % 12 == key_degrees[LEADING_TONE]:
-                ack += 1
-        if 0 <= ack < 2:
-            temp1.add(next_chord)
-    temp = temp1 if RULE_1_ACTIVE else temp
-
-    ##############################################
-    # RULE 2 : CHORDS RESPECT CORRECT RANGES
-    temp2 = set()
-    for next_chord in temp:
-        if Chord.of_tuple(next_chord).check_ranges():
-            temp2.add(next_chord)
-    temp = temp2 if RULE_2_ACTIVE else temp
-
-    ####################################################################
-    # RULE 3 : LEADING NOTE GOES TO TONIC IF CURRENT GRADE IS III, V OR VII
-    #          AND THE FOLLOWING IS I, IV OR VI
-    temp3 = set()
-    for next_chord in temp:
-
-        prev_fund = Chord.simple_of(current_chord_list[0], key_degrees).fundamental
-        current_fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
-
-        # Determines whether the leading notes is considered active (need to resolve)
-        leading_active = (prev_fund == key_degrees[DOMINANT] or prev_fund == key_degrees[LEADING_TONE] or prev_fund ==
-                          key_degrees[MEDIANT]) \
-                         and (current_fund == key_degrees[TONIC] or current_fund == key_degrees[SUBDOMINANT]
-                              or current_fund == key_degrees[SUBMEDIANT])
-
-        for i, curr_note in enumerate(current_chord_list):
-            if not leading_active or \
-                    (curr_note % 12 == key_degrees[LEADING_TONE] and next_chord[i] % 12 == key_degrees[TONIC]
-                     and leading_active):
-                temp3.add(next_chord)
-    temp = temp3 if RULE_3_ACTIVE else temp
-
-    ##################################################################
-    # RULE 4 : A NOTE CANNOT APPEAR MORE THAT 2 TIMES IN A SAME CHORD
-    temp4 = set()
-    for next_chord in temp:
-        simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
-        correct_dupl = True
-
-        for note in simple_notes_list:
-            if simple_notes_list.count(note) > 2:
-                correct_dupl = False
-
-        if correct_dupl:
-            temp4.add(next_chord)
-    temp = temp4 if RULE_4_ACTIVE else temp
-
-    #############################################################################################
-    # RULE 5 : THE FIFTH NOTE HAS TO BE REPEATED FOR VII DEGREE AND CANNOT BE REPEATED OTHERWISE
-    temp5 = set()
-    for next_chord in temp:
-        fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
-        fifth = Chord.simple_of(next_chord[0], key_degrees).fifth
-        simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
-
-        if fund % 12 == key_degrees[LEADING_TONE]:
-            if simple_notes_list.count(fifth) == 2:
-                temp5.add(next_chord)
-        elif simple_notes_list.count(fifth) < 2:
-            temp5.add(next_chord)
-    temp = temp5 if RULE_5_ACTIVE else temp
-
-    ##############################################
-    # RULE 6 : ALL NOTES OF THE CHORD ARE PRESENT
-    temp6 = set()
-    for next_chord in temp:
-        simple_next_chord = Chord.simple_of(next_chord[0], key_degrees)
-        simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
-
-        if simple_next_chord.fundamental in simple_notes_list and simple_next_chord.third in simple_notes_list \
-                and simple_next_chord.fifth in simple_notes_list:
-            temp6.add(next_chord)
-    temp = temp6 if RULE_6_ACTIVE else temp
-
-    ########################################################################################################
-    # RULE 7 : THIRD DUPLICATION IS AUTHORISED WHEN THE DEGREE IS NOT I, IV AND V; AND IS MANDATORY WHEN
-    #               V -> VI chaining in major and minor tonalities (3rd duplicated in VI)
-    #               VI -> V chaining in minor tonality (3rd duplicated in VI)
-    #               VII -> I (already implemented because of the 1st and 5st rules, 3rd dup. in VII)
-    temp7 = set()
-    for next_chord in temp:
-        prev_fund = Chord.simple_of(current_chord_list[0], key_degrees).fundamental
-        next_fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
-        third = Chord.simple_of(next_chord[0], key_degrees).third
-        simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
-
-        third_two_times = simple_notes_list.count(third) == 2
-
-        # Third duplication not recommended
-        third_not_recom = next_fund == key_degrees[TONIC] or next_fund == key_degrees[SUBDOMINANT] \
-                          or next_fund == key_degrees[DOMINANT]
-
-        # V -> VI chaining in major and minor tonalities (3rd dup. in VI)
-        v_vi = prev_fund == key_degrees[DOMINANT] and next_fund == key_degrees[SUBMEDIANT]
-
-        # VI -> V chaining in minor tonality (3rd dup. in VI)
-        vi_v_minor = next_fund == key_degrees[SUBMEDIANT] and \
-                     next_next_degree == key_degrees[DOMINANT] and not is_major(key_degrees)
-
-        mandatory_third = v_vi or vi_v_minor
-
-        if (mandatory_third and third_two_times) or (not mandatory_third and not (third_not_recom and third_two_times)):
-            temp7.add(next_chord)
-    temp = temp7 if RULE_7_ACTIVE else temp
-
-    #################################################
-    # RULE 8 : FOURTH AUGMENTED INTERVAL NOT ALLOWED
-    temp8 = set()
-    for next_chord in temp:
-
-        has_augm_interval = False
-        for i, current_note_i in enumerate(current_chord_list):
-
-            # Current note (and next note) are the leading note
-            current_note_leading = current_note_i % 12 == key_degrees[LEADING_TONE]
-            next_note_leading = next_chord[i] % 12 == key_degrees[LEADING_TONE]
-
-            # Ascending augmented forth interval
-            aug_forth_asc = current_note_i % 12 == key_degrees[SUBDOMINANT] and \
-                            next_note_leading and \
-                            next_chord[i] - current_note_i == 6
-
-            # Descending augmented forth interval
-            aug_forth_des = current_note_leading and \
-                            next_chord[i] % 12 == key_degrees[SUBDOMINANT] and \
-                            current_note_i - next_chord[i] == 6
-
-            # Ascending augmented second interval
-            aug_second_asc = current_note_i % 12 == key_degrees[SUBMEDIANT] and \
-                             next_note_leading and \
-                             next_chord[i] - current_note_i == 3
-
-            # Descending augmented second interval
-            aug_second_des = current_note_leading and \
-                             next_chord[i] % 12 == key_degrees[SUBDOMINANT] and \
-                             current_note_i - next_chord[i] == 3
-
-            # Ascending augmented fifth interval
-            aug_fifth_asc = current_note_i % 12 == key_degrees[MEDIANT] and \
-                            next_note_leading and \
-                            next_chord[i] - current_note_i == 8
-
-            # Descending augmented fifth interval
-            aug_fifth_des = current_note_leading and \
-                            next_chord[i] % 12 == key_degrees[MEDIANT] and \
-                            current_note_i - next_chord[i] == 8
-
-            # If the key is major, augmented intervals can only be fourths
-            if is_major(key_degrees):
-                if aug_forth_asc or aug_forth_des:
-                    has_augm_interval = True
-
-            # If the key is minor, augmented intervals can be fourths, fifths and seconds
-            else:
-                if aug_forth_asc or aug_forth_des or aug_second_asc or aug_second_des \
-                        or aug_fifth_asc or aug_fifth_des:
-                    has_augm_interval = True
-
-        if not has_augm_interval:
-            temp8.add(next_chord)
-    temp = temp8 if RULE_8_ACTIVE else temp
-
-    #########################################################################
-    # RULE 9 : TWO CONSECUTIVE FOURTHS, FIFTHS AND OCTAVES ARE NOT ALLOWED
-    temp9 = set()
-    for next_chord in temp:
-        interval_problem = False
-
-        # Compares for the not allowed consecutive intervals between the two chords
-        # for all the possible pairs of voices (voice i and a higher voice j)
-        for i, note_current_i in enumerate(current_chord_list):
-            for j in range(i, 4):
-                if i != j:
-                    # There is no common note
-                    mov = current_chord_list[j] != next_chord[j] or note_current_i != next_chord[i]
-
-                    interval_current = (current_chord_list[j] - note_current_i) % 12
-                    interval_next = (next_chord[j] - next_chord[i]) % 12
-                    if interval_current == interval_next and mov and \
-                            (interval_current == UNISON or interval_current == PERFECT_FOURTH_INTERVAL or
-                             interval_current == PERFECT_FIFTH_INTERVAL):
-                        interval_problem = True
-        if not interval_problem:
-            temp9.add(next_chord)
-    temp = temp9 if RULE_9_ACTIVE else temp
-
-    #########################################################################
-    # RULE 10 : DIRECT FOURTHS, FIFTHS AND OCTAVES ARE NOT ALLOWED
-    temp10 = set()
-    for next_chord in temp:
-        interval_problem = False
-
-        # Compares for the not allowed direct intervals between the two chords
-        # for all the possible pairs of voices (voice i and a higher voice j)
-        for i, note_current_i in enumerate(current_chord_list):
-            for j in range(i, 4):
-                if i != j:
-
-                    # An interval is considered direct if both voices change in the same direction
-                    # and both for more of a tone
-                    interval_next = (next_chord[j] - next_chord[i]) % 12
-                    change_chords_i = next_chord[i] - note_current_i
-                    change_chords_j = next_chord[j] - current_chord_list[j]
-
-                    if ((change_chords_i > 2 and change_chords_j > 2) or (
-                            change_chords_i < -2 and change_chords_j < -2)) \
-                            and (interval_next == UNISON or interval_next == PERFECT_FOURTH_INTERVAL
-                                 or interval_next == PERFECT_FIFTH_INTERVAL):
-                        interval_problem = True
-
-        if not interval_problem:
-            temp10.add(next_chord)
-    temp = temp10 if RULE_10_ACTIVE else temp
-
-    ###################################################################################
-    # RULE 11 : LEADING NOTE AND TONIC NOTE IN THE SOPRANO IF IT IS THE FINAL CADENCE
-    temp11 = set()
-    if (not is_final_cadence) or current_chord_list[0] % 12 == key_degrees[LEADING_TONE]:
-        temp11 = temp10
-    else:
-        for next_chord in temp:
-            if current_chord_list[3] % 12 == key_degrees[LEADING_TONE] and next_chord[3] % 12 == key_degrees[TONIC]:
-                temp11.add(next_chord)
-    temp = temp11 if RULE_11_ACTIVE else temp
+    for n in range(11):
+        if rule_active(n):
+            temp = apply(RULES[n], temp)
+
+    if RULE_11_ACTIVE:
+        if rule_11_applies(current_chord_list, is_final_cadence, key_degrees):
+            temp = apply(rule_11, temp)
+        elif not RULE_10_ACTIVE:
+            temp = apply(rule_10, temp)
 
     return temp
 
 
+class TransitionMasks:
+    """
+    Candidates of a transition (before any rule is applied) with, for each rule, the bit mask of the candidates that
+    pass it. A rule is only evaluated on the candidates that are still needed, so after toggling a rule (or changing
+    its parameters), the new survivors are found by combining the stored masks instead of filtering everything again.
+    """
+
+    def __init__(self, current_chord_list, candidates, next_next_degree, is_final_cadence, key_rules_input):
+        """
+        :param current_chord_list: the list that represents the current chord
+        :param candidates: the set of all the possible chords for the next chord
+        :param next_next_degree: the note that represents the degree two positions ahead, -1 if there is not
+        :param is_final_cadence: boolean that determines if the next_chord is the final chord of a cadence
+        :param key_rules_input: the key
+        """
+        self.current_chord_list = current_chord_list
+        self.candidates = tuple(candidates)
+        self.next_next_degree = next_next_degree
+        self.is_final_cadence = is_final_cadence
+        self.key_degrees = key_rules_input.value
+
+        # (rule, parameters) -> (bits of the candidates that pass the rule, bits of the candidates evaluated)
+        self.masks = {}
+
+    def filter(self, n: int, alive: int):
+        """
+        :param n: index of the rule
+        :param alive: bits of the candidates to filter
+        :return: bits of the candidates of alive which pass the n-th rule
+        """
+        key = (n, rule_parameters(n))
+        passed, known = self.masks.get(key, (0, 0))
+
+        unknown = alive & ~known
+        while unknown:
+            lowest = unknown & -unknown
+            i = lowest.bit_length() - 1
+            if RULES[n](self.current_chord_list, self.candidates[i], self.next_next_degree, self.is_final_cadence,
+                        self.key_degrees):
+                passed |= lowest
+            known |= lowest
+            unknown ^= lowest
+
+        self.masks[key] = (passed, known)
+        return alive & passed
+
+    def survivors(self):
+        """
+        :return: set of the candidates accepted by the currently active rules (same result as filter_w_rules)
+        """
+        alive = (1 << len(self.candidates)) - 1
+        for n in range(11):
+            if rule_active(n):
+                alive = self.filter(n, alive)
+
+        if RULE_11_ACTIVE:
+            if rule_11_applies(self.current_chord_list, self.is_final_cadence, self.key_degrees):
+                alive = self.filter(11, alive)
+            elif not RULE_10_ACTIVE:
+                alive = self.filter(10, alive)
+
+        return {candidate for i, candidate in enumerate(self.candidates) if alive >> i & 1}
+
+
+# Number of transitions whose TransitionMasks are kept, the least recently used ones being forgotten first
+TRANSITION_MASKS_SIZE = 100000
+
+# Dictionary from a transition (and the parameters used to generate its candidates) to its TransitionMasks
+transition_masks = OrderedDict()
+
+
+def clear_transition_masks():
+    """
+    Forgets all the stored candidates and masks (and the transition dictionary, which depends on the rules).
+    """
+    transition_masks.clear()
+    transition.clear()
+
+
 # Dictionary that includes transitions from a chord and a the next bass note to all the possible next chords
+# (for the rule switches and parameters of the time they were computed)
 transition = {}
 
 
@@ -703,15 +797,46 @@ def next_chords(current_chord: Chord, next_note: int, next_next_note: int, is_fi
     """
     global transition
 
-    options = transition.get((current_chord, next_note))
+    transition_key = (current_chord, next_note, rules_signature())
+    options = transition.get(transition_key)
 
     # If the transition is already computed, it uses it and does not again the computation (dynamic programming)
     if options is not None and not is_final_cadence:
         return options
 
     else:
-        options = set()
+        options = compute_next_chords(current_chord, next_note, next_next_note, is_final_cadence, key_for_chords)
+
+        if is_final_cadence:
+            # Adds the current transition to the global dictionary
+            transition[transition_key] = options
+        return options
+
+
+def compute_next_chords(current_chord: Chord, next_note: int, next_next_note: int, is_final_cadence: bool,
+                        key_for_chords: Key):
+    """
+    Computes all the possible next chords for the next note, without looking them up in (nor storing them into)
+    the ``transition`` dictionary. The result only depends on the arguments and the parameters above.
+
+    The candidates of the transition and the rule masks computed on them are kept in ``transition_masks``, so that
+    calling it again after changing some rule switches only evaluates the rules on the candidates that need it. Only
+    the TRANSITION_MASKS_SIZE most recently used transitions are kept (clear_transition_masks forgets all of them).
 
+    :param current_chord: the current chord
+    :param next_note: the next note from the bass to chain
+    :param next_next_note: the following note of the next note
+    :param is_final_cadence: boolean that indicates if it is the final cadence
+    :param key_for_chords: the key of the harmonization
+    :return: the tuple of all the possible next_chords (as tuples) for the next note
+    """
+    masks_key = (current_chord, next_note, next_next_note, is_final_cadence, key_for_chords, EPSILON,
+                 MAINTAIN_COMMON_NOTES)
+    masks = transition_masks.get(masks_key)
+
+    if masks is not None:
+        transition_masks.move_to_end(masks_key)
+    else:
         current_chord_list = current_chord.to_list()
         # Already copies the bass note
         next_chord_list = [next_note]
@@ -720,9 +845,7 @@ def next_chords(current_chord: Chord, next_note: int, next_next_note: int, is_fi
         # If the constant MAINTAIN_COMMON_NOTES is true, we keep the common notes in the following chord if possible
         # For the undetermined notes, it adds -1
         if MAINTAIN_COMMON_NOTES:
-            if current_chord.fundamental() == next_note:
-                options.add(tuple(current_chord.to_list()))
-            else:
+            if current_chord.fundamental() != next_note:
                 for note in current_chord_list[1:]:
                     if next_simple_chord.includes(note) and note % 12 != key_for_chords.value[LEADING_TONE]:
                         next_chord_list.append(note)
@@ -731,19 +854,17 @@ def next_chords(current_chord: Chord, next_note: int, next_next_note: int, is_fi
         else:
             next_chord_list = [next_note, -1, -1, -1]
 
-        # Computes of the possible options for the next chord thanks to the filter_w_rules method
-        options = filter_w_rules(current_chord_list,
-                                 complete_transition(current_chord_list, next_chord_list, next_simple_chord),
-                                 next_next_note,
-                                 is_final_cadence,
-                                 key_for_chords)
-
-        if is_final_cadence:
-            # Adds the current transition to the global dictionary
-            transition[(current_chord, next_note)] = tuple(opt for opt in options)
-            return transition[(current_chord, next_note)]
-        else:
-            return tuple(opt for opt in options)
+        # The options for the next chord are filtered with the same rules as in the filter_w_rules method
+        masks = TransitionMasks(current_chord_list,
+                                complete_transition(current_chord_list, next_chord_list, next_simple_chord),
+                                next_next_note,
+                                is_final_cadence,
+                                key_for_chords)
+        transition_masks[masks_key] = masks
+        if len(transition_masks) > TRANSITION_MASKS_SIZE:
+            transition_masks.popitem(last=False)
+
+    return tuple(opt for opt in masks.survivors())
 
 
 def compose(initial_chord, bass_line, prev_chord_tree, prev_cadence, tonality_compose):
@@ -1,5 +1,6 @@
 from harmonisation.melody_toolkit import *
 from harmonisation.harmonisation import *
+from harmonisation.chord_graph import check_bass_line, feasible_start_chords, compose_anytime
 from music21 import converter
 
 
@@ -57,15 +58,35 @@ bass_15 = [DO + OCTAVE, FA + OCTAVE, SI, MI + OCTAVE, LA]
 
 
 
-def create_composition(key, start_chord, bass):
+def create_composition(key, start_chord, bass, deadline_ms=None):
     voices = [[], [], [], []]
-    composition_tree = Node(start_chord, 1, [])
 
-    compose(start_chord, bass[1:], composition_tree, False, key)
-    print(composition_tree)
-    print("composition_tree's level (total number of different compositions) : " + str(composition_tree.level()))
+    if deadline_ms is not None:
+        # Anytime mode: the best harmonisation found within the time budget
+        path, exhaustive = compose_anytime(key, bass, start_chord, deadline_ms)
+        print("anytime search " + ("was exhaustive" if exhaustive else "stopped at the deadline of "
+                                                     + str(deadline_ms) + " ms"))
+        if path is None:
+            print("no harmonisation found")
+            return None
+    else:
+        # Checks that the exercise has a solution before building the whole tree
+        feasible, position = check_bass_line(key, bass, start_chord)
+        if not feasible:
+            print("no harmonisation from " + str(start_chord) + ": no chord can be reached on bass note "
+                  + str(position) + " (" + noteOf[bass[position] % 12] + ")")
+            print("starting chords that can be used : "
+                  + ", ".join(str(chord) for chord in feasible_start_chords(key, bass)))
+            return None
+
+        composition_tree = Node(start_chord, 1, [])
+
+        compose(start_chord, bass[1:], composition_tree, False, key)
+        print(composition_tree)
+        print("composition_tree's level (total number of different compositions) : " + str(composition_tree.level()))
+
+        path = select_path_in_tree_harm(len(bass), composition_tree)
 
-    path = select_path_in_tree_harm(len(bass), composition_tree)
     # path = to_arrays(path)[0:len(path)]
     path = to_arrays(path)
     for i in range(4):
@@ -0,0 +1,273 @@
+import numpy as np
+import harmonisation.harmonisation as harmonisation
+from harmonisation.chord_graph import *
+
+"""
+Harmonisation with any number of voices, not only the bass, tenor, alto and soprano of ``Chord``.
+
+With more voices, the cartesian product of the candidates grows exponentially and the rules on pairs of voices
+(overtaking, consecutive and direct fifths and octaves) grow quadratically, so looping over them in Python as
+``filter_w_rules`` does would be too slow. Here the candidates of a transition are one NumPy array of shape
+(number of candidates, number of voices), and every rule is evaluated for all the candidates and all the voices (or
+pairs of voices) at once.
+
+The rules are those of ``filter_w_rules``, with the doubling rules generalised to more than four voices:
+    - rule 4: a note cannot appear more than (number of voices - 2) times (2 for four voices);
+    - rule 5: the fifth appears at least twice for VII and otherwise cannot appear more often than the fundamental;
+    - rule 7: the third is doubled (or not) as in rule 7, "doubled" meaning at least twice.
+Rules 9 and 10 forbid consecutive and direct fourths, fifths and octaves between every pair of voices, as
+``filter_w_rules`` does. Between inner voices they can hardly be avoided once every note is doubled, and five or six
+voices usually have no harmonisation at all under them: a VoiceLayout built with ``outer_pairs_only=True`` relaxes
+them to the pairs including the bass or the highest voice, which is a deviation from ``filter_w_rules``.
+With four voices and all the pairs, the rules are exactly those of ``filter_w_rules`` (rules 5 and 7 keep their
+"exactly twice") and accept the same chords.
+
+EPSILON, the overtakings and the ranges of ``satb_layout`` are read from ``harmonisation.harmonisation`` at call time
+(the star import only copies their values when this module is loaded).
+"""
+
+
+# Class which represents a chord of any number of notes, ordered from the lowest voice (the bass) to the highest one.
+class NChord:
+    def __init__(self, notes):
+        self.notes = tuple(int(note) for note in notes)
+
+    # Returns the fundamental of the NChord.
+    def fundamental(self):
+        return self.notes[0]
+
+    # Transforms a NChord into its equivalent list.
+    def to_list(self):
+        return list(self.notes)
+
+    # Creates a NChord from a Chord.
+    @staticmethod
+    def of_chord(chord: Chord):
+        return NChord(chord.to_list())
+
+    def __len__(self):
+        return len(self.notes)
+
+    def __eq__(self, that):
+        if isinstance(that, NChord):
+            return self.notes == that.notes
+        else:
+            return False
+
+    def __hash__(self):
+        return hash(self.notes)
+
+    def __str__(self):
+        return "NChord " + str(self.notes)
+
+
+class VoiceLayout:
+    """
+    Voices of an N-voice harmonisation: the range of every voice and the largest interval between adjacent voices.
+    Rules 9 and 10 look at every pair of voices, unless outer_pairs_only relaxes them (see the module docstring).
+    """
+
+    def __init__(self, ranges, max_spacings=None, max_repetitions=None, outer_pairs_only=False):
+        """
+        :param ranges: list of (min, max) notes of each voice, from the bass to the highest voice
+        :param max_spacings: list of the largest intervals between each voice and the one above, by default 24
+                             semitones above the bass and 14 between the other voices (as check_inter_ranges)
+        :param max_repetitions: maximum number of times a note can appear in a chord (rule 4)
+        :param outer_pairs_only: whether rules 9 and 10 only look at the pairs of voices including the bass or the
+                                 highest voice, instead of all the pairs as in filter_w_rules
+        """
+        self.ranges = np.array(ranges, dtype=np.int64)
+        nb_voices = len(ranges)
+        self.max_spacings = np.array(max_spacings if max_spacings is not None else [24] + [14] * (nb_voices - 2),
+                                     dtype=np.int64)
+        self.max_repetitions = max_repetitions if max_repetitions is not None else max(2, nb_voices - 2)
+
+        # Indices of the pairs of voices (voice i and a higher voice j) checked by rules 9 and 10
+        self.pairs_i, self.pairs_j = np.triu_indices(nb_voices, k=1)
+        if outer_pairs_only:
+            outer = (self.pairs_i == 0) | (self.pairs_j == nb_voices - 1)
+            self.pairs_i, self.pairs_j = self.pairs_i[outer], self.pairs_j[outer]
+
+    def __len__(self):
+        return len(self.ranges)
+
+
+# Returns the layout of the bass, tenor, alto and soprano, with the current ranges of the constants.
+def satb_layout():
+    return VoiceLayout([(harmonisation.MIN_B, harmonisation.MAX_B), (harmonisation.MIN_T, harmonisation.MAX_T),
+                        (harmonisation.MIN_A, harmonisation.MAX_A), (harmonisation.MIN_S, harmonisation.MAX_S)])
+
+
+def n_voices_candidates(current_notes, next_note: int, next_simple_chord: SimplifiedChord, layout: VoiceLayout):
+    """
+    Equivalent of complete_transition: all the chords with next_note at the bass whose other notes belong to the next
+    chord and are within EPSILON of the same voice in the current chord (and in its range if rule 2 is active).
+
+    :param current_notes: array of the notes of the current chord
+    :param next_note: the next note of the bass
+    :param next_simple_chord: the next chord in simplified format
+    :param layout: the voices
+    :return: array of shape (number of candidates, number of voices)
+    """
+    chord_notes = [next_simple_chord.fundamental, next_simple_chord.third, next_simple_chord.fifth]
+    epsilon = harmonisation.EPSILON
+    columns = [np.array([next_note], dtype=np.int64)]
+    for voice in range(1, len(layout)):
+        window = np.arange(max(0, current_notes[voice] - epsilon), current_notes[voice] + epsilon + 1)
+        if rule_active(2):
+            window = window[(window >= layout.ranges[voice, 0]) & (window <= layout.ranges[voice, 1])]
+        columns.append(window[np.isin(window % 12, chord_notes)])
+
+    grids = np.meshgrid(*columns, indexing='ij')
+    return np.stack([grid.ravel() for grid in grids], axis=1)
+
+
+def filter_n_voices(current_notes, candidates, next_next_degree, is_final_cadence, key_rules_input,
+                    layout: VoiceLayout):
+    """
+    Vectorised equivalent of filter_w_rules.
+
+    :param current_notes: array of the notes of the current chord
+    :param candidates: array of shape (number of candidates, number of voices)
+    :param next_next_degree: the note that represents the degree two positions ahead, -1 if there is not
+    :param is_final_cadence: boolean that determines if the next chord is the final chord of a cadence
+    :param key_rules_input: the key
+    :param layout: the voices
+    :return: the rows of candidates that respect the active rules
+    """
+    key_degrees = key_rules_input.value
+    current_notes = np.asarray(current_notes)
+    current_simple = current_notes % 12
+    simple = candidates % 12
+    nb_voices = len(layout)
+
+    prev_fund = Chord.simple_of(int(current_notes[0]), key_degrees).fundamental
+    next_simple_chord = Chord.simple_of(int(candidates[0, 0]), key_degrees) if len(candidates) > 0 else None
+    if next_simple_chord is None:
+        return candidates
+
+    def count(note):
+        return (simple == note).sum(axis=1)
+
+    keep = {}
+
+    # RULE 0 : NO BIG OVERTAKING BETWEEN VOICES
+    overtaking = harmonisation.OVERTAKING_NO_CADENCE if is_final_cadence else harmonisation.OVERTAKING_CADENCE
+    keep[0] = (np.diff(candidates, axis=1) >= overtaking).all(axis=1)
+
+    # RULE 1 : NO DUPLICATION OF THE LEADING NOTE
+    keep[1] = count(key_degrees[LEADING_TONE]) < 2
+
+    # RULE 2 : CHORDS RESPECT CORRECT RANGES
+    keep[2] = ((candidates >= layout.ranges[:, 0]) & (candidates <= layout.ranges[:, 1])).all(axis=1) \
+        & (np.abs(np.diff(candidates, axis=1)) <= layout.max_spacings).all(axis=1)
+
+    # RULE 3 : LEADING NOTE GOES TO TONIC IF CURRENT GRADE IS III, V OR VII AND THE FOLLOWING IS I, IV OR VI
+    current_fund = next_simple_chord.fundamental
+    leading_active = prev_fund in (key_degrees[DOMINANT], key_degrees[LEADING_TONE], key_degrees[MEDIANT]) \
+        and current_fund in (key_degrees[TONIC], key_degrees[SUBDOMINANT], key_degrees[SUBMEDIANT])
+    if leading_active:
+        keep[3] = ((current_simple == key_degrees[LEADING_TONE]) & (simple == key_degrees[TONIC])).any(axis=1)
+    else:
+        keep[3] = np.ones(len(candidates), dtype=bool)
+
+    # RULE 4 : A NOTE CANNOT APPEAR MORE THAN max_repetitions TIMES IN A SAME CHORD
+    keep[4] = (simple[:, :, None] == simple[:, None, :]).sum(axis=2).max(axis=1) <= layout.max_repetitions
+
+    # RULE 5 : THE FIFTH NOTE HAS TO BE REPEATED FOR VII DEGREE AND CANNOT BE REPEATED OTHERWISE (WITH MORE THAN FOUR
+    #          VOICES: AT LEAST TWICE FOR VII, AND NOT MORE OFTEN THAN THE FUNDAMENTAL OTHERWISE)
+    fifth_count = count(next_simple_chord.fifth)
+    if current_fund == key_degrees[LEADING_TONE]:
+        keep[5] = fifth_count == 2 if nb_voices == 4 else fifth_count >= 2
+    else:
+        keep[5] = fifth_count < 2 if nb_voices == 4 else fifth_count <= count(next_simple_chord.fundamental)
+
+    # RULE 6 : ALL NOTES OF THE CHORD ARE PRESENT
+    keep[6] = (count(next_simple_chord.fundamental) > 0) & (count(next_simple_chord.third) > 0) \
+        & (count(next_simple_chord.fifth) > 0)
+
+    # RULE 7 : THIRD DUPLICATION IS AUTHORISED WHEN THE DEGREE IS NOT I, IV AND V; AND IS MANDATORY FOR V -> VI AND
+    #          VI -> V IN MINOR TONALITIES
+    third_doubled = count(next_simple_chord.third) == 2 if nb_voices == 4 else count(next_simple_chord.third) >= 2
+    third_not_recom = current_fund in (key_degrees[TONIC], key_degrees[SUBDOMINANT], key_degrees[DOMINANT])
+    v_vi = prev_fund == key_degrees[DOMINANT] and current_fund == key_degrees[SUBMEDIANT]
+    vi_v_minor = current_fund == key_degrees[SUBMEDIANT] and next_next_degree == key_degrees[DOMINANT] \
+        and not is_major(key_degrees)
+    if v_vi or vi_v_minor:
+        keep[7] = third_doubled
+    elif third_not_recom:
+        keep[7] = ~third_doubled
+    else:
+        keep[7] = np.ones(len(candidates), dtype=bool)
+
+    # RULE 8 : FOURTH AUGMENTED INTERVAL NOT ALLOWED (and fifths and seconds in minor keys)
+    movement = candidates - current_notes
+    current_leading = current_simple == key_degrees[LEADING_TONE]
+    next_leading = simple == key_degrees[LEADING_TONE]
+    augmented = ((current_simple == key_degrees[SUBDOMINANT]) & next_leading & (movement == 6)) \
+        | (current_leading & (simple == key_degrees[SUBDOMINANT]) & (movement == -6))
+    if not is_major(key_degrees):
+        augmented |= ((current_simple == key_degrees[SUBMEDIANT]) & next_leading & (movement == 3)) \
+            | (current_leading & (simple == key_degrees[SUBDOMINANT]) & (movement == -3)) \
+            | ((current_simple == key_degrees[MEDIANT]) & next_leading & (movement == 8)) \
+            | (current_leading & (simple == key_degrees[MEDIANT]) & (movement == -8))
+    keep[8] = ~augmented.any(axis=1)
+
+    # Intervals between the pairs of voices, in the current chord and in every candidate
+    pairs_i, pairs_j = layout.pairs_i, layout.pairs_j
+    interval_current = (current_notes[pairs_j] - current_notes[pairs_i]) % 12
+    interval_next = (candidates[:, pairs_j] - candidates[:, pairs_i]) % 12
+    forbidden_next = np.isin(interval_next, [UNISON, PERFECT_FOURTH_INTERVAL, PERFECT_FIFTH_INTERVAL])
+
+    # RULE 9 : TWO CONSECUTIVE FOURTHS, FIFTHS AND OCTAVES ARE NOT ALLOWED
+    mov = (movement[:, pairs_i] != 0) | (movement[:, pairs_j] != 0)
+    keep[9] = ~((interval_next == interval_current) & mov & forbidden_next).any(axis=1)
+
+    # RULE 10 : DIRECT FOURTHS, FIFTHS AND OCTAVES ARE NOT ALLOWED
+    direct = ((movement[:, pairs_i] > 2) & (movement[:, pairs_j] > 2)) \
+        | ((movement[:, pairs_i] < -2) & (movement[:, pairs_j] < -2))
+    keep[10] = ~(direct & forbidden_next).any(axis=1)
+
+    # RULE 11 : LEADING NOTE AND TONIC NOTE IN THE HIGHEST VOICE IF IT IS THE FINAL CADENCE
+    keep[11] = np.full(len(candidates), current_simple[-1] == key_degrees[LEADING_TONE]) \
+        & (simple[:, -1] == key_degrees[TONIC])
+
+    alive = np.ones(len(candidates), dtype=bool)
+    for n in range(11):
+        if rule_active(n):
+            alive &= keep[n]
+    if rule_active(11):
+        # As in filter_w_rules, an active rule 11 keeps the chords that pass rule 10 outside of the final cadence
+        if rule_11_applies(current_notes.tolist(), is_final_cadence, key_degrees):
+            alive &= keep[11]
+        else:
+            alive &= keep[10]
+
+    return candidates[alive]
+
+
+class NVoiceChordGraph(ChordGraph):
+    """
+    ChordGraph of a bass line harmonised with the voices of a VoiceLayout (states are NChord).
+    """
+
+    def __init__(self, tonality: Key, bass_line, layout: VoiceLayout, prev_cadence: bool = False):
+        """
+        :param tonality: key of the harmonization
+        :param bass_line: bass line (a list of notes), without the note of the starting chord
+        :param layout: the voices
+        :param prev_cadence: boolean that indicates whether the first chord of bass_line ends a cadence
+        """
+        super().__init__(tonality, bass_line, prev_cadence)
+        self.layout = layout
+
+    def next_options(self, chord: NChord, layer: int):
+        next_note = self.bass_line[layer]
+        next_next_note = self.bass_line[layer + 1] if layer + 1 < len(self.bass_line) else -1
+        current_notes = np.array(chord.notes, dtype=np.int64)
+
+        candidates = n_voices_candidates(current_notes, next_note, Chord.simple_of(next_note, self.tonality.value),
+                                         self.layout)
+        options = filter_n_voices(current_notes, candidates, next_next_note, self.cadences[layer], self.tonality,
+                                  self.layout)
+        return [NChord(notes) for notes in options.tolist()]
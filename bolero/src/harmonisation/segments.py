@@ -0,0 +1,181 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from harmonisation.chord_graph import *
+
+"""
+``notes_array`` harmonises its segments one after the other, because each segment starts on the last chord of the
+previous one. Here, every segment is solved on its own and at the same time as the others: for each chord that could
+start it, we compute the chords that can end it together with the number of harmonisations (or the lowest voice
+leading cost) between both. Chaining the segments is then a cheap forward pass over these tables, followed by the
+choice of one path inside each segment between the chosen boundary chords, which is done in parallel as well.
+
+Segments with the same bass line share the same table, so repeating one bass line costs a single segment.
+
+The tables are computed before any boundary chord is known, so a segment has to be solved from every chord that the
+previous one could end on: its start chords are the voicings of the last note of the previous segment which respect
+the rules on a single chord (``start_voicings``). The wall time is therefore that of the segment with the most start
+chords (from a few to a few dozen times the time of one harmonisation), spread over the worker processes, and not the
+time of one segment. Like ``check_bass_line``, the segments follow the rules of ``compute_next_chords``, which do not
+depend on the order in which the transitions are computed, as the ``transition`` dictionary of ``compose`` does.
+"""
+
+COUNT = "count"  # sample the piece uniformly among all its harmonisations
+COST = "cost"  # choose the piece with the lowest voice leading cost
+
+
+def segment_table(tonality: Key, bass, start_chords, mode: str = COUNT):
+    """
+    For each start chord, the chords that can end the harmonisation of bass with their counts or costs.
+
+    :param tonality: key of the harmonization
+    :param bass: bass line of the segment, the first note being the one of the starting chord
+    :param start_chords: chords that can start the segment
+    :param mode: COUNT or COST
+    :return: dictionary from start chord to a dictionary from end chord to count (or cost)
+    """
+    graph = ChordGraph(tonality, bass[1:])
+    if mode == COST:
+        return {start: graph.end_costs(start) for start in start_chords}
+    return {start: graph.end_counts(start) for start in start_chords}
+
+
+def segment_path(tonality: Key, bass, start_chord: Chord, end_chord: Chord, mode: str = COUNT, seed=None):
+    """
+    Chooses one harmonisation of bass between two given boundary chords.
+
+    :param tonality: key of the harmonization
+    :param bass: bass line of the segment, the first note being the one of the starting chord
+    :param start_chord: the starting chord
+    :param end_chord: the final chord
+    :param mode: COUNT (uniform sampling) or COST (lowest voice leading cost)
+    :param seed: seed of the sampling
+    :return: the path of chords, of length len(bass)
+    """
+    graph = ChordGraph(tonality, bass[1:])
+    if mode == COST:
+        return graph.best_path(start_chord, end_chord)
+    return graph.sample_path(start_chord, end_chord, random.Random(seed))
+
+
+def _chunks(elements, nb_chunks):
+    size = max(1, -(-len(elements) // nb_chunks))
+    return [elements[i:i + size] for i in range(0, len(elements), size)]
+
+
+def segment_tables(tonality: Key, basses, first_chord: Chord, mode: str = COUNT, processes=None):
+    """
+    Computes the tables of all the segments in parallel. The first segment only starts on first_chord, the others on
+    every voicing of the last note of the previous segment which a transition can give (see start_voicings).
+
+    :param tonality: key of the harmonization
+    :param basses: list of bass lines, one per segment
+    :param first_chord: first chord of the piece
+    :param mode: COUNT or COST
+    :param processes: number of worker processes, None for as many as CPUs
+    :return: list of tables (see segment_table), one per segment
+    """
+    # Segments are identified by their bass line, the bass note they start from and whether it ends a cadence
+    segment_keys = []
+    for k, bass in enumerate(basses):
+        if k == 0:
+            segment_keys.append((tuple(bass), -1, False))
+        else:
+            cadences = cadence_flags(basses[k - 1][1:], tonality)
+            segment_keys.append((tuple(bass), basses[k - 1][-1], len(cadences) > 0 and cadences[-1]))
+    starts = {}
+    for k, segment_key in enumerate(segment_keys):
+        if segment_key not in starts:
+            starts[segment_key] = [first_chord] if k == 0 else start_voicings(segment_key[1], tonality, segment_key[2])
+
+    tables = {segment_key: {} for segment_key in starts}
+    nb_workers = processes if processes is not None else os.cpu_count()
+    with ProcessPoolExecutor(processes) as executor:
+        futures = []
+        for segment_key, start_chords in starts.items():
+            for chunk in _chunks(start_chords, nb_workers):
+                futures.append((segment_key, executor.submit(segment_table, tonality, list(segment_key[0]), chunk,
+                                                             mode)))
+        for segment_key, future in futures:
+            tables[segment_key].update(future.result())
+
+    return [tables[segment_key] for segment_key in segment_keys]
+
+
+def stitch_segments(tonality: Key, basses, first_chord: Chord, tables, mode: str = COUNT, rng=random):
+    """
+    Forward pass over the segment tables, then choice of the boundary chords of every segment from the last one
+    backwards.
+
+    :param tonality: key of the harmonization
+    :param basses: list of bass lines, one per segment
+    :param first_chord: first chord of the piece
+    :param tables: segment tables, as returned by segment_tables (missing start chords are computed on demand)
+    :param mode: COUNT or COST
+    :param rng: source of randomness for the COUNT mode
+    :return: list of the len(basses) + 1 boundary chords, or None if the piece cannot be harmonised
+    """
+
+    def combine(weight, segment_weight):
+        return weight + segment_weight if mode == COST else weight * segment_weight
+
+    # weights[k][chord] is the count (or lowest cost) of all the ways of reaching chord at the start of segment k
+    weights = [{first_chord: 0 if mode == COST else 1}]
+    for k, bass in enumerate(basses):
+        missing = [start for start in weights[k] if start not in tables[k]]
+        if len(missing) > 0:
+            tables[k].update(segment_table(tonality, bass, missing, mode))
+
+        next_weights = {}
+        for start, weight in weights[k].items():
+            for end, segment_weight in tables[k][start].items():
+                value = combine(weight, segment_weight)
+                if end not in next_weights:
+                    next_weights[end] = value
+                elif mode == COST:
+                    next_weights[end] = min(next_weights[end], value)
+                else:
+                    next_weights[end] += value
+        weights.append(next_weights)
+
+    if len(weights[-1]) == 0:
+        return None
+
+    def choose(candidates):
+        if mode == COST:
+            return min(candidates, key=candidates.get)
+        return rng.choices(list(candidates), list(candidates.values()))[0]
+
+    boundaries = [choose(weights[-1])]
+    for k in reversed(range(1, len(basses))):
+        end = boundaries[0]
+        candidates = {start: combine(weight, tables[k][start][end])
+                      for start, weight in weights[k].items() if end in tables[k][start]}
+        boundaries.insert(0, choose(candidates))
+    boundaries.insert(0, first_chord)
+    return boundaries
+
+
+def harmonise_segments(tonality: Key, basses, first_chord: Chord, mode: str = COUNT, processes=None, rng=random):
+    """
+    Harmonises a sequence of segments, each one starting on the last chord of the previous one, with the segments
+    solved in parallel.
+
+    :param tonality: key of the harmonization
+    :param basses: list of bass lines, one per segment
+    :param first_chord: first chord of the piece
+    :param mode: COUNT (uniform sampling among all the harmonisations of the piece) or COST (lowest voice leading cost)
+    :param processes: number of worker processes, None for as many as CPUs
+    :param rng: source of randomness for the COUNT mode
+    :return: list of paths of chords, one per segment
+    """
+    tables = segment_tables(tonality, basses, first_chord, mode, processes)
+    boundaries = stitch_segments(tonality, basses, first_chord, tables, mode, rng)
+    if boundaries is None:
+        raise ValueError("the bass lines cannot be harmonised from the first chord")
+
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(segment_path, tonality, bass, boundaries[k], boundaries[k + 1], mode,
+                                   rng.getrandbits(64))
+                   for k, bass in enumerate(basses)]
+        return [future.result() for future in futures]
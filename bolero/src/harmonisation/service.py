@@ -0,0 +1,298 @@
+import asyncio
+import json
+import math
+import multiprocessing
+import random
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from harmonisation.chord_graph import *
+
+"""
+Local harmonisation service, so that the harmoniser does not have to be imported and its transitions rebuilt by a new
+Python process every time it is used.
+
+The service speaks HTTP/1.1 with JSON bodies, over TCP or a Unix socket:
+    - POST /harmonise with {"key": "DO_MAJOR", "bass": [...], "start_chord": [b, t, a, s] (optional),
+      "mode": "sample" | "best" | "count" | "feasible", "samples": 1, "seed": null} answers
+      {"count": ..., "paths": [[[b, t, a, s], ...], ...]} (the bass includes the note of the starting chord, and
+      without a start chord every voicing of its first note which respects the rules on a single chord is used);
+    - GET /metrics answers the number of requests and the percentiles of their latency.
+
+Searches run in a pool of worker processes. Every worker keeps the chord graphs of its last bass lines (and the
+``transition_masks`` of ``compute_next_chords``), so the same exercise is not solved twice. Requests for the same key
+and bass line that arrive within BATCH_WINDOW of each other are sent together to one worker and share one graph.
+"""
+
+HOST = "127.0.0.1"
+PORT = 8274
+BATCH_WINDOW = 0.005  # seconds during which requests for the same key and bass line are gathered
+GRAPH_CACHE_SIZE = 64  # number of chord graphs kept by every worker
+LATENCY_WINDOW = 1000  # number of latencies (per route) used for the percentiles
+MAX_SAMPLES = 1000  # largest number of paths drawn for one request
+MODES = ("sample", "best", "count", "feasible")
+ROUTES = ("/harmonise", "/metrics", "other")  # routes of the metrics, every unknown path being counted as "other"
+
+# Chord graphs of a worker process, from (key name, bass line, rules_signature()) to ChordGraph, least recent first
+graphs = OrderedDict()
+
+
+def cached_graph(key_name: str, bass):
+    """
+    :param key_name: name of the key, as in ``Key``
+    :param bass: bass line, the first note being the one of the starting chord
+    :return: the ChordGraph of bass, from the cache of the worker process
+    """
+    graph_key = (key_name, tuple(bass), rules_signature())
+    graph = graphs.get(graph_key)
+    if graph is None:
+        graph = ChordGraph(Key[key_name], bass[1:])
+        graphs[graph_key] = graph
+        if len(graphs) > GRAPH_CACHE_SIZE:
+            graphs.popitem(last=False)
+    else:
+        graphs.move_to_end(graph_key)
+    return graph
+
+
+def answer(graph: ChordGraph, tonality: Key, bass, query):
+    """
+    Answers one query on the graph of its bass line.
+
+    :param graph: the chord graph of bass
+    :param tonality: key of the harmonization
+    :param bass: bass line, the first note being the one of the starting chord
+    :param query: dictionary with the start_chord, mode, samples and seed of the request
+    :return: dictionary of the response
+    """
+    if query["start_chord"] is not None:
+        start_chords = [Chord.of_tuple(tuple(query["start_chord"]))]
+    else:
+        start_chords = start_voicings(bass[0], tonality)
+    mode = query["mode"]
+
+    if mode == "feasible":
+        return {"feasible": any(graph.feasible(chord) for chord in start_chords)}
+
+    counts = [graph.count(chord) for chord in start_chords]
+    response = {"count": sum(counts)}
+    if mode == "count" or response["count"] == 0:
+        response["paths"] = []
+        return response
+
+    if mode == "best":
+        candidates = [graph.best_path(chord) for chord, nb in zip(start_chords, counts) if nb > 0]
+        paths = [min(candidates, key=lambda path: sum(voice_leading_cost(path[i], path[i + 1])
+                                                      for i in range(len(path) - 1)))]
+    else:
+        rng = random.Random(query["seed"])
+        paths = [graph.sample_path(rng.choices(start_chords, counts)[0], rng=rng) for _ in range(query["samples"])]
+    response["paths"] = [[chord.to_list() for chord in path] for path in paths]
+    return response
+
+
+def solve_batch(key_name: str, bass, queries):
+    """
+    Work sent to a worker process: all the queries on one key and bass line.
+
+    :param key_name: name of the key, as in ``Key``
+    :param bass: bass line, the first note being the one of the starting chord
+    :param queries: list of queries (see answer)
+    :return: list of responses, in the order of queries
+    """
+    tonality = Key[key_name]
+    graph = cached_graph(key_name, bass)
+    return [answer(graph, tonality, bass, query) for query in queries]
+
+
+def is_integer(value):
+    """
+    :return: whether value is a JSON integer (true and false are bools, not integers)
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_request(body: dict):
+    """
+    Checks a /harmonise request.
+
+    :param body: the decoded JSON body
+    :return: a pair ((key name, bass line), query)
+    :raise ValueError: if the request is not valid
+    """
+    if not isinstance(body, dict):
+        raise ValueError("the request must be a JSON object")
+    key_name = body.get("key")
+    if key_name not in Key.__members__:
+        raise ValueError("unknown key: " + str(key_name))
+    bass = body.get("bass")
+    if not isinstance(bass, list) or len(bass) < 2 or not all(is_integer(note) for note in bass):
+        raise ValueError("bass must be a list of at least two notes")
+    start_chord = body.get("start_chord")
+    if start_chord is not None and (not isinstance(start_chord, list) or len(start_chord) != 4
+                                    or not all(is_integer(note) for note in start_chord)):
+        raise ValueError("start_chord must be a list of four notes")
+    mode = body.get("mode", "sample")
+    if mode not in MODES:
+        raise ValueError("mode must be one of " + ", ".join(MODES))
+    samples = body.get("samples", 1)
+    if not is_integer(samples) or not 1 <= samples <= MAX_SAMPLES:
+        raise ValueError("samples must be an integer between 1 and {}".format(MAX_SAMPLES))
+    seed = body.get("seed")
+    if seed is not None and not is_integer(seed):
+        raise ValueError("seed must be an integer or null")
+
+    return (key_name, tuple(bass)), {"start_chord": start_chord, "mode": mode, "samples": samples, "seed": seed}
+
+
+def percentile(values, fraction: float):
+    """
+    :param values: sorted list of values
+    :param fraction: between 0 and 1
+    :return: the nearest-rank percentile of values
+    """
+    if len(values) == 0:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+class HarmonisationService:
+    """
+    The asyncio server, its batches of pending requests and its metrics.
+    """
+
+    def __init__(self, processes=None):
+        """
+        :param processes: number of worker processes, None for as many as CPUs
+        """
+        # Forked workers would inherit the sockets open at the time (and keep the connections open after they are
+        # answered), so they are spawned
+        self.executor = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+        self.pending = {}  # (key name, bass line) -> list of (query, future) waiting for the batch to be sent
+        self.latencies = {route: deque(maxlen=LATENCY_WINDOW) for route in ROUTES}  # latest latencies, in seconds
+        self.requests = {route: 0 for route in ROUTES}
+        self.batches = 0
+
+    async def harmonise(self, body: dict):
+        """
+        Adds a request to the batch of its key and bass line, and waits for its response.
+
+        :param body: the decoded JSON body
+        :return: dictionary of the response
+        """
+        batch_key, query = parse_request(body)
+        future = asyncio.get_running_loop().create_future()
+        if batch_key not in self.pending:
+            self.pending[batch_key] = []
+            asyncio.get_running_loop().call_later(BATCH_WINDOW, self.send_batch, batch_key)
+        self.pending[batch_key].append((query, future))
+        return await future
+
+    def send_batch(self, batch_key):
+        """
+        Sends the pending requests of a key and bass line to the worker processes.
+        """
+        batch = self.pending.pop(batch_key)
+        self.batches += 1
+        work = asyncio.get_running_loop().run_in_executor(self.executor, solve_batch, batch_key[0], list(batch_key[1]),
+                                                          [query for query, future in batch])
+
+        def dispatch(done):
+            for i, (query, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if done.exception() is not None:
+                    future.set_exception(done.exception())
+                else:
+                    future.set_result(done.result()[i])
+
+        work.add_done_callback(dispatch)
+
+    def metrics(self):
+        """
+        :return: dictionary of the number of requests and batches, and of the latency percentiles (in ms) per route
+        """
+        routes = {}
+        for route, latencies in self.latencies.items():
+            ordered = sorted(latencies)
+            routes[route] = {"requests": self.requests[route],
+                             **{name: percentile(ordered, fraction) * 1000 if len(ordered) > 0 else None
+                                for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))}}
+        return {"batches": self.batches, "routes": routes}
+
+    def record(self, route: str, latency: float):
+        route = route if route in ROUTES else "other"
+        self.requests[route] += 1
+        self.latencies[route].append(latency)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Answers one HTTP request on a connection.
+        """
+        start = time.perf_counter()
+        route = None
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if line == "":
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                content_length = int(headers.get("content-length", 0))
+                if content_length < 0:
+                    raise ValueError
+            except ValueError:
+                content_length = None
+            body = await reader.readexactly(content_length) if content_length is not None else b""
+
+            if len(request_line) < 2:
+                status, response = 400, {"error": "malformed request"}
+            elif content_length is None:
+                route = request_line[1]
+                status, response = 400, {"error": "malformed Content-Length header"}
+            else:
+                method, route = request_line[0], request_line[1]
+                if method == "GET" and route == "/metrics":
+                    status, response = 200, self.metrics()
+                elif method == "POST" and route == "/harmonise":
+                    try:
+                        status, response = 200, await self.harmonise(json.loads(body or b"{}"))
+                    except (ValueError, json.JSONDecodeError) as error:
+                        status, response = 400, {"error": str(error)}
+                    except Exception as error:
+                        status, response = 500, {"error": repr(error)}
+                else:
+                    status, response = 404, {"error": "unknown route"}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+
+        payload = json.dumps(response).encode()
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n"
+                     .format(status, reason, len(payload)).encode() + payload)
+        await writer.drain()
+        writer.close()
+        if route is not None:
+            self.record(route, time.perf_counter() - start)
+
+    async def serve(self, host: str = HOST, port: int = PORT, unix_path: str = None):
+        """
+        Serves until cancelled, on host:port or on the Unix socket unix_path if it is given.
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(HarmonisationService().serve())
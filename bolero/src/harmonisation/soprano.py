@@ -0,0 +1,140 @@
+import random
+from functools import lru_cache
+import harmonisation.harmonisation as harmonisation
+from harmonisation.chord_graph import *
+
+"""
+Harmonisation of a bass line under a given melody: the bass and the soprano are fixed and only the tenor and the alto
+are looked for.
+
+``compose`` only constrains the bass, so keeping the harmonisations of a melody would mean building all of them and
+throwing away those with another soprano. Here the voicings of every (key, bass note, soprano note) are computed once
+and indexed by their tenor, and a transition only gives to ``filter_w_rules`` the voicings of the index within
+EPSILON of the current chord, i.e. the candidates of ``complete_transition`` that have the right soprano.
+
+The bass line and the soprano line have the same length, their first notes being the ones of the starting chord.
+
+EPSILON, MAINTAIN_COMMON_NOTES and the ranges are read from ``harmonisation.harmonisation`` at call time (the star
+import only copies their values when this module is loaded), as ``next_chords`` reads them.
+"""
+
+# RULES THAT ONLY DEPEND ON THE NEXT CHORD, CHECKED ONCE WHEN BUILDING THE INDEX
+SINGLE_CHORD_RULES = (1, 2, 4, 5, 6)
+
+# HIGHEST NOTE OF THE TENOR AND THE ALTO IN THE INDEX WHEN RULE 2 IS NOT ACTIVE
+MAX_NOTE = 127
+
+
+@lru_cache(maxsize=None)
+def soprano_voicings(bass_note: int, soprano_note: int, tonality: Key, signature):
+    """
+    Index of all the voicings of a bass note and a soprano note which respect the active rules on a single chord.
+    The tenor and the alto are taken in their ranges, or between 0 and MAX_NOTE if rule 2 is not active.
+
+    :param bass_note: the note of the bass
+    :param soprano_note: the note of the soprano
+    :param tonality: key of the harmonization
+    :param signature: rules_signature() at call time, so that changing the rules gives a new index
+    :return: dictionary from a tenor note to the list of (alto, voicing) with that tenor
+    """
+    key_degrees = tonality.value
+    simple_chord = Chord.simple_of(bass_note, key_degrees)
+    if not simple_chord.includes(soprano_note):
+        return {}
+
+    if rule_active(2):
+        tenors = range(harmonisation.MIN_T, harmonisation.MAX_T + 1)
+        altos = range(harmonisation.MIN_A, harmonisation.MAX_A + 1)
+    else:
+        tenors = altos = range(0, MAX_NOTE + 1)
+    rules = [RULES[n] for n in SINGLE_CHORD_RULES if rule_active(n)]
+
+    by_tenor = {}
+    for t, a in product(filter(simple_chord.includes, tenors), filter(simple_chord.includes, altos)):
+        voicing = (bass_note, t, a, soprano_note)
+        if all(rule(None, voicing, -1, False, key_degrees) for rule in rules):
+            by_tenor.setdefault(t, []).append((a, voicing))
+    return by_tenor
+
+
+def soprano_start_chords(tonality: Key, bass_note: int, soprano_note: int):
+    """
+    :param tonality: key of the harmonization
+    :param bass_note: the note of the bass
+    :param soprano_note: the note of the soprano
+    :return: list of all the chords of the index of (bass_note, soprano_note)
+    """
+    by_tenor = soprano_voicings(bass_note, soprano_note, tonality, rules_signature())
+    return [Chord.of_tuple(voicing) for t in sorted(by_tenor) for a, voicing in by_tenor[t]]
+
+
+class SopranoChordGraph(ChordGraph):
+    """
+    ChordGraph of a bass line harmonised under a fixed soprano line.
+    """
+
+    def __init__(self, tonality: Key, bass_line, soprano_line, prev_cadence: bool = False):
+        """
+        :param tonality: key of the harmonization
+        :param bass_line: bass line (a list of notes), without the note of the starting chord
+        :param soprano_line: soprano line, of the same length as bass_line, without the note of the starting chord
+        :param prev_cadence: boolean that indicates whether the first chord of bass_line ends a cadence
+        """
+        if len(soprano_line) != len(bass_line):
+            raise ValueError("the soprano line and the bass line must have the same length")
+        super().__init__(tonality, bass_line, prev_cadence)
+        self.soprano_line = list(soprano_line)
+
+    def next_options(self, chord: Chord, layer: int):
+        next_note = self.bass_line[layer]
+        next_next_note = self.bass_line[layer + 1] if layer + 1 < len(self.bass_line) else -1
+        current_chord_list = chord.to_list()
+        soprano_note = self.soprano_line[layer]
+        epsilon = harmonisation.EPSILON
+        if abs(soprano_note - chord.s) > epsilon:
+            return []
+
+        # The notes kept from the current chord when MAINTAIN_COMMON_NOTES is true (as in compute_next_chords, except
+        # that all the voices stay free when the bass note does not change)
+        sketch = [-1, -1, -1, -1]
+        if harmonisation.MAINTAIN_COMMON_NOTES and chord.fundamental() != next_note:
+            next_simple_chord = Chord.simple_of(next_note, self.tonality.value)
+            for i, note in enumerate(current_chord_list[1:], start=1):
+                if next_simple_chord.includes(note) and note % 12 != self.tonality.value[LEADING_TONE]:
+                    sketch[i] = note
+        if sketch[3] not in (-1, soprano_note):
+            return []
+
+        by_tenor = soprano_voicings(next_note, soprano_note, self.tonality, rules_signature())
+        tenors = all_in_epsilon(chord.t) if sketch[1] == -1 else [sketch[1]]
+        candidates = set()
+        for t in tenors:
+            for a, voicing in by_tenor.get(t, ()):
+                if abs(a - chord.a) <= epsilon and sketch[2] in (-1, a):
+                    candidates.add(voicing)
+
+        options = filter_w_rules(current_chord_list, candidates, next_next_note, self.cadences[layer], self.tonality)
+        return [Chord.of_tuple(opt) for opt in options]
+
+
+def harmonise_with_soprano(tonality: Key, bass, soprano, start_chord: Chord = None, rng=random):
+    """
+    Draws one harmonisation of a bass line and a melody uniformly among all of them.
+
+    :param tonality: key of the harmonization
+    :param bass: bass line, the first note being the one of the starting chord
+    :param soprano: soprano line, of the same length as bass
+    :param start_chord: the starting chord (its bass and soprano must be the first notes of bass and soprano), None
+                        to draw it among all the voicings of the first notes
+    :param rng: source of randomness, the ``random`` module or a ``random.Random``
+    :return: the path of chords, starting chord included; None if there is no harmonisation
+    """
+    graph = SopranoChordGraph(tonality, bass[1:], soprano[1:])
+    if start_chord is not None:
+        return graph.sample_path(start_chord, rng=rng)
+
+    start_chords = soprano_start_chords(tonality, bass[0], soprano[0])
+    weights = [graph.count(chord) for chord in start_chords]
+    if sum(weights) == 0:
+        return None
+    return graph.sample_path(rng.choices(start_chords, weights)[0], rng=rng)
@@ -0,0 +1,97 @@
+import numpy as np
+
+"""
+Bars of a rhythm (a sequence of durations in quarter notes, rests being negative), so that a rhythm can be cut between
+bars instead of after a number of notes.
+
+The start of every note is the prefix sum of the absolute values of the durations before it, so that rests count, and
+a note belongs to the bar in which it starts. The bars are numbered from 1, as in a score, and finding the notes of a
+bar is a binary search on the starts.
+"""
+
+BAR_EPSILON = 1e-9  # tolerance on the starts of the notes (e.g. 3 triplets of 1/3 end at 0.9999999999999999)
+
+
+def bar_length(time_sig: str):
+    """
+    :param time_sig: time signature, e.g. "3/4"
+    :return: duration of a bar, in quarter notes
+    """
+    numerator, denominator = time_sig.split("/")
+    return int(numerator) * 4 / int(denominator)
+
+
+class BarIndex:
+    """
+    Prefix sum of the durations of a rhythm, for the given time signature.
+    """
+
+    def __init__(self, rhythm, time_sig: str = "4/4"):
+        """
+        :param rhythm: sequence of durations (list or array of floats); nan (unknown symbols) lasts 0
+        :param time_sig: time signature, as in combine_voices
+        """
+        self.rhythm = rhythm
+        self.bar_length = bar_length(time_sig)
+        durations = np.nan_to_num(np.abs(np.asarray(rhythm, dtype=np.float64)), nan=0.0)
+        self.ends = np.cumsum(durations)
+        self.starts = self.ends - durations
+
+    def total_duration(self):
+        """
+        :return: duration of the whole rhythm, in quarter notes
+        """
+        return float(self.ends[-1]) if len(self.ends) > 0 else 0.0
+
+    def nb_bars(self):
+        """
+        :return: number of complete bars of the rhythm
+        """
+        return int((self.total_duration() + BAR_EPSILON) // self.bar_length)
+
+    def bar_of(self, index: int):
+        """
+        :param index: index of a note of the rhythm
+        :return: number of the bar in which the note starts
+        """
+        return int((self.starts[index] + BAR_EPSILON) // self.bar_length) + 1
+
+    def bar_range(self, first_bar: int, last_bar: int = None):
+        """
+        :param first_bar: number of the first bar
+        :param last_bar: number of the last bar (included), None for first_bar only
+        :return: (start, stop) such that rhythm[start:stop] are the notes which start in these bars
+        """
+        last_bar = first_bar if last_bar is None else last_bar
+        start = np.searchsorted(self.starts, (first_bar - 1) * self.bar_length - BAR_EPSILON)
+        stop = np.searchsorted(self.starts, last_bar * self.bar_length - BAR_EPSILON)
+        return int(start), int(stop)
+
+    def bars(self, first_bar: int, last_bar: int = None):
+        """
+        :param first_bar: number of the first bar
+        :param last_bar: number of the last bar (included), None for first_bar only
+        :return: the notes of the rhythm which start in these bars
+        """
+        start, stop = self.bar_range(first_bar, last_bar)
+        return self.rhythm[start:stop]
+
+    def align(self, stop: int):
+        """
+        :param stop: a number of notes
+        :return: the largest index not after stop at which a bar starts, so that rhythm[:align(stop)] is made of
+                 complete bars
+        """
+        if stop >= len(self.rhythm):
+            return self.bar_range(1, self.nb_bars())[1]
+        return self.bar_range(1, self.bar_of(stop) - 1)[1]
+
+    def truncate(self, nb_bars: int = None):
+        """
+        :param nb_bars: number of bars kept, None for all the complete bars
+        :return: the notes of the first nb_bars bars of the rhythm, without the notes after the last complete bar
+        """
+        nb_bars = self.nb_bars() if nb_bars is None else min(nb_bars, self.nb_bars())
+        if nb_bars <= 0:
+            return self.rhythm[:0]
+        return self.bars(1, nb_bars)
@@ -0,0 +1,186 @@
+from array import array
+from math import fabs
+import numpy as np
+
+"""
+Decoding of L System strings into sequences of durations, from a declarative description of the symbols.
+
+The sequence_from_string_* functions all read a string from left to right, where some symbols append a duration and
+some operators modify the previous duration. A grammar gives the duration of every duration symbol and the operator
+of every operator symbol; it is compiled once (and cached) into a lookup table and a small state machine whose only
+state is the last duration, which can still be modified, and whether a tie waits for its next symbol. The state
+machine can be fed a string in several chunks, giving the same durations as the whole string at once.
+
+A grammar decodes into an array('d'), its unknown symbols giving a float (nan for bolero). The sequence_from_string_*
+functions keep their contract on top of it: they return a list, with None for the unknown symbols of bolero.
+"""
+
+# OPERATORS, APPLIED TO THE PREVIOUS DURATION (IGNORED IF THERE IS NONE)
+TIE = "tie"  # add the duration of the next symbol, which is read with it (and skipped if it is not a duration)
+NEGATE = "negate"  # make the previous note a rest (value: -1 * duration of rest)
+EXTEND = "extend"  # extend the previous duration by 50%
+HALVE = "halve"  # divide the previous duration by 2, if it is larger than 1/1024
+
+OPERATORS = (TIE, NEGATE, EXTEND, HALVE)
+
+
+class DurationGrammar:
+    """
+    Compiled grammar: symbols table and decoding. Use compile_grammar to get one.
+    """
+
+    def __init__(self, durations: dict, operators: dict, unknown=None):
+        """
+        :param durations: dictionary from each duration symbol to its duration
+        :param operators: dictionary from each operator symbol to its operator (TIE, NEGATE, EXTEND or HALVE)
+        :param unknown: duration of the other symbols, None to ignore them
+        """
+        for symbol, operator in operators.items():
+            if operator not in OPERATORS:
+                raise ValueError("unknown operator {} for symbol {}".format(operator, symbol))
+            if symbol in durations:
+                raise ValueError("symbol {} is both a duration and an operator".format(symbol))
+        self.durations = dict(durations)
+        self.operators = dict(operators)
+        self.unknown = unknown
+
+        # Without operators, every symbol gives one duration: decoding is a single lookup in a table of ASCII codes
+        self.table = None
+        if len(self.operators) == 0 and all(ord(c) < 128 for c in self.durations):
+            self.table = np.full(128, np.nan if unknown is None else unknown, dtype=np.float64)
+            self.known = np.zeros(128, dtype=bool)
+            for c, duration in self.durations.items():
+                self.table[ord(c)] = duration
+                self.known[ord(c)] = True
+
+    def decoder(self):
+        """
+        :return: a new DurationDecoder of this grammar, to decode a string given in several chunks
+        """
+        return DurationDecoder(self)
+
+    def decode(self, string: str):
+        """
+        :param string: input string
+        :return: sequence of durations (array of floats)
+        """
+        if self.table is not None and string.isascii():
+            codes = np.frombuffer(string.encode("ascii"), dtype=np.uint8)
+            if self.unknown is None:
+                codes = codes[self.known[codes]]
+            result = array('d')
+            result.frombytes(self.table[codes].tobytes())
+            return result
+
+        decoder = self.decoder()
+        result = decoder.feed(string)
+        result.extend(decoder.finish())
+        return result
+
+
+class DurationDecoder:
+    """
+    State machine of a DurationGrammar, fed with consecutive chunks of a string.
+    """
+
+    def __init__(self, grammar: DurationGrammar):
+        self.grammar = grammar
+        self.last = None  # last duration read, which the next operators can still modify
+        self.tie_pending = False  # whether the previous symbol was a tie, waiting for its next symbol
+
+    def feed(self, chunk: str):
+        """
+        :param chunk: the next characters of the string
+        :return: the durations that the following characters cannot modify anymore (array of floats)
+        """
+        durations = self.grammar.durations
+        operators = self.grammar.operators
+        unknown = self.grammar.unknown
+        last = self.last
+        tie_pending = self.tie_pending
+        result = array('d')
+
+        for c in chunk:
+            if tie_pending:
+                tie_pending = False
+                if last is not None and c in durations:
+                    new_dur = fabs(last) + fabs(durations[c])
+                    last = -new_dur if last < 0 else new_dur
+                continue
+
+            duration = durations.get(c)
+            if duration is None:
+                operator = operators.get(c)
+                if operator == TIE:
+                    tie_pending = True
+                elif operator is not None:
+                    if last is not None:
+                        if operator == NEGATE:
+                            last = -last
+                        elif operator == EXTEND:
+                            last = last + 0.5 * last
+                        elif last > float(1.0 / 1024):
+                            last = last / 2
+                elif unknown is not None:
+                    duration = unknown
+
+            if duration is not None:
+                if last is not None:
+                    result.append(last)
+                last = duration
+
+        self.last = last
+        self.tie_pending = tie_pending
+        return result
+
+    def finish(self):
+        """
+        Ends the string (a tie at its very end has no effect) and resets the decoder.
+
+        :return: the last duration, if any (array of floats)
+        """
+        result = array('d') if self.last is None else array('d', [self.last])
+        self.last = None
+        self.tie_pending = False
+        return result
+
+
+# Dictionary from a grammar specification to its DurationGrammar
+compiled_grammars = {}
+
+
+def compile_grammar(durations: dict, operators: dict = None, unknown=None):
+    """
+    Compiles a grammar, or returns the one already compiled from the same specification.
+
+    :param durations: dictionary from each duration symbol to its duration
+    :param operators: dictionary from each operator symbol to its operator (TIE, NEGATE, EXTEND or HALVE)
+    :param unknown: duration of the other symbols, None to ignore them
+    :return: the DurationGrammar
+    """
+    operators = operators if operators is not None else {}
+    spec = (tuple(sorted(durations.items())), tuple(sorted(operators.items())), unknown)
+    grammar = compiled_grammars.get(spec)
+    if grammar is None:
+        grammar = DurationGrammar(durations, operators, unknown)
+        compiled_grammars[spec] = grammar
+    return grammar
+
+
+def rhythm_array(rule_set, axiom: str, n: int, decoder: DurationGrammar):
+    """
+    Same as decoding rule_set.run(axiom, n) with decoder, but the symbols go from the L System to the decoder in
+    chunks, so the whole string is never built.
+
+    :param rule_set: the L System
+    :param axiom: first base string
+    :param n: number of iterations
+    :param decoder: grammar of the durations, e.g. grammar_complex()
+    :return: sequence of durations (array of floats)
+    """
+    state_machine = decoder.decoder()
+    rhythm = array('d')
+    for chunk in rule_set.iter_chunks(axiom, n):
+        rhythm.extend(state_machine.feed(chunk))
+    rhythm.extend(state_machine.finish())
+    return rhythm
@@ -1,4 +1,6 @@
+from math import isnan, nan
 from l_system.l_system_implementation import Rule, LSystem
+from l_system.duration_grammar import compile_grammar, TIE, NEGATE, EXTEND, HALVE
 from util import *
 
 
@@ -18,6 +20,11 @@ def run_complex_for(n, show_mode=False):
     return rules_complex().run(initial_complex(), n, show_mode)
 
 
+def grammar_complex():
+    return compile_grammar({'A': 2, 'B': 1, 'C': 1 / 2, 'D': 3 / 4},
+                           {'+': TIE, '-': NEGATE, '[': EXTEND})
+
+
 def sequence_from_string_complex(string: str):
     """
     To use with chars: A, B, C, D, +, -, [
@@ -29,50 +36,9 @@ def sequence_from_string_complex(string: str):
     -: make previous note a rest (value: -1 * duration of rest)
     [: extend previous duration by 50%
     :param string: input string
-    :return: sequence of durations (floats)
+    :return: sequence of durations (list of floats)
     """
-
-    def char_to_duration(c: str, tb: list):
-        if c == 'A':
-            tb.append(2)
-        elif c == 'B':
-            tb.append(1)
-        elif c == 'C':
-            tb.append(1 / 2)
-        elif c == 'D':
-            tb.append(3 / 4)
-        elif c == '[':
-            if len(tb) > 0:
-                tb[-1] = tb[-1] + 0.5 * tb[-1]
-        elif c == '-':
-            if len(tb) > 0:
-                tb[-1] = -tb[-1]
-        return tb[-1]
-
-    def is_duration_char(c: str):
-        return c in ['A', 'B', 'C', 'D']
-
-    str_arr = [c for c in string]
-    tab = []
-    while not len(str_arr) == 0:
-        nb_chars_read = 1
-
-        if str_arr[0] == '+' and len(str_arr) >= 2:
-            nb_chars_read = 2
-            if len(tab) > 0 and is_duration_char(str_arr[1]):
-                old_read = tab[-1]
-                new_read = char_to_duration(str_arr[1], tab)
-                new_dur = fabs(old_read) + fabs(new_read)
-                if old_read < 0:
-                    new_dur = -new_dur
-                tab[-2] = new_dur
-                tab = tab[:-1]
-
-        else:
-            char_to_duration(str_arr[0], tab)
-
-        str_arr = str_arr[nb_chars_read:]  # remove chars read
-    return tab
+    return grammar_complex().decode(string).tolist()
 
 
 def rules_bolero():
@@ -107,6 +73,13 @@ def run_bolero_for(n, show_mode=False):
     return rules_bolero().run(initial_bolero(), n, show_mode)
 
 
+def grammar_bolero():
+    return compile_grammar({"E": 1 / 2, "S": 1 / 4, "T": 1 / 8,
+                            "A": 1 / 3, "B": 2 / 3, "C": 3 / 4,
+                            "W": -1 / 4, "X": 1 / 5, "Y": 2 / 5, "Z": -1 / 2},
+                           unknown=nan)
+
+
 def sequence_from_string_bolero(string: str):
     """
     To use with chars in chars_bolero
@@ -125,25 +98,12 @@ def sequence_from_string_bolero(string: str):
     Y: two quintuplets
     Z: eight note rest
 
+    Other chars give None.
+
     :param string: input string
     :return: sequence of durations (floats)
     """
-    note_durations = {
-        "E": 1 / 2,
-        "S": 1 / 4,
-        "T": 1 / 8,
-
-        "A": 1 / 3,
-        "B": 2 / 3,
-        "C": 3 / 4,
-
-        "W": -1 / 4,
-        "X": 1 / 5,
-        "Y": 2 / 5,
-        "Z": -1 / 2
-    }
-
-    return [note_durations.get(c) for c in string]
+    return [None if isnan(duration) else duration for duration in grammar_bolero().decode(string)]
 
 
 def rules_slow():
@@ -161,6 +121,10 @@ def run_slow_for(n, show_mode=False):
     return rules_complex().run(initial_complex(), n, show_mode)
 
 
+def grammar_slow():
+    return compile_grammar({'A': 2, 'B': 1, 'D': 3 / 4}, {'-': NEGATE, '[': EXTEND})
+
+
 def sequence_from_string_slow(string: str):
     """
     To use with chars: A, B, D, -, [
@@ -171,30 +135,9 @@ def sequence_from_string_slow(string: str):
     -: make previous note a rest (value: -1 * duration of rest)
     [: extend previous duration by 50%
     :param string: input string
-    :return: sequence of durations (floats)
+    :return: sequence of durations (list of floats)
     """
-
-    def char_to_duration(c: str, tb: list):
-        if c == 'A':
-            tb.append(2)
-        elif c == 'B':
-            tb.append(1)
-        elif c == 'D':
-            tb.append(3 / 4)
-        elif c == '[':
-            if len(tb) > 0:
-                tb[-1] = tb[-1] + 0.5 * tb[-1]
-        elif c == '-':
-            if len(tb) > 0:
-                tb[-1] = -tb[-1]
-        return tb[-1]
-
-    str_arr = [c for c in string]
-    tab = []
-    while not len(str_arr) == 0:
-        char_to_duration(str_arr[0], tab)
-        str_arr = str_arr[1:]  # remove chars read
-    return tab
+    return grammar_slow().decode(string).tolist()
 
 
 def rules_slow_2():
@@ -211,6 +154,10 @@ def run_slow_2_for(n, show_mode=False):
     return rules_complex().run(initial_complex(), n, show_mode)
 
 
+def grammar_slow_2():
+    return compile_grammar({'A': 2, 'B': 1.5}, {'-': NEGATE, '[': EXTEND})
+
+
 def sequence_from_string_slow_2(string: str):
     """
     To use with chars: A, B, -, [
@@ -220,29 +167,9 @@ def sequence_from_string_slow_2(string: str):
     -: make previous note a rest (value: -1 * duration of rest)
     [: extend previous duration by 50%
     :param string: input string
-    :return: sequence of durations (floats)
+    :return: sequence of durations (list of floats)
     """
-
-    def char_to_duration(c: str, tb: list):
-        if c == 'A':
-            tb.append(2)
-        elif c == 'B':
-            tb.append(1.5)
-        elif c == '[':
-            if len(tb) > 0:
-                tb[-1] = tb[-1] + 0.5 * tb[-1]
-        elif c == '-':
-            if len(tb) > 0:
-                tb[-1] = -tb[-1]
-        return tb[-1]
-
-    str_arr = [c for c in string]
-    tab = []
-    while not len(str_arr) == 0:
-        char_to_duration(str_arr[0], tab)
-        str_arr = str_arr[1:]  # remove chars read
-
-    return tab
+    return grammar_slow_2().decode(string).tolist()
 
 
 def rules_complex_orig():
@@ -266,6 +193,11 @@ def run_complex_orig_for(n, show_mode=False):
     return rules_complex_orig().run(initial_complex_orig(), n, show_mode)
 
 
+def grammar_complex_orig():
+    return compile_grammar({'A': 2, 'B': 1, 'C': 1 / 2, 'D': 1 / 4, 'E': 1 / 3},
+                           {'+': TIE, '-': NEGATE, '[': EXTEND, ']': HALVE})
+
+
 def sequence_from_string_complex_orig(string: str):
     """
     To use with chars: A, B, C, D, E, +, -, [, ]
@@ -279,56 +211,6 @@ def sequence_from_string_complex_orig(string: str):
     [: extend previous duration by 50%
     ]: divide previous duration by 2
     :param string: input string
-    :return: sequence of durations
+    :return: sequence of durations (list of floats)
     """
-
-    def char_to_duration(c: str, tb: list):
-        if c == 'A':
-            tb.append(2)
-        elif c == 'B':
-            tb.append(1)
-        elif c == 'C':
-            tb.append(1 / 2)
-        elif c == 'D':
-            tb.append(1 / 4)
-        elif c == 'E':
-            tb.append(1 / 3)
-        elif c == '[':
-            if len(tb) > 0:
-                tb[-1] = tb[-1] + 0.5 * tb[-1]
-        elif c == ']':
-            if len(tb) > 0:
-                if tb[-1] > float(1.0 / 1024):
-                    tb[-1] = tb[-1] / 2
-        elif c == '-':
-            if len(tb) > 0:
-                tb[-1] = -tb[-1]
-        if len(tb) > 0:
-            return tb[-1]
-        else:
-            return 1
-
-    def is_duration_char(c: str):
-        return c in ['A', 'B', 'C', 'D', 'E']
-
-    str_arr = [c for c in string]
-    tab = []
-    while not len(str_arr) == 0:
-        nb_chars_read = 1
-
-        if str_arr[0] == '+' and len(str_arr) >= 2:
-            nb_chars_read = 2
-            if len(tab) > 0 and is_duration_char(str_arr[1]):
-                old_read = tab[-1]
-                new_read = char_to_duration(str_arr[1], tab)
-                new_dur = fabs(old_read) + fabs(new_read)
-                if old_read < 0:
-                    new_dur = -new_dur
-                tab[-2] = new_dur
-                tab = tab[:-1]
-
-        else:
-            char_to_duration(str_arr[0], tab)
-
-        str_arr = str_arr[nb_chars_read:]  # remove chars read
-    return tab
+    return grammar_complex_orig().decode(string).tolist()
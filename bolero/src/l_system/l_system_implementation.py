@@ -1,15 +1,105 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+MEMO_MAX_CHARS = 2 ** 20  # total number of characters kept by the expansion memo
+CHUNK_SIZE = 2 ** 16  # number of characters of the chunks of iter_chunks
+PARALLEL_CHUNK_SIZE = 2 ** 22  # number of symbols rewritten by a worker process at once in run_codes_parallel
+
+
+def matrix_product(a, b):
+    """
+    :param a: matrix, as a list of rows of Python ints
+    :param b: matrix, as a list of rows of Python ints
+    :return: the product a b (with exact integers, whatever their size)
+    """
+    columns = list(zip(*b))
+    return [[sum(x * y for x, y in zip(row, column)) for column in columns] for row in a]
+
+
+class ExpansionMemo:
+    """
+    Expansions of (rules, symbol, number of replacements, show_mode), shared by all the L Systems of the process, so
+    that two L Systems with the same rules (e.g. two calls of rules_bolero()) reuse each other's expansions. When the
+    expansions hold more than max_chars characters, the least recently used ones are evicted. Since it lives as long as
+    the process, MEMO_MAX_CHARS keeps it around a megabyte: the long expansions, which are the last ones of a run, are
+    rebuilt from the shorter ones below them.
+    """
+
+    def __init__(self, max_chars: int = MEMO_MAX_CHARS):
+        """
+        :param max_chars: largest total number of characters of the stored expansions
+        """
+        self.max_chars = max_chars
+        self.expansions = OrderedDict()
+        self.nb_chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        :param key: (rules, symbol, number of replacements, show_mode)
+        :return: the stored expansion, None if there is none
+        """
+        expansion = self.expansions.get(key)
+        if expansion is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.expansions.move_to_end(key)
+        return expansion
+
+    def put(self, key, expansion: str):
+        """
+        Stores an expansion (unless it is longer than max_chars) and evicts the least recently used ones if needed.
+        """
+        if len(expansion) > self.max_chars or key in self.expansions:
+            return
+        self.expansions[key] = expansion
+        self.nb_chars += len(expansion)
+        while self.nb_chars > self.max_chars:
+            evicted_key, evicted = self.expansions.popitem(last=False)
+            self.nb_chars -= len(evicted)
+            self.evictions += 1
+
+    def hit_rate(self):
+        """
+        :return: the fraction of the lookups that found their expansion, None if there was no lookup
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else None
+
+    def clear(self):
+        """
+        Forgets all the expansions and resets the counters.
+        """
+        self.expansions.clear()
+        self.nb_chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+expansion_memo = ExpansionMemo()
+
+
 class Rule:
     """
     Encodes L Systems' replacement rules.
     """
 
-    def __init__(self, base: str, replacement: str):
+    def __init__(self, base: str, replacement: str, weight: float = 1):
         """
         :param base: string,
         :param replacement: string
+        :param weight: relative probability of this rule among the rules of the same base, in a StochasticLSystem
         """
         self.base = base
         self.replacement = replacement
+        self.weight = weight
 
 
 class LSystem:
@@ -17,14 +107,16 @@ class LSystem:
     L System's functionality.
     """
 
-    def __init__(self, *rules):
+    def __init__(self, *rules, max_length: int = None):
         """
         An L System = a set of rules
 
         :param rules: List[Rule]
+        :param max_length: if given, run refuses to build a string longer than max_length
         """
         self.rules = {}
         [self.rules.update({rule.base: rule.replacement}) for rule in rules]
+        self.max_length = max_length
 
     def replace(self, base, show_mode: bool = False):
         """
@@ -55,7 +147,784 @@ class LSystem:
         :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
         :return: last result of rule applications
         """
-        string = initial
+        self.check_length(initial, nb_iterations, show_mode)
+        return self.expand(initial, nb_iterations, show_mode)
+
+    def expand(self, initial: str, nb_iterations: int, show_mode: bool = False, memo: ExpansionMemo = None):
+        """
+        Same result as applying the replace method nb_iterations times, but symbol by symbol: the expansion of a
+        symbol after d replacements is the concatenation of the expansions of the symbols of its replacement after
+        d - 1 replacements. Each (symbol, d) is only expanded once, and the expansions are kept in memo for the next
+        calls.
+
+        The symbols to expand at each depth are listed first, from the top; their expansions are then built from the
+        bottom, only keeping those of the depth below the one being built.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :param memo: the ExpansionMemo where the expansions are looked up and stored, None for expansion_memo
+        :return: last result of rule applications
+        """
+        memo = expansion_memo if memo is None else memo
+        rules_key = tuple(sorted(self.rules.items()))
+
+        def replacement(c):
+            return "<" + self.rules.get(c) + ">" if show_mode else self.rules.get(c)
+
+        # levels[remaining]: (expansions found in memo, symbols left to expand), for the symbols with a rule
+        levels = {}
+        symbols = {c for c in set(initial) if c in self.rules}
+        for remaining in range(nb_iterations, 0, -1):
+            found, to_expand = {}, []
+            for c in symbols:
+                memo_value = memo.get((rules_key, c, remaining, show_mode))
+                if memo_value is not None:
+                    found[c] = memo_value
+                else:
+                    to_expand.append(c)
+            levels[remaining] = (found, to_expand)
+            symbols = {d for c in to_expand for d in replacement(c) if d in self.rules}
+
+        # expanded: symbol -> expansion at the depth just built (a symbol without a rule is its own expansion)
+        expanded = {}
+        for remaining in range(1, nb_iterations + 1):
+            found, to_expand = levels.pop(remaining)
+            for c in to_expand:
+                expansion = "".join(expanded.get(d, d) for d in replacement(c))
+                memo.put((rules_key, c, remaining, show_mode), expansion)
+                found[c] = expansion
+            expanded = found
+
+        return "".join(expanded.get(c, c) for c in initial)
+
+    def check_length(self, initial: str, nb_iterations: int, show_mode: bool = False):
+        """
+        Raises a ValueError if the result of run would be longer than max_length
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        """
+        if self.max_length is not None:
+            result_length = self.length(initial, nb_iterations, show_mode)
+            if result_length > self.max_length:
+                raise ValueError("the result would have {} symbols, more than max_length = {}"
+                                 .format(result_length, self.max_length))
+
+    def production_matrix(self, alphabet, show_mode: bool = False):
+        """
+        :param alphabet: list of characters, as returned by alphabet
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: matrix (list of rows of ints) whose entry (i, j) is the number of alphabet[j] in what one
+                 replacement turns alphabet[i] into
+        """
+        matrix = []
+        for c in alphabet:
+            if c in self.rules:
+                replacement = self.rules.get(c)
+                replacement = "<" + replacement + ">" if show_mode else replacement
+            else:
+                replacement = c
+            matrix.append([replacement.count(d) for d in alphabet])
+        return matrix
+
+    def symbol_counts(self, initial: str, nb_iterations: int, show_mode: bool = False):
+        """
+        Number of occurrences of each symbol in the result of run, without building it: the counts of initial are
+        multiplied by the nb_iterations-th power of the production matrix, computed by repeated squaring (so with a
+        number of matrix products logarithmic in nb_iterations).
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: dictionary from each character to its number of occurrences (0 included)
+        """
+        alphabet = self.alphabet(initial, show_mode)
+        counts = [[initial.count(c) for c in alphabet]]
+        power = self.production_matrix(alphabet, show_mode)
+        while nb_iterations > 0:
+            if nb_iterations % 2 == 1:
+                counts = matrix_product(counts, power)
+            nb_iterations //= 2
+            if nb_iterations > 0:
+                power = matrix_product(power, power)
+        return dict(zip(alphabet, counts[0]))
+
+    def length(self, initial: str, nb_iterations: int, show_mode: bool = False):
+        """
+        Length of the result of run, without building it (see symbol_counts)
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: number of characters of the last result of rule applications
+        """
+        return sum(self.symbol_counts(initial, nb_iterations, show_mode).values())
+
+    def total_duration(self, initial: str, nb_iterations: int, durations: dict):
+        """
+        Sum of the durations of the symbols of the result of run, without building it. Only exact for sequences where
+        each symbol stands for one duration on its own (as in sequence_from_string_bolero), not when some symbols
+        modify the previous duration.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param durations: dictionary from a character to its duration, the other characters lasting 0
+        :return: total duration
+        """
+        counts = self.symbol_counts(initial, nb_iterations)
+        return sum(count * durations.get(c, 0) for c, count in counts.items())
+
+    def iter_symbols(self, initial: str, nb_iterations: int, show_mode: bool = False):
+        """
+        Generates the result of run symbol by symbol, by expanding each symbol of initial depth first: only the
+        replacements being read at each depth are kept, so the memory used grows with nb_iterations and not with the
+        length of the result, and the consumer can stop at any time.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: iterator over the characters of the last result of rule applications
+        """
+        # For each depth being expanded: the iterator over its string and the number of replacements left to apply
+        stack = [(iter(initial), nb_iterations)]
+        while len(stack) > 0:
+            symbols, remaining = stack[-1]
+            c = next(symbols, None)
+            if c is None:
+                stack.pop()
+            elif remaining == 0 or c not in self.rules:
+                # A symbol without rule is left as it is by all the following replacements
+                yield c
+            else:
+                replacement = self.rules.get(c)
+                stack.append((iter("<" + replacement + ">" if show_mode else replacement), remaining - 1))
+
+    def expansion_lengths(self, alphabet, nb_iterations: int, show_mode: bool = False):
+        """
+        :param alphabet: list of characters, as returned by alphabet
+        :param nb_iterations: largest number of replacements
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: list of nb_iterations + 1 dictionaries, the d-th one giving for each character the length of what d
+                 replacements turn it into
+        """
+        lengths = [{c: 1 for c in alphabet}]
+        for depth in range(nb_iterations):
+            previous = lengths[-1]
+            current = {}
+            for c in alphabet:
+                if c in self.rules:
+                    current[c] = sum(previous[d] for d in self.rules.get(c))
+                    if show_mode:
+                        current[c] += previous["<"] + previous[">"]
+                else:
+                    current[c] = 1
+            lengths.append(current)
+        return lengths
+
+    def slice(self, initial: str, nb_iterations: int, start: int = None, stop: int = None, show_mode: bool = False):
+        """
+        Same as run(initial, nb_iterations, show_mode)[start:stop], without building the whole result: knowing the
+        length of the expansion of each symbol at each depth, the symbols whose expansion ends before start are skipped
+        whole, and only the symbols that overlap the slice are expanded. The cost grows with nb_iterations and the
+        length of the slice instead of the length of the result.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param start: index of the first character, negative to count from the end, None for the beginning
+        :param stop: index after the last character, negative to count from the end, None for the end
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: the slice of the last result of rule applications
+        """
+        lengths = self.expansion_lengths(self.alphabet(initial, show_mode), nb_iterations, show_mode)
+        total = sum(lengths[nb_iterations][c] for c in initial)
+        start, stop, step = slice(start, stop).indices(total)
+
+        pieces = []
+        position = 0  # index in the result of the next symbol
+        stack = [(iter(initial), nb_iterations)]
+        while len(stack) > 0 and position < stop:
+            symbols, remaining = stack[-1]
+            c = next(symbols, None)
+            if c is None:
+                stack.pop()
+            elif position + lengths[remaining][c] <= start:
+                position += lengths[remaining][c]
+            elif remaining == 0 or c not in self.rules:
+                pieces.append(c)
+                position += 1
+            else:
+                replacement = self.rules.get(c)
+                stack.append((iter("<" + replacement + ">" if show_mode else replacement), remaining - 1))
+        return "".join(pieces)
+
+    def iter_chunks(self, initial: str, nb_iterations: int, show_mode: bool = False, chunk_size: int = CHUNK_SIZE):
+        """
+        Generates the result of run in consecutive chunks of about chunk_size characters: the symbols whose expansion
+        is shorter than chunk_size are expanded whole (with expand), the longer ones are descended into, so that the
+        whole result is never built. The expansions are kept in a memo of this call holding at most chunk_size
+        characters, not in expansion_memo, so that the memory used does not grow with the result.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :param chunk_size: number of characters from which a chunk is generated
+        :return: iterator over strings whose concatenation is the last result of rule applications
+        """
+        lengths = self.expansion_lengths(self.alphabet(initial, show_mode), nb_iterations, show_mode)
+        memo = ExpansionMemo(chunk_size)
+        pieces = []
+        nb_chars = 0
+        stack = [(iter(initial), nb_iterations)]
+        while len(stack) > 0:
+            symbols, remaining = stack[-1]
+            c = next(symbols, None)
+            if c is None:
+                stack.pop()
+            elif lengths[remaining][c] <= chunk_size or remaining == 0 or c not in self.rules:
+                pieces.append(self.expand(c, remaining, show_mode, memo))
+                nb_chars += lengths[remaining][c]
+                if nb_chars >= chunk_size:
+                    yield "".join(pieces)
+                    pieces = []
+                    nb_chars = 0
+            else:
+                replacement = self.rules.get(c)
+                stack.append((iter("<" + replacement + ">" if show_mode else replacement), remaining - 1))
+        if nb_chars > 0:
+            yield "".join(pieces)
+
+    def alphabet(self, initial: str, show_mode: bool = False):
+        """
+        All the symbols that can appear when running the L System from initial
+
+        :param initial: first base string
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: sorted list of characters
+        """
+        return _alphabet(initial, self.rules.values(), show_mode)
+
+    def replacement_table(self, alphabet, show_mode: bool = False):
+        """
+        :param alphabet: list of characters, as returned by alphabet
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: (lengths, starts, table) where table is the array of the indices in alphabet of the characters of the
+                 replacements of all the symbols (the symbol itself when there is no rule) concatenated, and the
+                 replacement of alphabet[i] is table[starts[i]:starts[i] + lengths[i]]
+        """
+        replacements = []
+        for c in alphabet:
+            if c in self.rules:
+                replacement = self.rules.get(c)
+                replacements.append("<" + replacement + ">" if show_mode else replacement)
+            else:
+                replacements.append(c)
+        return _concatenate_replacements(alphabet, replacements)
+
+    def run_codes(self, initial: str, nb_iterations: int, show_mode: bool = False):
+        """
+        Same as run, but on NumPy arrays of symbol codes: every iteration looks up the length of the replacement of
+        each symbol, computes where each replacement starts in the new string with a cumulated sum, and gathers all
+        the symbols of the new string from the concatenated replacements at once.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: (alphabet, codes) where alphabet is the list of characters and codes the array of the indices in
+                 alphabet of the characters of the last result
+        """
+        self.check_length(initial, nb_iterations, show_mode)
+        alphabet = self.alphabet(initial, show_mode)
+        index = {c: i for i, c in enumerate(alphabet)}
+        lengths, starts, table = self.replacement_table(alphabet, show_mode)
+
+        codes = np.array([index[c] for c in initial], dtype=table.dtype)
         for i in range(nb_iterations):
-            string = self.replace(string, show_mode)
-        return string
+            codes = _rewrite(codes, lengths, starts, table)
+        return alphabet, codes
+
+    @staticmethod
+    def decode(alphabet, codes):
+        """
+        :param alphabet: list of characters
+        :param codes: array of indices in alphabet
+        :return: the string of the characters of codes
+        """
+        if all(ord(c) < 128 for c in alphabet):
+            return np.frombuffer("".join(alphabet).encode("ascii"), dtype=np.uint8)[codes].tobytes().decode("ascii")
+        return "".join(np.array(alphabet)[codes])
+
+    def run_vectorised(self, initial: str, nb_iterations: int, show_mode: bool = False):
+        """
+        Same result as run, computed with run_codes
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: last result of rule applications
+        """
+        return LSystem.decode(*self.run_codes(initial, nb_iterations, show_mode))
+
+    def run_to_file(self, initial: str, nb_iterations: int, path: str, show_mode: bool = False,
+                    chunk_size: int = CHUNK_SIZE):
+        """
+        Same result as run, written as ASCII bytes to the file path instead of being kept in memory: every iteration
+        reads the previous one from a memory-mapped file, chunk_size symbols at a time, and writes its replacements
+        (gathered as in run_codes) to the next memory-mapped file, whose length is known in advance from length.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param path: path of the result file (the files path.0 and path.1 are used while running)
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :param chunk_size: number of symbols replaced at once
+        :return: read-only memory-mapped view of the result (array of bytes, see file_chunks)
+        """
+        alphabet = self.alphabet(initial, show_mode)
+        if not all(ord(c) < 128 for c in alphabet):
+            raise ValueError("run_to_file only writes ASCII symbols")
+        lengths, starts, table = self.replacement_table(alphabet, show_mode)
+        # Same table, indexed by the ASCII code of the symbols instead of their index in alphabet
+        ascii_codes = np.frombuffer("".join(alphabet).encode("ascii"), dtype=np.uint8)
+        byte_lengths = np.zeros(128, dtype=np.int64)
+        byte_lengths[ascii_codes] = lengths
+        byte_starts = np.zeros(128, dtype=np.int64)
+        byte_starts[ascii_codes] = starts
+        byte_table = ascii_codes[table]
+
+        previous = np.frombuffer(initial.encode("ascii"), dtype=np.uint8)
+        result_path = None
+        for i in range(nb_iterations):
+            total = self.length(initial, i + 1, show_mode)
+            result_path = "{}.{}".format(path, i % 2)
+            if total == 0:
+                open(result_path, "wb").close()
+                previous = np.zeros(0, dtype=np.uint8)
+                continue
+            result = np.memmap(result_path, dtype=np.uint8, mode="w+", shape=(total,))
+            position = 0
+            for start in range(0, len(previous), chunk_size):
+                replaced = _rewrite(previous[start:start + chunk_size], byte_lengths, byte_starts, byte_table)
+                result[position:position + len(replaced)] = replaced
+                position += len(replaced)
+            result.flush()
+            del result
+            previous = np.memmap(result_path, dtype=np.uint8, mode="r")
+
+        if result_path is None:
+            with open(path, "wb") as file:
+                file.write(initial.encode("ascii"))
+        else:
+            del previous
+            os.replace(result_path, path)
+            other_path = "{}.{}".format(path, (nb_iterations - 1) % 2 ^ 1)
+            if os.path.exists(other_path):
+                os.remove(other_path)
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(path, dtype=np.uint8, mode="r")
+
+    def run_codes_parallel(self, initial: str, nb_iterations: int, show_mode: bool = False, processes: int = None,
+                           chunk_size: int = PARALLEL_CHUNK_SIZE):
+        """
+        Same result as run_codes, every iteration being split in chunks rewritten by worker processes. The iterations
+        are kept in shared memory, and each iteration takes two passes over the chunks: the workers first compute the
+        length of the replacement of their chunk, which gives (by a cumulated sum) where it starts in the new
+        iteration, then write it there. Iterations shorter than chunk_size are rewritten in this process, and the next
+        longer one is copied to a new block of shared memory first.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :param processes: number of worker processes, None for as many as CPUs
+        :param chunk_size: number of symbols rewritten by a worker process at once
+        :return: (alphabet, codes) as in run_codes
+        """
+        self.check_length(initial, nb_iterations, show_mode)
+        alphabet = self.alphabet(initial, show_mode)
+        index = {c: i for i, c in enumerate(alphabet)}
+        lengths, starts, table = self.replacement_table(alphabet, show_mode)
+        codes = np.array([index[c] for c in initial], dtype=table.dtype)
+
+        blocks = []
+        shared = False  # whether codes is the block blocks[-1]
+        try:
+            with ProcessPoolExecutor(processes) as executor:
+                for i in range(nb_iterations):
+                    if len(codes) <= chunk_size:
+                        codes = _rewrite(codes, lengths, starts, table)
+                        shared = False
+                        continue
+                    if not shared:
+                        while len(blocks) > 0:
+                            stale = blocks.pop()
+                            stale.close()
+                            stale.unlink()
+                        blocks.append(SharedMemory(create=True, size=codes.nbytes))
+                        np.ndarray(codes.shape, codes.dtype, buffer=blocks[-1].buf)[:] = codes
+                    source = blocks[-1]
+                    bounds = list(range(0, len(codes), chunk_size)) + [len(codes)]
+                    chunks = list(zip(bounds[:-1], bounds[1:]))
+
+                    totals = list(executor.map(_chunk_length, [source.name] * len(chunks), [len(codes)] * len(chunks),
+                                               chunks, [lengths] * len(chunks), [table.dtype] * len(chunks)))
+                    offsets = np.concatenate(([0], np.cumsum(totals)))
+                    total = int(offsets[-1])
+                    blocks.append(SharedMemory(create=True, size=max(1, total * table.itemsize)))
+                    list(executor.map(_rewrite_chunk, [source.name] * len(chunks), [len(codes)] * len(chunks),
+                                      [blocks[-1].name] * len(chunks), [total] * len(chunks), chunks,
+                                      offsets[:-1].tolist(), [(lengths, starts, table)] * len(chunks)))
+
+                    # A block cannot be closed while a view on its buffer exists
+                    codes = None
+                    source.close()
+                    source.unlink()
+                    blocks.remove(source)
+                    codes = np.ndarray((total,), table.dtype, buffer=blocks[-1].buf)
+                    shared = True
+                codes = np.array(codes)
+        except BaseException:
+            # The error is the one to report, not one of the clean up
+            codes = None
+            _release_blocks(blocks)
+            raise
+        error = _release_blocks(blocks)
+        if error is not None:
+            raise error
+        return alphabet, codes
+
+
+def _release_blocks(blocks):
+    """
+    Closes and unlinks shared memory blocks, all of them even if some fail.
+
+    :param blocks: list of SharedMemory
+    :return: the first error met, None if there was none
+    """
+    errors = []
+    for block in blocks:
+        for release in (block.close, block.unlink):
+            try:
+                release()
+            except (BufferError, OSError) as error:
+                errors.append(error)
+    return errors[0] if len(errors) > 0 else None
+
+
+def _alphabet(initial: str, replacements, show_mode: bool = False):
+    """
+    :param initial: first base string
+    :param replacements: iterable over the replacements of the rules
+    :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+    :return: sorted list of the characters of initial and of the replacements
+    """
+    symbols = set(initial)
+    for replacement in replacements:
+        symbols.update(replacement)
+    if show_mode:
+        symbols.update("<>")
+    return sorted(symbols)
+
+
+def _concatenate_replacements(alphabet, replacements):
+    """
+    :param alphabet: list of characters
+    :param replacements: list of strings over alphabet
+    :return: (lengths, starts, table) where table is the array of the indices in alphabet of the characters of the
+             replacements concatenated, and replacements[i] is table[starts[i]:starts[i] + lengths[i]]
+    """
+    index = {c: i for i, c in enumerate(alphabet)}
+    dtype = np.uint8 if len(alphabet) <= 256 else np.uint32
+    lengths = np.array([len(replacement) for replacement in replacements], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    table = np.array([index[c] for replacement in replacements for c in replacement], dtype=dtype)
+    return lengths, starts, table
+
+
+def _rewrite(codes, lengths, starts, table):
+    """
+    :return: the codes of the replacements of codes (see LSystem.replacement_table)
+    """
+    new_lengths = lengths[codes]
+    new_ends = np.cumsum(new_lengths)
+    total = int(new_ends[-1]) if len(codes) > 0 else 0
+    # Position of each new symbol in table: start of its replacement + its offset inside the replacement
+    positions = np.repeat(starts[codes] - (new_ends - new_lengths), new_lengths)
+    positions += np.arange(total)
+    return table[positions]
+
+
+def _chunk_length(name: str, size: int, chunk, lengths, dtype):
+    """
+    Work of a worker process in the first pass of LSystem.run_codes_parallel.
+
+    :return: the length of the replacement of the chunk (start, stop) of the codes in the shared memory block name
+    """
+    block = SharedMemory(name=name)
+    codes = np.ndarray((size,), dtype, buffer=block.buf)
+    total = int(lengths[codes[chunk[0]:chunk[1]]].sum())
+    del codes
+    block.close()
+    return total
+
+
+def _rewrite_chunk(name: str, size: int, result_name: str, result_size: int, chunk, offset: int, replacement_table):
+    """
+    Work of a worker process in the second pass of LSystem.run_codes_parallel: writes the replacement of the chunk
+    (start, stop) of the codes in the shared memory block name to the block result_name, from offset.
+    """
+    lengths, starts, table = replacement_table
+    block = SharedMemory(name=name)
+    result_block = SharedMemory(name=result_name)
+    codes = np.ndarray((size,), table.dtype, buffer=block.buf)
+    result = np.ndarray((result_size,), table.dtype, buffer=result_block.buf)
+    replaced = _rewrite(codes[chunk[0]:chunk[1]], lengths, starts, table)
+    result[offset:offset + len(replaced)] = replaced
+    del codes, result
+    block.close()
+    result_block.close()
+
+
+def file_chunks(view, chunk_size: int = CHUNK_SIZE):
+    """
+    :param view: memory-mapped view returned by LSystem.run_to_file
+    :param chunk_size: number of characters of the chunks
+    :return: iterator over the consecutive chunks of the file, as strings (e.g. for DurationDecoder.feed)
+    """
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size].tobytes().decode("ascii")
+
+
+class StochasticLSystem:
+    """
+    L System where a symbol can have several rules: each occurrence of the symbol is replaced by one of them, drawn
+    according to their weights (uniformly with the default weights, as RandomRules of the mock project).
+
+    The rules are indexed once by symbol, and every iteration draws the rules of all the symbols of the string at once
+    from a seeded numpy.random.Generator, then builds the new string as LSystem.run_codes does. The same seed always
+    gives the same result.
+    """
+
+    def __init__(self, *rules, max_length: int = None):
+        """
+        :param rules: List[Rule], several of them can have the same base
+        :param max_length: if given, run refuses to build a string longer than max_length
+        """
+        self.rules = {}
+        for rule in rules:
+            if rule.weight <= 0:
+                raise ValueError("the weight of the rule {} -> {} is not positive".format(rule.base, rule.replacement))
+            self.rules.setdefault(rule.base, []).append((rule.replacement, rule.weight))
+        self.max_length = max_length
+
+    def alphabet(self, initial: str, show_mode: bool = False):
+        """
+        All the symbols that can appear when running the L System from initial
+
+        :param initial: first base string
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: sorted list of characters
+        """
+        return _alphabet(initial, (replacement for alternatives in self.rules.values()
+                                   for replacement, weight in alternatives), show_mode)
+
+    def run_codes(self, initial: str, nb_iterations: int, seed=None, show_mode: bool = False):
+        """
+        The alternatives (replacements) of all the symbols are concatenated, those of the symbol of code s being
+        delimited by s + their cumulated probabilities: the alternative of a symbol s is then found by a binary search
+        of s + u, where u is uniform in [0, 1), and all the symbols of an iteration are handled at once. The chosen
+        alternatives are then rewritten as in LSystem.run_codes.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param seed: seed of the numpy.random.Generator (an int, a numpy.random.SeedSequence or a Generator itself)
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: (alphabet, codes) where alphabet is the list of characters and codes the array of the indices in
+                 alphabet of the characters of the last result
+        """
+        rng = np.random.default_rng(seed)
+        alphabet = self.alphabet(initial, show_mode)
+        index = {c: i for i, c in enumerate(alphabet)}
+
+        replacements = []
+        bounds = []
+        for s, c in enumerate(alphabet):
+            alternatives = self.rules.get(c, [(c, 1)])
+            total = sum(weight for replacement, weight in alternatives)
+            cumulated = 0
+            for k, (replacement, weight) in enumerate(alternatives):
+                cumulated += weight
+                # The last bound is exactly s + 1, so that s + u never goes past the alternatives of s
+                bounds.append(s + (1 if k == len(alternatives) - 1 else cumulated / total))
+                replacements.append("<" + replacement + ">" if show_mode and c in self.rules else replacement)
+        bounds = np.array(bounds, dtype=np.float64)
+        lengths, starts, table = _concatenate_replacements(alphabet, replacements)
+
+        codes = np.array([index[c] for c in initial], dtype=table.dtype)
+        for i in range(nb_iterations):
+            chosen = np.searchsorted(bounds, codes + rng.random(len(codes)), side="right")
+            if self.max_length is not None:
+                total = int(lengths[chosen].sum())
+                if total > self.max_length:
+                    raise ValueError("iteration {} would have {} symbols, more than max_length = {}"
+                                     .format(i + 1, total, self.max_length))
+            codes = _rewrite(chosen, lengths, starts, table)
+        return alphabet, codes
+
+    def run(self, initial: str, nb_iterations: int, seed=None, show_mode: bool = False):
+        """
+        Applies nb_iterations random replacements with base string initial
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param seed: seed of the numpy.random.Generator (see run_codes)
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :return: last result of rule applications
+        """
+        return LSystem.decode(*self.run_codes(initial, nb_iterations, seed, show_mode))
+
+    def variants(self, initial: str, nb_iterations: int, nb_variants: int, seed=None, show_mode: bool = False,
+                 processes: int = None):
+        """
+        Runs the L System nb_variants times in parallel, on independent random streams spawned from seed: the same
+        seed always gives the same variants, whatever the number of processes.
+
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        :param nb_variants: number of results
+        :param seed: seed of the numpy.random.SeedSequence of the variants (an int or None)
+        :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+        :param processes: number of worker processes, None for as many as CPUs, 1 to stay in this process
+        :return: list of the nb_variants results
+        """
+        seeds = np.random.SeedSequence(seed).spawn(nb_variants)
+        if processes == 1:
+            return [self.run(initial, nb_iterations, variant_seed, show_mode) for variant_seed in seeds]
+        with ProcessPoolExecutor(processes) as executor:
+            futures = [executor.submit(self.run, initial, nb_iterations, variant_seed, show_mode)
+                       for variant_seed in seeds]
+            return [future.result() for future in futures]
+
+
+class ProvenanceIndex:
+    """
+    Where every symbol of the result of an L System comes from, without the brackets of show_mode.
+
+    Only the codes of initial are kept, and for every depth d < nb_iterations, offsets[d][i] is the position in
+    iteration d + 1 of the first symbol of the replacement of symbol i of iteration d (with a last entry equal to the
+    length of iteration d + 1). The symbol j of iteration d + 1 comes from the symbol i of iteration d such that
+    offsets[d][i] <= j < offsets[d][i + 1], found by a binary search: an ancestry is read by following these parents
+    up, then its symbols by following the replacements down from initial, and a span by following offsets down, in
+    O(nb_iterations log(length)).
+
+    With a grammar where each symbol is one duration (as grammar_bolero), the positions in the result are also the
+    positions in the rhythm, e.g. rhythm[start:stop] for the span of a Z.
+    """
+
+    def __init__(self, l_system: LSystem, initial: str, nb_iterations: int):
+        """
+        :param l_system: the L System
+        :param initial: first base string
+        :param nb_iterations: how many times rules replacements should occur
+        """
+        l_system.check_length(initial, nb_iterations)
+        self.l_system = l_system
+        self.alphabet = l_system.alphabet(initial)
+        self.nb_iterations = nb_iterations
+        index = {c: i for i, c in enumerate(self.alphabet)}
+        self.lengths, self.starts, self.table = l_system.replacement_table(self.alphabet)
+
+        self.initial_codes = np.array([index[c] for c in initial], dtype=self.table.dtype)
+        self.offsets = []
+        codes = self.initial_codes
+        for i in range(nb_iterations):
+            new_ends = np.cumsum(self.lengths[codes])
+            total = int(new_ends[-1]) if len(codes) > 0 else 0
+            index_dtype = np.int32 if total < 2 ** 31 else np.int64
+            self.offsets.append(np.concatenate(([0], new_ends)).astype(index_dtype))
+            codes = _rewrite(codes, self.lengths, self.starts, self.table)
+
+    def codes(self, depth: int = None):
+        """
+        :param depth: number of iterations, None for the last one
+        :return: the codes of that iteration, rewritten again from initial
+        """
+        codes = self.initial_codes
+        for d in range(self.nb_iterations if depth is None else depth):
+            codes = _rewrite(codes, self.lengths, self.starts, self.table)
+        return codes
+
+    def string(self, depth: int = None):
+        """
+        :param depth: number of iterations, None for the last one
+        :return: the string of that iteration
+        """
+        return LSystem.decode(self.alphabet, self.codes(depth))
+
+    def parent(self, depth: int, index: int):
+        """
+        :param depth: number of iterations, at least 1
+        :param index: index of a symbol of the iteration depth
+        :return: the index in the iteration depth - 1 of the symbol whose replacement gave it
+        """
+        return int(np.searchsorted(self.offsets[depth - 1], index, side="right")) - 1
+
+    def lineage(self, depth: int, index: int):
+        """
+        :return: list of (index, code) of the ancestors of the symbol at index in the iteration depth, from initial to
+                 the symbol itself
+        """
+        indices = [index]
+        for d in range(depth, 0, -1):
+            indices.append(self.parent(d, indices[-1]))
+        indices.reverse()
+        code = int(self.initial_codes[indices[0]])
+        chain = [(indices[0], code)]
+        for d in range(depth):
+            # The symbol is at indices[d + 1] - offsets[d][indices[d]] in the replacement of its parent
+            code = int(self.table[self.starts[code] + indices[d + 1] - self.offsets[d][indices[d]]])
+            chain.append((indices[d + 1], code))
+        return chain
+
+    def symbol(self, depth: int, index: int):
+        """
+        :return: the symbol at index in the iteration depth
+        """
+        return self.alphabet[self.lineage(depth, index)[-1][1]]
+
+    def ancestry(self, position: int):
+        """
+        :param position: index of a symbol of the result
+        :return: list of (depth, index, symbol, replacement) from the symbol of initial to the symbol at position, where
+                 replacement is what the rule of symbol gives (None for the last one, or when there is no rule)
+        """
+        chain = []
+        for depth, (index, code) in enumerate(self.lineage(self.nb_iterations, position)):
+            c = self.alphabet[code]
+            chain.append((depth, index, c, self.l_system.rules.get(c) if depth < self.nb_iterations else None))
+        return chain
+
+    def span(self, depth: int, index: int):
+        """
+        :param depth: number of iterations of the ancestor
+        :param index: index of the ancestor in that iteration
+        :return: (start, stop) such that the result[start:stop] is what the ancestor became
+        """
+        start, stop = index, index + 1
+        for d in range(depth, self.nb_iterations):
+            start, stop = int(self.offsets[d][start]), int(self.offsets[d][stop])
+        return start, stop
+
+    def spans(self, depth: int, symbol: str):
+        """
+        :param depth: number of iterations
+        :param symbol: a character
+        :return: list of (start, stop), one per occurrence of symbol in the iteration depth (see span)
+        """
+        if symbol not in self.alphabet:
+            return []
+        starts = np.flatnonzero(self.codes(depth) == self.alphabet.index(symbol))
+        stops = starts + 1
+        for d in range(depth, self.nb_iterations):
+            starts, stops = self.offsets[d][starts], self.offsets[d][stops]
+        return [(int(start), int(stop)) for start, stop in zip(starts, stops)]
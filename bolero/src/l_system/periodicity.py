@@ -0,0 +1,148 @@
+from collections import deque
+from l_system.l_system_implementation import LSystem
+
+"""
+Periodicity of the end of L System outputs, e.g. the tail of rules_bolero which converges to repetitions of ABAC.
+
+The shortest period of every suffix of a sequence is read from the prefix function of the reversed sequence: the
+suffix of length L has period L - pi[L - 1]. The periodic tail is the longest suffix which contains at least
+min_repeats times its period, and the offset is where it starts. Everything is linear in the length of the sequence,
+which can be a string, a list or an array of durations (durations are compared with ==, so a nan never repeats).
+
+The last iteration of an L System usually leaves a few symbols at the very end which are only rewritten by the next
+iteration (the ABAC or the Z at the end of rules_bolero): ignore_last leaves them out.
+"""
+
+WINDOW = 2 ** 16  # number of symbols kept by a PeriodicityDetector
+
+
+def prefix_function(sequence):
+    """
+    :param sequence: string or list of symbols
+    :return: list pi where pi[i] is the length of the longest proper prefix of sequence[:i + 1] which is also one of
+             its suffixes
+    """
+    pi = [0] * len(sequence)
+    k = 0
+    for i in range(1, len(sequence)):
+        while k > 0 and sequence[i] != sequence[k]:
+            k = pi[k - 1]
+        if sequence[i] == sequence[k]:
+            k += 1
+        pi[i] = k
+    return pi
+
+
+def tail_period(sequence, min_repeats: int = 2, ignore_last: int = 0):
+    """
+    :param sequence: string or list of symbols
+    :param min_repeats: number of times the period must be repeated in the tail
+    :param ignore_last: number of symbols at the end of sequence which are left out
+    :return: (period, offset) where sequence[offset:len(sequence) - ignore_last] is the longest suffix repeating its
+             period at least min_repeats times, None if there is none
+    """
+    end = len(sequence) - ignore_last
+    if end <= 0:
+        return None
+    reversed_tail = sequence[end - 1::-1] if isinstance(sequence, str) else list(sequence)[end - 1::-1]
+    pi = prefix_function(reversed_tail)
+
+    result = None
+    for length in range(1, end + 1):
+        period = length - pi[length - 1]
+        if length >= min_repeats * period:
+            result = (period, end - length)
+    return result
+
+
+class PeriodicityDetector:
+    """
+    tail_period of a sequence given in consecutive chunks, e.g. from LSystem.iter_chunks or DurationDecoder.feed.
+    Only the last window symbols are kept: when the periodic tail is longer than that, the offset returned is the
+    start of the window, so it is an upper bound of the real one.
+    """
+
+    def __init__(self, window: int = WINDOW, min_repeats: int = 2, ignore_last: int = 0):
+        """
+        :param window: number of symbols kept
+        :param min_repeats: number of times the period must be repeated in the tail
+        :param ignore_last: number of symbols at the end of the sequence which are left out
+        """
+        self.buffer = deque(maxlen=window)
+        self.min_repeats = min_repeats
+        self.ignore_last = ignore_last
+        self.nb_symbols = 0
+
+    def feed(self, chunk):
+        """
+        :param chunk: the next symbols of the sequence
+        """
+        self.buffer.extend(chunk)
+        self.nb_symbols += len(chunk)
+
+    def period(self):
+        """
+        :return: (period, offset) as in tail_period, the offset being counted from the start of the whole sequence;
+                 None if there is no periodic tail
+        """
+        result = tail_period(list(self.buffer), self.min_repeats, self.ignore_last)
+        if result is None:
+            return None
+        period, offset = result
+        return period, offset + self.nb_symbols - len(self.buffer)
+
+
+def convergence_profile(l_system: LSystem, initial: str, max_depth: int, min_repeats: int = 2, ignore_last: int = 0,
+                        window: int = WINDOW, show_mode: bool = False):
+    """
+    Periodic tail of every iteration of an L System, each one streamed from iter_chunks into a PeriodicityDetector.
+
+    :param l_system: the L System
+    :param initial: first base string
+    :param max_depth: last number of iterations
+    :param min_repeats: number of times the period must be repeated in the tail
+    :param ignore_last: number of symbols at the end of every iteration which are left out
+    :param window: number of symbols kept by the detector
+    :param show_mode: boolean deciding whether to put separating brackets or not between rule applications
+    :return: iterator over (depth, length, period, offset) for depth from 0 to max_depth, period and offset being None
+             if there is no periodic tail
+    """
+    for depth in range(max_depth + 1):
+        detector = PeriodicityDetector(window, min_repeats, ignore_last)
+        for chunk in l_system.iter_chunks(initial, depth, show_mode):
+            detector.feed(chunk)
+        period = detector.period()
+        yield (depth, detector.nb_symbols) + (period if period is not None else (None, None))
+
+
+def convergence_depth(l_system: LSystem, initial: str, max_depth: int, stable_depths: int = 3, min_repeats: int = 2,
+                      ignore_last: int = 0, window: int = WINDOW):
+    """
+    Iterates the L System until the period and the offset of its periodic tail stay the same for stable_depths
+    consecutive iterations (after which more iterations only make the periodic tail longer). A single repetition is
+    not enough: e.g. the tail of rules_bolero is a run of S (period 1) for two iterations before reaching its period.
+
+    :param l_system: the L System
+    :param initial: first base string
+    :param max_depth: largest number of iterations tried
+    :param stable_depths: number of consecutive iterations with the same period and offset
+    :param min_repeats: number of times the period must be repeated in the tail
+    :param ignore_last: number of symbols at the end of every iteration which are left out
+    :param window: number of symbols kept by the detector
+    :return: (depth, period, offset) for the first depth of the stable iterations, None if the tail has not converged
+             by max_depth
+    """
+    previous = None
+    first_depth = None
+    nb_stable = 0
+    for depth, length, period, offset in convergence_profile(l_system, initial, max_depth, min_repeats, ignore_last,
+                                                             window):
+        if period is not None and (period, offset) == previous:
+            nb_stable += 1
+        else:
+            first_depth = depth
+            nb_stable = 1
+        previous = (period, offset) if period is not None else None
+        if previous is not None and nb_stable >= stable_depths:
+            return first_depth, period, offset
+    return None
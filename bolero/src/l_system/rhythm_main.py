@@ -1,6 +1,9 @@
 import music21.stream
 
 from l_system.l_system_data import *
+from l_system.duration_grammar import rhythm_array
+from l_system.periodicity import convergence_depth
+from l_system.bar_index import BarIndex
 
 
 def combine_voices(length: int, rhythm, *voices, inst=None, time_sig='4/4'):
@@ -49,15 +52,19 @@ def combine_melody_rhythm(length: int, voices: music21.stream.Stream, sequence:
 
 
 if __name__ == "__main__":
-    rhythm = sequence_from_string_complex(run_complex_for(4))
-    length = int(len(rhythm) / 60)
+    rhythm = rhythm_array(rules_complex(), initial_complex(), 4, grammar_complex())
+    # About a 60th of the notes, cut at the end of a bar
+    length = BarIndex(rhythm, "3/4").align(int(len(rhythm) / 60))
     print(f"{length} notes kept")
     score = combine_voices(length, rhythm, [[7 for i in range(length)]], inst=None, time_sig="3/4")
 
-    bolero_rhythm = run_bolero_for(3, True)
-    print(f"end of the sequence: {bolero_rhythm[-60:]}")
+    bolero_end = rules_bolero().slice(initial_bolero(), 3, -60, None, True)
+    print(f"end of the sequence: {bolero_end}")
+    # The last 4 symbols (ABAC or Z) are only rewritten by the next iteration
+    bolero_convergence = convergence_depth(rules_bolero(), initial_bolero(), 10, ignore_last=4)
+    print(f"(depth, period, offset) of convergence: {bolero_convergence}")
 
-    bolero_rhythm = sequence_from_string_bolero(run_bolero_for(3, False))
+    bolero_rhythm = rhythm_array(rules_bolero(), initial_bolero(), 3, grammar_bolero())
     length = int(len(bolero_rhythm))
     bolero_score = combine_voices(length, bolero_rhythm, [[7 for _ in range(length)]], inst=[instrument.Woodblock()],
                                   time_sig="3/4")
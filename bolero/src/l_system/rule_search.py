@@ -0,0 +1,172 @@
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from l_system.l_system_data import *
+from l_system.duration_grammar import DurationGrammar
+from l_system.periodicity import tail_period
+
+"""
+Search of rule sets whose output converges to a target pattern, as rules_bolero converges to A B A C.
+
+Candidates are rule sets (dictionaries from a symbol to its replacement), drawn at random or mutated from the best ones
+found so far. Evaluating one never builds a whole iteration: the lengths come from LSystem.length, the tail of every
+iteration is taken with LSystem.slice and the duration statistics are computed on a bounded prefix. A candidate is
+rejected as soon as one check fails (it cannot produce the target symbols, it grows too fast, or it has not converged
+by max_depth), and the evaluations run in a pool of worker processes until the time budget is spent.
+"""
+
+SEARCH_TIME = 60  # seconds spent by search_rule_sets
+MAX_DEPTH = 8  # largest number of iterations tried for a candidate
+MAX_SEARCH_LENGTH = 10 ** 6  # length of the iteration max_depth above which a candidate is rejected
+PREFIX_LENGTH = 1000  # number of symbols of the prefix used for the duration statistics
+MAX_REPLACEMENT = 12  # largest length of a random replacement
+
+
+def evaluate_rule_set(rules: dict, initial: str, target: str, grammar: DurationGrammar = None,
+                      max_depth: int = MAX_DEPTH, max_length: int = MAX_SEARCH_LENGTH, min_repeats: int = 2,
+                      ignore_last: int = 0):
+    """
+    :param rules: dictionary from a symbol to its replacement
+    :param initial: first base string
+    :param target: pattern that the tail should repeat (any rotation of it is accepted)
+    :param grammar: grammar of the durations of the symbols, None to skip the duration statistics
+    :param max_depth: largest number of iterations tried
+    :param max_length: largest length of the iteration max_depth
+    :param min_repeats: number of times the target must be repeated at the end of the tail
+    :param ignore_last: number of symbols at the end of every iteration which are left out
+    :return: dictionary of the rules, the depth at which the tail converges, the length at that depth, the growth rate
+             of the length over the last two depths and the mean duration and fraction of rests of the prefix; None if
+             the candidate is rejected
+    """
+    l_system = LSystem(*[Rule(base, replacement) for base, replacement in rules.items()])
+    if not set(target) <= set(l_system.alphabet(initial)):
+        return None
+    final_length = l_system.length(initial, max_depth)
+    if final_length > max_length:
+        return None
+
+    tail_length = min_repeats * len(target) + ignore_last
+    for depth in range(1, max_depth + 1):
+        tail = l_system.slice(initial, depth, -tail_length, None)
+        result = tail_period(tail, min_repeats, ignore_last)
+        if result is not None and result[0] == len(target) and result[1] == 0 \
+                and tail[:len(target)] in target + target:
+            break
+    else:
+        return None
+
+    length = l_system.length(initial, depth)
+    evaluation = {"rules": dict(rules), "depth": depth, "length": length,
+                  "growth": final_length / max(1, l_system.length(initial, max_depth - 1))}
+    if grammar is not None:
+        durations = grammar.decode(l_system.slice(initial, depth, 0, PREFIX_LENGTH))
+        durations = [duration for duration in durations if not math.isnan(duration)]
+        evaluation["mean_duration"] = sum(abs(duration) for duration in durations) / max(1, len(durations))
+        evaluation["rest_fraction"] = sum(1 for duration in durations if duration < 0) / max(1, len(durations))
+    return evaluation
+
+
+def random_rule_set(alphabet: str, rng=random, max_replacement: int = MAX_REPLACEMENT):
+    """
+    :param alphabet: the symbols of the rule set
+    :param rng: source of randomness, the ``random`` module or a ``random.Random``
+    :param max_replacement: largest length of a replacement
+    :return: rule set with a random replacement for every symbol
+    """
+    return {c: "".join(rng.choice(alphabet) for _ in range(rng.randint(1, max_replacement))) for c in alphabet}
+
+
+def mutate_rule_set(rules: dict, alphabet: str, rng=random):
+    """
+    :param rules: dictionary from a symbol to its replacement
+    :param alphabet: the symbols which can be inserted
+    :param rng: source of randomness, the ``random`` module or a ``random.Random``
+    :return: copy of rules where one replacement has one symbol substituted, inserted or deleted
+    """
+    mutated = dict(rules)
+    base = rng.choice(sorted(mutated))
+    replacement = mutated[base]
+    i = rng.randrange(len(replacement) + 1)
+    operation = rng.choice(("substitute", "insert", "delete"))
+    if operation == "insert" or i == len(replacement):
+        replacement = replacement[:i] + rng.choice(alphabet) + replacement[i:]
+    elif operation == "substitute" or len(replacement) == 1:
+        replacement = replacement[:i] + rng.choice(alphabet) + replacement[i + 1:]
+    else:
+        replacement = replacement[:i] + replacement[i + 1:]
+    mutated[base] = replacement
+    return mutated
+
+
+def ranking(evaluation: dict):
+    """
+    :return: sort key of an evaluation: fastest convergence first, then shortest iteration at convergence
+    """
+    return evaluation["depth"], evaluation["length"]
+
+
+def search_rule_sets(initial: str, target: str, alphabet: str, seeds=(), grammar: DurationGrammar = None,
+                     time_budget: float = SEARCH_TIME, nb_best: int = 10, processes: int = None, rng=random,
+                     **evaluation_options):
+    """
+    Evaluates candidate rule sets in parallel until time_budget is spent. Every candidate is, with equal probability,
+    a random rule set or a mutation of one of the best rule sets found so far (or of seeds).
+
+    :param initial: first base string
+    :param target: pattern that the tail should repeat
+    :param alphabet: the symbols of the rule sets
+    :param seeds: rule sets (dictionaries) to start the mutations from, e.g. [rules_bolero().rules]
+    :param grammar: grammar of the durations of the symbols, None to skip the duration statistics
+    :param time_budget: duration of the search, in seconds
+    :param nb_best: number of rule sets returned
+    :param processes: number of worker processes, None for as many as CPUs
+    :param rng: source of randomness, the ``random`` module or a ``random.Random``
+    :param evaluation_options: max_depth, max_length, min_repeats and ignore_last of evaluate_rule_set
+    :return: the evaluations of the best rule sets found, best first
+    """
+    deadline = time.monotonic() + time_budget
+    seeds = [dict(seed) for seed in seeds]
+    best = []
+    evaluated = set()
+
+    def candidate():
+        parents = [evaluation["rules"] for evaluation in best] + seeds
+        if len(parents) > 0 and rng.random() < 0.5:
+            return mutate_rule_set(rng.choice(parents), alphabet, rng)
+        return random_rule_set(alphabet, rng)
+
+    nb_workers = processes if processes is not None else os.cpu_count()
+    with ProcessPoolExecutor(processes) as executor:
+        running = set()
+        while True:
+            while time.monotonic() < deadline and len(running) < 2 * nb_workers:
+                rules = candidate()
+                rules_key = tuple(sorted(rules.items()))
+                if rules_key in evaluated:
+                    continue
+                evaluated.add(rules_key)
+                running.add(executor.submit(evaluate_rule_set, rules, initial, target, grammar, **evaluation_options))
+            if len(running) == 0:
+                break
+            done, running = wait(running, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                evaluation = future.result()
+                if evaluation is not None:
+                    best = sorted(best + [evaluation], key=ranking)[:nb_best]
+            if time.monotonic() >= deadline:
+                for future in running:
+                    future.cancel()
+                break
+
+    return best
+
+
+if __name__ == "__main__":
+    # One period of the tail of rules_bolero: A B A C, without the Z of C
+    bolero_target = "ESSS" + "ESSSEE" + "ESSS" + "ESSSSSSSSS"
+    found = search_rule_sets(initial_bolero(), bolero_target, "ABCESTWXYZ", seeds=[rules_bolero().rules],
+                             grammar=grammar_bolero(), time_budget=30, ignore_last=4)
+    for evaluation in found:
+        print(evaluation)
@@ -0,0 +1,44 @@
+from array import array
+from math import nan
+import numpy as np
+import pytest
+from l_system.bar_index import *
+
+"""
+BarIndex on a hand-built rhythm in 3/4: triplets ending on a bar line, a rest, a nan (which lasts 0) and an incomplete
+last bar.
+"""
+
+#         bar 1                            | bar 2               | bar 3          | bar 4 (incomplete)
+RHYTHM = [1, 1, 1 / 3, 1 / 3, 1 / 3, -1, 1 / 2, 1 / 2, 1, 2, nan, 1, 1 / 2]
+BARS = [(0, 5), (5, 9), (9, 12), (12, 13)]
+
+
+@pytest.mark.parametrize("rhythm", [RHYTHM, array('d', RHYTHM)])
+def test_bars(rhythm):
+    bars = BarIndex(rhythm, "3/4")
+    assert bars.bar_length == 3
+    assert bars.total_duration() == pytest.approx(9.5)
+    assert bars.nb_bars() == 3
+    for number, (start, stop) in enumerate(BARS, start=1):
+        assert bars.bar_range(number) == (start, stop)
+        assert all(bars.bar_of(index) == number for index in range(start, stop))
+        assert np.array_equal(bars.bars(number), rhythm[start:stop], equal_nan=True)
+    assert bars.bar_range(2, 3) == (5, 12)
+    assert np.array_equal(bars.truncate(), rhythm[:12], equal_nan=True)
+    assert np.array_equal(bars.truncate(1), rhythm[:5])
+    assert len(bars.truncate(0)) == 0
+
+
+@pytest.mark.parametrize("stop, expected", [(0, 0), (4, 0), (5, 5), (8, 5), (9, 9), (11, 9), (12, 12), (13, 12),
+                                            (20, 12)])
+def test_align(stop, expected):
+    assert BarIndex(RHYTHM, "3/4").align(stop) == expected
+
+
+def test_other_time_signatures():
+    assert bar_length("4/4") == 4 and bar_length("6/8") == 3 and bar_length("2/2") == 4
+    bars = BarIndex(RHYTHM)
+    assert bars.nb_bars() == 2
+    assert bars.bar_range(1) == (0, 6) and bars.bar_range(2) == (6, 10)
+    assert BarIndex([]).total_duration() == 0 and BarIndex([]).nb_bars() == 0
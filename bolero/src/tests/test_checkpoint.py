@@ -0,0 +1,76 @@
+import random
+import pytest
+from harmonisation.checkpoint import *
+
+"""
+Jobs interrupted after some steps, saved, reloaded (after disturbing ``random`` and the ``transition`` dictionary, as
+a new process would) and finished, against the same jobs run without interruption from the same seed.
+"""
+
+BASS = [DO + OCTAVE, FA, SOL, DO, LA, RE, SOL, SI, DO + OCTAVE]
+START_CHORD = Chord(DO + OCTAVE, DO + 2 * OCTAVE, SOL + 2 * OCTAVE, MI + 3 * OCTAVE)
+SEGMENT = [DO + OCTAVE, LA, RE + OCTAVE, SOL, DO + OCTAVE]
+FIRST_CHORD = Chord(DO + OCTAVE, MI + OCTAVE, SOL + OCTAVE, MI + 2 * OCTAVE)
+SEED = 5
+
+
+def disturb():
+    random.seed(SEED + 1)
+    transition.clear()
+
+
+def composition_then_path(job: CompositionJob):
+    """
+    :return: the printed tree of the finished job and a path drawn in it with ``random``
+    """
+    tree = job.run()
+    return str(tree), [chord.to_list() for chord in select_path_in_tree_harm(len(BASS), tree)]
+
+
+@pytest.mark.parametrize("nb_steps", [1, 7, 30])
+def test_interrupted_composition_job(tmp_path, nb_steps):
+    random.seed(SEED)
+    transition.clear()
+    expected = composition_then_path(CompositionJob(START_CHORD, BASS[1:], Key.DO_MAJOR))
+    assert CompositionJob(START_CHORD, BASS[1:], Key.DO_MAJOR).run().level() == 49
+
+    random.seed(SEED)
+    transition.clear()
+    job = CompositionJob(START_CHORD, BASS[1:], Key.DO_MAJOR)
+    for _ in range(nb_steps):
+        job.step()
+    assert not job.done()
+    path = str(tmp_path / "checkpoint")
+    save_checkpoint(path, job)
+    disturb()
+
+    resumed = load_checkpoint(path, job.parameters())
+    assert resumed is not None and resumed.expanded == nb_steps
+    assert composition_then_path(resumed) == expected
+
+
+def test_interrupted_piece_job(tmp_path):
+    def new_job():
+        return PieceJob(Key.DO_MAJOR, SEGMENT, FIRST_CHORD, 3)
+
+    random.seed(SEED)
+    transition.clear()
+    expected = new_job().run()
+    disturb()
+    assert new_job().run() != expected
+
+    random.seed(SEED)
+    transition.clear()
+    job = new_job()
+    path = str(tmp_path / "checkpoint")
+    # Interrupted inside the second segment
+    while job.completed_segments < 1 or job.segment_job is None or job.segment_job.expanded < 2:
+        job.step()
+    save_checkpoint(path, job)
+    disturb()
+
+    assert run_resumable(path, new_job) == expected
+    assert not os.path.exists(path)
+    # The checkpoint of another job is not resumed
+    save_checkpoint(path, job)
+    assert load_checkpoint(path, PieceJob(Key.DO_MAJOR, SEGMENT, FIRST_CHORD, 2).parameters()) is None
@@ -0,0 +1,20 @@
+from harmonisation.chord_graph import *
+
+"""
+ChordGraph and the feasibility helpers built on it.
+"""
+
+BASS = [DO + OCTAVE, FA + OCTAVE, SOL + OCTAVE, DO + OCTAVE]
+
+
+def test_feasible_start_chords_respect_the_chord_rules():
+    graph = ChordGraph(Key.DO_MAJOR, BASS[1:])
+    starts = feasible_start_chords(Key.DO_MAJOR, BASS)
+    assert len(starts) > 0
+    for chord in candidate_voicings(BASS[0], Key.DO_MAJOR):
+        notes = tuple(chord.to_list())
+        valid = all(RULES[n](notes, notes, -1, False, Key.DO_MAJOR.value) for n in (4, 5, 6))
+        assert (chord in starts) == (valid and check_chord_rules(notes, False, Key.DO_MAJOR.value)
+                                     and graph.feasible(chord))
+    # A tripled C without its fifth: feasible for the graph, but not a valid chord
+    assert Chord(12, 16, 24, 24) not in starts
@@ -0,0 +1,254 @@
+import math
+import random
+from array import array
+from math import fabs
+import pytest
+from l_system.l_system_data import *
+
+"""
+The single-pass decoders of l_system_data against the quadratic decoders they replaced, kept below as the oracle.
+
+The decoders still return a list (with None for the unknown symbols of bolero), while the grammars behind them decode
+into an array('d') (with nan). One change is intended: an operator which comes before any duration is ignored, where
+the old decoders raised an IndexError. The oracle of a string is therefore the old decoder run on a dummy duration
+followed by the string, without that dummy: whatever the leading operators did to it is dropped, as the new decoders
+drop them.
+"""
+
+MAX_DEPTH = 6
+NB_RANDOM_STRINGS = 200
+MAX_RANDOM_LENGTH = 60
+
+
+def old_sequence_from_string_complex(string: str):
+    def char_to_duration(c: str, tb: list):
+        if c == 'A':
+            tb.append(2)
+        elif c == 'B':
+            tb.append(1)
+        elif c == 'C':
+            tb.append(1 / 2)
+        elif c == 'D':
+            tb.append(3 / 4)
+        elif c == '[':
+            if len(tb) > 0:
+                tb[-1] = tb[-1] + 0.5 * tb[-1]
+        elif c == '-':
+            if len(tb) > 0:
+                tb[-1] = -tb[-1]
+        return tb[-1]
+
+    def is_duration_char(c: str):
+        return c in ['A', 'B', 'C', 'D']
+
+    str_arr = [c for c in string]
+    tab = []
+    while not len(str_arr) == 0:
+        nb_chars_read = 1
+
+        if str_arr[0] == '+' and len(str_arr) >= 2:
+            nb_chars_read = 2
+            if len(tab) > 0 and is_duration_char(str_arr[1]):
+                old_read = tab[-1]
+                new_read = char_to_duration(str_arr[1], tab)
+                new_dur = fabs(old_read) + fabs(new_read)
+                if old_read < 0:
+                    new_dur = -new_dur
+                tab[-2] = new_dur
+                tab = tab[:-1]
+
+        else:
+            char_to_duration(str_arr[0], tab)
+
+        str_arr = str_arr[nb_chars_read:]  # remove chars read
+    return tab
+
+
+def old_sequence_from_string_bolero(string: str):
+    note_durations = {
+        "E": 1 / 2,
+        "S": 1 / 4,
+        "T": 1 / 8,
+
+        "A": 1 / 3,
+        "B": 2 / 3,
+        "C": 3 / 4,
+
+        "W": -1 / 4,
+        "X": 1 / 5,
+        "Y": 2 / 5,
+        "Z": -1 / 2
+    }
+
+    return [note_durations.get(c) for c in string]
+
+
+def old_sequence_from_string_slow(string: str):
+    def char_to_duration(c: str, tb: list):
+        if c == 'A':
+            tb.append(2)
+        elif c == 'B':
+            tb.append(1)
+        elif c == 'D':
+            tb.append(3 / 4)
+        elif c == '[':
+            if len(tb) > 0:
+                tb[-1] = tb[-1] + 0.5 * tb[-1]
+        elif c == '-':
+            if len(tb) > 0:
+                tb[-1] = -tb[-1]
+        return tb[-1]
+
+    str_arr = [c for c in string]
+    tab = []
+    while not len(str_arr) == 0:
+        char_to_duration(str_arr[0], tab)
+        str_arr = str_arr[1:]  # remove chars read
+    return tab
+
+
+def old_sequence_from_string_slow_2(string: str):
+    def char_to_duration(c: str, tb: list):
+        if c == 'A':
+            tb.append(2)
+        elif c == 'B':
+            tb.append(1.5)
+        elif c == '[':
+            if len(tb) > 0:
+                tb[-1] = tb[-1] + 0.5 * tb[-1]
+        elif c == '-':
+            if len(tb) > 0:
+                tb[-1] = -tb[-1]
+        return tb[-1]
+
+    str_arr = [c for c in string]
+    tab = []
+    while not len(str_arr) == 0:
+        char_to_duration(str_arr[0], tab)
+        str_arr = str_arr[1:]  # remove chars read
+
+    return tab
+
+
+def old_sequence_from_string_complex_orig(string: str):
+    def char_to_duration(c: str, tb: list):
+        if c == 'A':
+            tb.append(2)
+        elif c == 'B':
+            tb.append(1)
+        elif c == 'C':
+            tb.append(1 / 2)
+        elif c == 'D':
+            tb.append(1 / 4)
+        elif c == 'E':
+            tb.append(1 / 3)
+        elif c == '[':
+            if len(tb) > 0:
+                tb[-1] = tb[-1] + 0.5 * tb[-1]
+        elif c == ']':
+            if len(tb) > 0:
+                if tb[-1] > float(1.0 / 1024):
+                    tb[-1] = tb[-1] / 2
+        elif c == '-':
+            if len(tb) > 0:
+                tb[-1] = -tb[-1]
+        if len(tb) > 0:
+            return tb[-1]
+        else:
+            return 1
+
+    def is_duration_char(c: str):
+        return c in ['A', 'B', 'C', 'D', 'E']
+
+    str_arr = [c for c in string]
+    tab = []
+    while not len(str_arr) == 0:
+        nb_chars_read = 1
+
+        if str_arr[0] == '+' and len(str_arr) >= 2:
+            nb_chars_read = 2
+            if len(tab) > 0 and is_duration_char(str_arr[1]):
+                old_read = tab[-1]
+                new_read = char_to_duration(str_arr[1], tab)
+                new_dur = fabs(old_read) + fabs(new_read)
+                if old_read < 0:
+                    new_dur = -new_dur
+                tab[-2] = new_dur
+                tab = tab[:-1]
+
+        else:
+            char_to_duration(str_arr[0], tab)
+
+        str_arr = str_arr[nb_chars_read:]  # remove chars read
+    return tab
+
+
+# name: (new decoder, old decoder, rule sets with their first base string, symbols of the random strings)
+DECODERS = {
+    "complex": (sequence_from_string_complex, old_sequence_from_string_complex,
+                [(rules_complex, initial_complex)], "ABCD+-[X"),
+    "bolero": (sequence_from_string_bolero, old_sequence_from_string_bolero,
+               [(rules_bolero, initial_bolero)], "ABCESTWXYZ+-F"),
+    "slow": (sequence_from_string_slow, old_sequence_from_string_slow,
+             [(rules_slow, initial_slow), (rules_complex, initial_complex)], "ABCD+-[X"),
+    "slow_2": (sequence_from_string_slow_2, old_sequence_from_string_slow_2,
+               [(rules_slow_2, initial_slow_2), (rules_complex, initial_complex)], "AB+-[X"),
+    "complex_orig": (sequence_from_string_complex_orig, old_sequence_from_string_complex_orig,
+                     [(rules_complex_orig, initial_complex_orig)], "ABCDE+-[]F"),
+}
+
+
+def oracle(old_decoder, string: str):
+    """
+    :return: durations of string read by the old decoder, an operator before the first duration being ignored
+    """
+    if old_decoder is old_sequence_from_string_bolero:
+        return old_decoder(string)
+    return old_decoder("A" + string)[1:]
+
+
+def assert_same_durations(result, expected):
+    assert type(result) is list
+    assert result == expected
+
+
+@pytest.mark.parametrize("name", sorted(DECODERS))
+def test_generations(name):
+    decoder, old_decoder, rule_sets, _ = DECODERS[name]
+    for rules, initial in rule_sets:
+        for depth in range(MAX_DEPTH + 1):
+            string = rules().run(initial(), depth)
+            assert_same_durations(decoder(string), oracle(old_decoder, string))
+
+
+@pytest.mark.parametrize("name", sorted(DECODERS))
+def test_random_strings(name):
+    decoder, old_decoder, _, symbols = DECODERS[name]
+    rng = random.Random(name)
+    for _ in range(NB_RANDOM_STRINGS):
+        string = "".join(rng.choice(symbols) for _ in range(rng.randint(0, MAX_RANDOM_LENGTH)))
+        assert_same_durations(decoder(string), oracle(old_decoder, string))
+
+
+@pytest.mark.parametrize("name", ["complex", "slow", "slow_2"])
+def test_leading_operator_is_ignored(name):
+    decoder, old_decoder, _, _ = DECODERS[name]
+    with pytest.raises(IndexError):
+        old_decoder("-A")
+    assert_same_durations(decoder("-A"), [2.0])
+    assert_same_durations(decoder("[-[A-"), [-2.0])
+
+
+def test_unknown_bolero_symbol_is_none():
+    assert old_sequence_from_string_bolero("EFS") == [1 / 2, None, 1 / 4]
+    assert_same_durations(sequence_from_string_bolero("EFS"), [1 / 2, None, 1 / 4])
+
+
+def test_grammars_decode_into_arrays():
+    result = grammar_bolero().decode("EFS")
+    assert isinstance(result, array) and result.typecode == 'd'
+    assert result[0] == 1 / 2 and math.isnan(result[1]) and result[2] == 1 / 4
+    string = rules_complex().run(initial_complex(), 3)
+    result = grammar_complex().decode(string)
+    assert isinstance(result, array) and result.typecode == 'd'
+    assert result.tolist() == sequence_from_string_complex(string)
@@ -0,0 +1,32 @@
+import pytest
+import harmonisation.harmonisation as harmonisation
+from harmonisation.figured_bass import *
+
+"""
+FiguredChordGraph of root position chords only (all the figures 5/3) against the ChordGraph of the same bass line,
+under the default parameters and after changing them at run time.
+"""
+
+BASS = [DO + OCTAVE, FA, SOL, DO, LA, RE, SOL, SI, DO + OCTAVE]
+START_CHORD = Chord(DO + OCTAVE, DO + 2 * OCTAVE, SOL + 2 * OCTAVE, MI + 3 * OCTAVE)
+SETTINGS = [
+    {},
+    {"MAINTAIN_COMMON_NOTES": True},
+    {"RULE_10_ACTIVE": False},
+    {"RULE_10_ACTIVE": False, "RULE_11_ACTIVE": False},
+    {"EPSILON": 5},
+    {"MAX_S": FA_S_SOL_F + 3 * OCTAVE},
+]
+
+
+@pytest.mark.parametrize("settings", SETTINGS)
+def test_root_position_figures_match_chord_graph(settings, monkeypatch):
+    for name, value in settings.items():
+        monkeypatch.setattr(harmonisation, name, value)
+    graph = ChordGraph(Key.DO_MAJOR, BASS[1:])
+    figured_graph = FiguredChordGraph(Key.DO_MAJOR, [(note, "5/3") for note in BASS])
+    assert figured_graph.count(START_CHORD) == graph.count(START_CHORD) > 0
+    layers = [{START_CHORD}] + graph.reachable_layers(START_CHORD)
+    for layer in range(len(BASS) - 1):
+        for chord in layers[layer]:
+            assert set(figured_graph.successors(chord, layer)) == set(graph.successors(chord, layer))
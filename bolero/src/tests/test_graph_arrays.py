@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from harmonisation.graph_arrays import *
+
+"""
+CSR export of a chord graph and the random walks drawn on it.
+"""
+
+BASS = [DO + OCTAVE, FA, SOL, DO, LA, RE, SOL, SI, DO + OCTAVE]
+START_CHORD = Chord(DO + OCTAVE, DO + 2 * OCTAVE, SOL + 2 * OCTAVE, MI + 3 * OCTAVE)
+
+
+def csr_counts(csr: LayeredCSR):
+    """
+    :return: for each layer, the number of paths from each of its rows to the last layer, following the CSR edges
+    """
+    counts = [np.ones(len(csr.chords[-1]), dtype=np.int64)]
+    for layer in reversed(range(len(csr) - 1)):
+        edge_counts = counts[0][csr.indices[layer]]
+        counts.insert(0, np.array([edge_counts[start:stop].sum() for start, stop
+                                   in zip(csr.indptr[layer][:-1], csr.indptr[layer][1:])], dtype=np.int64))
+    return counts
+
+
+def test_count_weights_reproduce_chord_graph_count():
+    graph = ChordGraph(Key.DO_MAJOR, BASS[1:])
+    csr = export_csr(graph, START_CHORD, COUNT_WEIGHTS)
+    counts = csr_counts(csr)
+    assert counts[0][0] == graph.count(START_CHORD) > 1
+    for layer in range(len(csr) - 1):
+        for row, notes in enumerate(csr.chords[layer]):
+            chord = Chord.of(notes.tolist())
+            assert counts[layer][row] == graph.count(chord, layer)
+            start, stop = csr.indptr[layer][row], csr.indptr[layer][row + 1]
+            expected = counts[layer + 1][csr.indices[layer][start:stop]] / counts[layer][row]
+            assert np.allclose(csr.weights[layer][start:stop], expected)
+
+
+@pytest.mark.parametrize("weighting", [COUNT_WEIGHTS, UNIFORM_WEIGHTS])
+def test_walks_follow_the_edges(weighting):
+    graph = ChordGraph(Key.DO_MAJOR, BASS[1:])
+    walks = sample_walks(export_csr(graph, START_CHORD, weighting), 500, seed=1)
+    assert walks.shape == (500, len(BASS), 4)
+    for walk in np.unique(walks, axis=0):
+        chords = [Chord.of(notes) for notes in walk.tolist()]
+        assert chords[0] == START_CHORD
+        for layer in range(len(BASS) - 1):
+            assert chords[layer + 1] in graph.successors(chords[layer], layer)
+
+
+def test_no_harmonisation():
+    graph = ChordGraph(Key.DO_MAJOR, BASS[1:])
+    assert export_csr(graph, Chord(DO + OCTAVE, SOL, SOL + OCTAVE, DO + 2 * OCTAVE)) is None
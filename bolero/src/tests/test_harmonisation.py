@@ -0,0 +1,353 @@
+import random
+import pytest
+import harmonisation.harmonisation as harmonisation
+from harmonisation.chord_graph import *
+
+"""
+The per-rule predicates and masks of compute_next_chords against the filter they replaced, kept below as the oracle
+(it reads the rule switches and parameters from the harmonisation module, as the original did). The switches are
+toggled between calls without clearing transition_masks, so that the masks computed under other switches are reused.
+"""
+
+KEYS = [Key.DO_MAJOR, Key.LA_MINOR, Key.MI_F_MAJOR]
+NB_TRANSITIONS = 40
+
+
+def old_filter_w_rules(current_chord_list, options, next_next_degree, is_final_cadence, key_rules_input):
+    key_degrees = key_rules_input.value
+
+    # The temporary set that changes with respect to the rules
+    temp = options.copy()
+    ##############################################
+    # RULE 0 : NO BIG OVERTAKING BETWEEN VOICES
+    temp0 = set()
+    for next_chord in temp:
+
+        # Intervals between adjacent voices
+        b_t_interval = next_chord[1] - next_chord[0]
+        t_a_interval = next_chord[2] - next_chord[1]
+        a_s_interval = next_chord[3] - next_chord[2]
+
+        # The allowed overtaking between voices depends on whether there is a cadence or not
+        not_big_overtake_b_t = b_t_interval >= harmonisation.OVERTAKING_NO_CADENCE if is_final_cadence else b_t_interval >= harmonisation.OVERTAKING_CADENCE
+        not_big_overtake_t_a = t_a_interval >= harmonisation.OVERTAKING_NO_CADENCE if is_final_cadence else t_a_interval >= harmonisation.OVERTAKING_CADENCE
+        not_big_overtake_a_s = a_s_interval >= harmonisation.OVERTAKING_NO_CADENCE if is_final_cadence else a_s_interval >= harmonisation.OVERTAKING_CADENCE
+
+        if not_big_overtake_b_t and not_big_overtake_t_a and not_big_overtake_a_s:
+            temp0.add(next_chord)
+    temp = temp0 if harmonisation.RULE_0_ACTIVE else temp
+
+    ##############################################
+    # RULE 1 : NO DUPLICATION OF THE LEADING NOTE
+    temp1 = set()
+    for next_chord in temp:
+        ack = 0
+        for note in next_chord:
+            if note % 12 == key_degrees[LEADING_TONE]:
+                ack += 1
+        if 0 <= ack < 2:
+            temp1.add(next_chord)
+    temp = temp1 if harmonisation.RULE_1_ACTIVE else temp
+
+    ##############################################
+    # RULE 2 : CHORDS RESPECT CORRECT RANGES
+    temp2 = set()
+    for next_chord in temp:
+        if Chord.of_tuple(next_chord).check_ranges():
+            temp2.add(next_chord)
+    temp = temp2 if harmonisation.RULE_2_ACTIVE else temp
+
+    ####################################################################
+    # RULE 3 : LEADING NOTE GOES TO TONIC IF CURRENT GRADE IS III, V OR VII
+    #          AND THE FOLLOWING IS I, IV OR VI
+    temp3 = set()
+    for next_chord in temp:
+
+        prev_fund = Chord.simple_of(current_chord_list[0], key_degrees).fundamental
+        current_fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
+
+        # Determines whether the leading notes is considered active (need to resolve)
+        leading_active = (prev_fund == key_degrees[DOMINANT] or prev_fund == key_degrees[LEADING_TONE] or prev_fund ==
+                          key_degrees[MEDIANT]) \
+                         and (current_fund == key_degrees[TONIC] or current_fund == key_degrees[SUBDOMINANT]
+                              or current_fund == key_degrees[SUBMEDIANT])
+
+        for i, curr_note in enumerate(current_chord_list):
+            if not leading_active or \
+                    (curr_note % 12 == key_degrees[LEADING_TONE] and next_chord[i] % 12 == key_degrees[TONIC]
+                     and leading_active):
+                temp3.add(next_chord)
+    temp = temp3 if harmonisation.RULE_3_ACTIVE else temp
+
+    ##################################################################
+    # RULE 4 : A NOTE CANNOT APPEAR MORE THAT 2 TIMES IN A SAME CHORD
+    temp4 = set()
+    for next_chord in temp:
+        simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
+        correct_dupl = True
+
+        for note in simple_notes_list:
+            if simple_notes_list.count(note) > 2:
+                correct_dupl = False
+
+        if correct_dupl:
+            temp4.add(next_chord)
+    temp = temp4 if harmonisation.RULE_4_ACTIVE else temp
+
+    #############################################################################################
+    # RULE 5 : THE FIFTH NOTE HAS TO BE REPEATED FOR VII DEGREE AND CANNOT BE REPEATED OTHERWISE
+    temp5 = set()
+    for next_chord in temp:
+        fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
+        fifth = Chord.simple_of(next_chord[0], key_degrees).fifth
+        simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
+
+        if fund % 12 == key_degrees[LEADING_TONE]:
+            if simple_notes_list.count(fifth) == 2:
+                temp5.add(next_chord)
+        elif simple_notes_list.count(fifth) < 2:
+            temp5.add(next_chord)
+    temp = temp5 if harmonisation.RULE_5_ACTIVE else temp
+
+    ##############################################
+    # RULE 6 : ALL NOTES OF THE CHORD ARE PRESENT
+    temp6 = set()
+    for next_chord in temp:
+        simple_next_chord = Chord.simple_of(next_chord[0], key_degrees)
+        simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
+
+        if simple_next_chord.fundamental in simple_notes_list and simple_next_chord.third in simple_notes_list \
+                and simple_next_chord.fifth in simple_notes_list:
+            temp6.add(next_chord)
+    temp = temp6 if harmonisation.RULE_6_ACTIVE else temp
+
+    ########################################################################################################
+    # RULE 7 : THIRD DUPLICATION IS AUTHORISED WHEN THE DEGREE IS NOT I, IV AND V; AND IS MANDATORY WHEN
+    #               V -> VI chaining in major and minor tonalities (3rd duplicated in VI)
+    #               VI -> V chaining in minor tonality (3rd duplicated in VI)
+    #               VII -> I (already implemented because of the 1st and 5st rules, 3rd dup. in VII)
+    temp7 = set()
+    for next_chord in temp:
+        prev_fund = Chord.simple_of(current_chord_list[0], key_degrees).fundamental
+        next_fund = Chord.simple_of(next_chord[0], key_degrees).fundamental
+        third = Chord.simple_of(next_chord[0], key_degrees).third
+        simple_notes_list = list(map(lambda x: x % 12, list(next_chord)))
+
+        third_two_times = simple_notes_list.count(third) == 2
+
+        # Third duplication not recommended
+        third_not_recom = next_fund == key_degrees[TONIC] or next_fund == key_degrees[SUBDOMINANT] \
+                          or next_fund == key_degrees[DOMINANT]
+
+        # V -> VI chaining in major and minor tonalities (3rd dup. in VI)
+        v_vi = prev_fund == key_degrees[DOMINANT] and next_fund == key_degrees[SUBMEDIANT]
+
+        # VI -> V chaining in minor tonality (3rd dup. in VI)
+        vi_v_minor = next_fund == key_degrees[SUBMEDIANT] and \
+                     next_next_degree == key_degrees[DOMINANT] and not is_major(key_degrees)
+
+        mandatory_third = v_vi or vi_v_minor
+
+        if (mandatory_third and third_two_times) or (not mandatory_third and not (third_not_recom and third_two_times)):
+            temp7.add(next_chord)
+    temp = temp7 if harmonisation.RULE_7_ACTIVE else temp
+
+    #################################################
+    # RULE 8 : FOURTH AUGMENTED INTERVAL NOT ALLOWED
+    temp8 = set()
+    for next_chord in temp:
+
+        has_augm_interval = False
+        for i, current_note_i in enumerate(current_chord_list):
+
+            # Current note (and next note) are the leading note
+            current_note_leading = current_note_i % 12 == key_degrees[LEADING_TONE]
+            next_note_leading = next_chord[i] % 12 == key_degrees[LEADING_TONE]
+
+            # Ascending augmented forth interval
+            aug_forth_asc = current_note_i % 12 == key_degrees[SUBDOMINANT] and \
+                            next_note_leading and \
+                            next_chord[i] - current_note_i == 6
+
+            # Descending augmented forth interval
+            aug_forth_des = current_note_leading and \
+                            next_chord[i] % 12 == key_degrees[SUBDOMINANT] and \
+                            current_note_i - next_chord[i] == 6
+
+            # Ascending augmented second interval
+            aug_second_asc = current_note_i % 12 == key_degrees[SUBMEDIANT] and \
+                             next_note_leading and \
+                             next_chord[i] - current_note_i == 3
+
+            # Descending augmented second interval
+            aug_second_des = current_note_leading and \
+                             next_chord[i] % 12 == key_degrees[SUBDOMINANT] and \
+                             current_note_i - next_chord[i] == 3
+
+            # Ascending augmented fifth interval
+            aug_fifth_asc = current_note_i % 12 == key_degrees[MEDIANT] and \
+                            next_note_leading and \
+                            next_chord[i] - current_note_i == 8
+
+            # Descending augmented fifth interval
+            aug_fifth_des = current_note_leading and \
+                            next_chord[i] % 12 == key_degrees[MEDIANT] and \
+                            current_note_i - next_chord[i] == 8
+
+            # If the key is major, augmented intervals can only be fourths
+            if is_major(key_degrees):
+                if aug_forth_asc or aug_forth_des:
+                    has_augm_interval = True
+
+            # If the key is minor, augmented intervals can be fourths, fifths and seconds
+            else:
+                if aug_forth_asc or aug_forth_des or aug_second_asc or aug_second_des \
+                        or aug_fifth_asc or aug_fifth_des:
+                    has_augm_interval = True
+
+        if not has_augm_interval:
+            temp8.add(next_chord)
+    temp = temp8 if harmonisation.RULE_8_ACTIVE else temp
+
+    #########################################################################
+    # RULE 9 : TWO CONSECUTIVE FOURTHS, FIFTHS AND OCTAVES ARE NOT ALLOWED
+    temp9 = set()
+    for next_chord in temp:
+        interval_problem = False
+
+        # Compares for the not allowed consecutive intervals between the two chords
+        # for all the possible pairs of voices (voice i and a higher voice j)
+        for i, note_current_i in enumerate(current_chord_list):
+            for j in range(i, 4):
+                if i != j:
+                    # There is no common note
+                    mov = current_chord_list[j] != next_chord[j] or note_current_i != next_chord[i]
+
+                    interval_current = (current_chord_list[j] - note_current_i) % 12
+                    interval_next = (next_chord[j] - next_chord[i]) % 12
+                    if interval_current == interval_next and mov and \
+                            (interval_current == UNISON or interval_current == PERFECT_FOURTH_INTERVAL or
+                             interval_current == PERFECT_FIFTH_INTERVAL):
+                        interval_problem = True
+        if not interval_problem:
+            temp9.add(next_chord)
+    temp = temp9 if harmonisation.RULE_9_ACTIVE else temp
+
+    #########################################################################
+    # RULE 10 : DIRECT FOURTHS, FIFTHS AND OCTAVES ARE NOT ALLOWED
+    temp10 = set()
+    for next_chord in temp:
+        interval_problem = False
+
+        # Compares for the not allowed direct intervals between the two chords
+        # for all the possible pairs of voices (voice i and a higher voice j)
+        for i, note_current_i in enumerate(current_chord_list):
+            for j in range(i, 4):
+                if i != j:
+
+                    # An interval is considered direct if both voices change in the same direction
+                    # and both for more of a tone
+                    interval_next = (next_chord[j] - next_chord[i]) % 12
+                    change_chords_i = next_chord[i] - note_current_i
+                    change_chords_j = next_chord[j] - current_chord_list[j]
+
+                    if ((change_chords_i > 2 and change_chords_j > 2) or (
+                            change_chords_i < -2 and change_chords_j < -2)) \
+                            and (interval_next == UNISON or interval_next == PERFECT_FOURTH_INTERVAL
+                                 or interval_next == PERFECT_FIFTH_INTERVAL):
+                        interval_problem = True
+
+        if not interval_problem:
+            temp10.add(next_chord)
+    temp = temp10 if harmonisation.RULE_10_ACTIVE else temp
+
+    ###################################################################################
+    # RULE 11 : LEADING NOTE AND TONIC NOTE IN THE SOPRANO IF IT IS THE FINAL CADENCE
+    temp11 = set()
+    if (not is_final_cadence) or current_chord_list[0] % 12 == key_degrees[LEADING_TONE]:
+        temp11 = temp10
+    else:
+        for next_chord in temp:
+            if current_chord_list[3] % 12 == key_degrees[LEADING_TONE] and next_chord[3] % 12 == key_degrees[TONIC]:
+                temp11.add(next_chord)
+    temp = temp11 if harmonisation.RULE_11_ACTIVE else temp
+
+    return temp
+
+
+
+def old_candidates(current_chord: Chord, next_note: int, key_for_chords: Key):
+    """
+    :return: the options of the original next_chords, before filter_w_rules
+    """
+    current_chord_list = current_chord.to_list()
+    next_chord_list = [next_note]
+    next_simple_chord = Chord.simple_of(next_note, key_for_chords.value)
+    if harmonisation.MAINTAIN_COMMON_NOTES:
+        for note in current_chord_list[1:]:
+            if next_simple_chord.includes(note) and note % 12 != key_for_chords.value[LEADING_TONE]:
+                next_chord_list.append(note)
+            else:
+                next_chord_list.append(-1)
+    else:
+        next_chord_list = [next_note, -1, -1, -1]
+    return complete_transition(current_chord_list, next_chord_list, next_simple_chord)
+
+
+def random_transitions(seed: int):
+    """
+    :return: list of (key, current chord, next bass note, next next bass note, is_final_cadence), the next bass note
+             being another note than the current one (with MAINTAIN_COMMON_NOTES, the original next_chords fails on a
+             repeated bass note, and so does compute_next_chords)
+    """
+    rng = random.Random(seed)
+    transitions = []
+    while len(transitions) < NB_TRANSITIONS:
+        key = rng.choice(KEYS)
+        bass_notes = [note for note in range(MIN_B, MAX_B + 1) if note % 12 in key.value]
+        voicings = start_voicings(rng.choice(bass_notes), key)
+        if len(voicings) == 0:
+            continue
+        current = rng.choice(voicings)
+        next_note = rng.choice([note for note in bass_notes if 0 < abs(note - current.b) <= 7])
+        # Final cadences are drawn more often, and from the dominant or the leading note, so that rule 11 matters
+        if rng.random() < 0.5 and current.b % 12 in (key.value[DOMINANT], key.value[LEADING_TONE]):
+            next_note = rng.choice([note for note in bass_notes if note % 12 == key.value[TONIC]
+                                    and abs(note - current.b) <= 7] or [next_note])
+            transitions.append((key, current, next_note, -1, True))
+        else:
+            transitions.append((key, current, next_note, rng.choice(bass_notes + [-1]), rng.random() < 0.3))
+    return transitions
+
+
+# (switches turned off, MAINTAIN_COMMON_NOTES)
+SETTINGS = [((), False), ((11,), False), ((10,), False), ((10, 11), False), ((), True), ((11,), True), ((10,), True),
+            ((0, 5, 9), False), ((3, 7), True)]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_masks_match_original_filter(monkeypatch, seed):
+    transitions = random_transitions(seed)
+    for rules_off, maintain in SETTINGS:
+        for n in range(len(RULES)):
+            monkeypatch.setattr(harmonisation, "RULE_{}_ACTIVE".format(n), n not in rules_off)
+        monkeypatch.setattr(harmonisation, "MAINTAIN_COMMON_NOTES", maintain)
+        for key, current, next_note, next_next_note, is_final_cadence in transitions:
+            expected = old_filter_w_rules(current.to_list(), old_candidates(current, next_note, key), next_next_note,
+                                          is_final_cadence, key)
+            assert set(compute_next_chords(current, next_note, next_next_note, is_final_cadence, key)) == expected, \
+                (rules_off, maintain, key, current, next_note, next_next_note, is_final_cadence)
+            assert filter_w_rules(current.to_list(), old_candidates(current, next_note, key), next_next_note,
+                                  is_final_cadence, key) == expected
+
+
+def test_rule_11_on_the_final_cadence(monkeypatch):
+    # V -> I final cadence: with the leading note in the soprano, it goes to the tonic
+    current = Chord(SOL, SOL + OCTAVE, RE + 2 * OCTAVE, SI + 2 * OCTAVE)
+    assert compute_next_chords(current, DO + OCTAVE, -1, True, Key.DO_MAJOR) == ((DO + OCTAVE, SOL + OCTAVE,
+                                                                                 MI + 2 * OCTAVE, DO + 3 * OCTAVE),)
+    # Without it in the soprano, rule 11 leaves no chord, and only rule 11 does
+    current = Chord(SOL, SI, SOL + OCTAVE, RE + 2 * OCTAVE)
+    assert compute_next_chords(current, DO + OCTAVE, -1, True, Key.DO_MAJOR) == ()
+    monkeypatch.setattr(harmonisation, "RULE_11_ACTIVE", False)
+    assert len(compute_next_chords(current, DO + OCTAVE, -1, True, Key.DO_MAJOR)) > 0
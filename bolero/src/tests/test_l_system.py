@@ -0,0 +1,176 @@
+import os
+from multiprocessing.shared_memory import SharedMemory
+import pytest
+import l_system.l_system_implementation as l_system_implementation
+from l_system.l_system_data import *
+from l_system.l_system_implementation import expansion_memo, ExpansionMemo, MEMO_MAX_CHARS, file_chunks, \
+    StochasticLSystem, ProvenanceIndex
+from l_system.duration_grammar import rhythm_array
+
+"""
+The ways of running an L System (streamed, vectorised, out of core, in parallel, indexed) against LSystem.run.
+"""
+
+MAX_DEPTH = 6
+RULE_SETS = {
+    "complex": (rules_complex, initial_complex, grammar_complex),
+    "bolero": (rules_bolero, initial_bolero, grammar_bolero),
+    "slow": (rules_slow, initial_slow, grammar_slow),
+    "slow_2": (rules_slow_2, initial_slow_2, grammar_slow_2),
+    "complex_orig": (rules_complex_orig, initial_complex_orig, grammar_complex_orig),
+}
+
+
+def replace_loop(l_system: LSystem, initial: str, depth: int, show_mode: bool):
+    string = initial
+    for _ in range(depth):
+        string = l_system.replace(string, show_mode)
+    return string
+
+
+@pytest.mark.parametrize("name", sorted(RULE_SETS))
+def test_expand(name):
+    rules, initial, _ = RULE_SETS[name]
+    memo = ExpansionMemo(50)
+    for depth in range(MAX_DEPTH + 1):
+        for show_mode in (False, True):
+            expected = replace_loop(rules(), initial(), depth, show_mode)
+            assert rules().expand(initial(), depth, show_mode, memo) == expected
+            # Again, with the expansions of the memo
+            assert rules().expand(initial(), depth, show_mode, memo) == expected
+            assert memo.nb_chars <= 50
+    assert memo.hits > 0 and memo.evictions > 0
+
+
+def test_expansion_memo_stays_bounded():
+    expansion_memo.clear()
+    assert len(run_complex_for(9)) > MEMO_MAX_CHARS
+    assert 0 < expansion_memo.nb_chars <= MEMO_MAX_CHARS
+    run_complex_for(9)
+    assert expansion_memo.hits > 0
+
+
+@pytest.mark.parametrize("name", sorted(RULE_SETS))
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_iter_chunks(name, chunk_size):
+    rules, initial, _ = RULE_SETS[name]
+    for depth in range(MAX_DEPTH + 1):
+        for show_mode in (False, True):
+            chunks = list(rules().iter_chunks(initial(), depth, show_mode, chunk_size))
+            assert "".join(chunks) == rules().run(initial(), depth, show_mode)
+            assert all(len(chunk) > 0 for chunk in chunks)
+
+
+def test_iter_chunks_leaves_expansion_memo_alone():
+    expansion_memo.clear()
+    for _ in rules_complex().iter_chunks(initial_complex(), MAX_DEPTH, chunk_size=100):
+        pass
+    assert len(expansion_memo.expansions) == 0 and expansion_memo.hits + expansion_memo.misses == 0
+
+
+@pytest.mark.parametrize("name", sorted(RULE_SETS))
+def test_rhythm_array(name):
+    rules, initial, grammar = RULE_SETS[name]
+    assert rhythm_array(rules(), initial(), MAX_DEPTH, grammar()) == grammar().decode(rules().run(initial(), MAX_DEPTH))
+
+
+@pytest.mark.parametrize("name", sorted(RULE_SETS))
+def test_stochastic_with_one_rule_per_symbol(name):
+    rules, initial, _ = RULE_SETS[name]
+    l_system = rules()
+    stochastic = StochasticLSystem(*[Rule(base, replacement) for base, replacement in l_system.rules.items()])
+    for show_mode in (False, True):
+        assert stochastic.alphabet(initial(), show_mode) == l_system.alphabet(initial(), show_mode)
+        for depth in range(MAX_DEPTH + 1):
+            assert stochastic.run(initial(), depth, 0, show_mode) == l_system.run(initial(), depth, show_mode)
+
+
+@pytest.mark.parametrize("name", sorted(RULE_SETS))
+def test_run_to_file(name, tmp_path):
+    rules, initial, _ = RULE_SETS[name]
+    path = str(tmp_path / "result")
+    for depth in range(MAX_DEPTH + 1):
+        for chunk_size in (1, 5, 1000):
+            view = rules().run_to_file(initial(), depth, path, chunk_size=chunk_size)
+            assert "".join(file_chunks(view, 7)) == rules().run(initial(), depth)
+            del view
+
+
+@pytest.mark.parametrize("name", sorted(RULE_SETS))
+def test_provenance_index(name):
+    rules, initial, _ = RULE_SETS[name]
+    l_system = rules()
+    depth = 4
+    provenance = ProvenanceIndex(l_system, initial(), depth)
+    strings = [l_system.run(initial(), d) for d in range(depth + 1)]
+    # parents[d][j]: index in iteration d of the symbol which gave symbol j of iteration d + 1
+    parents = [[i for i, c in enumerate(strings[d]) for _ in l_system.rules.get(c, c)] for d in range(depth)]
+
+    for d in range(depth + 1):
+        assert provenance.string(d) == strings[d]
+    for position in range(len(strings[depth])):
+        chain = provenance.ancestry(position)
+        assert [index for _, index, _, _ in chain][-1] == position
+        for d, index, c, replacement in chain:
+            assert c == strings[d][index]
+            assert replacement == (l_system.rules.get(c) if d < depth else None)
+            if d < depth:
+                start, stop = provenance.span(d, index)
+                assert start <= position < stop
+                assert strings[depth][start:stop] == l_system.run(c, depth - d)
+        for d in range(depth):
+            assert chain[d][1] == parents[d][chain[d + 1][1]]
+    for d in range(depth + 1):
+        for c in provenance.alphabet:
+            spans = provenance.spans(d, c)
+            assert len(spans) == strings[d].count(c)
+            assert all(strings[depth][start:stop] == l_system.run(c, depth - d) for start, stop in spans)
+
+
+@pytest.mark.parametrize("name", sorted(RULE_SETS))
+def test_run_codes_parallel(name):
+    rules, initial, _ = RULE_SETS[name]
+    for chunk_size in (4, 64):
+        assert LSystem.decode(*rules().run_codes_parallel(initial(), 5, processes=2, chunk_size=chunk_size)) \
+            == rules().run(initial(), 5)
+
+
+def test_run_codes_parallel_shrink_then_grow():
+    # The generations alternate between longer and shorter than chunk_size: AX, B...BY, AAAA, B...B (80), empty
+    l_system = LSystem(Rule("A", "B" * 20), Rule("B", ""), Rule("X", "Y"), Rule("Y", "AAAA"))
+    for depth in range(6):
+        assert LSystem.decode(*l_system.run_codes_parallel("AX", depth, processes=2, chunk_size=16)) \
+            == l_system.run("AX", depth)
+
+
+REWRITE_CHUNK = l_system_implementation._rewrite_chunk
+CLOSE = SharedMemory.close
+MAIN_PID = os.getpid()
+
+
+def failing_rewrite_chunk(name, size, *args):
+    if size > 20:
+        raise ValueError("rewrite failed")
+    return REWRITE_CHUNK(name, size, *args)
+
+
+def failing_close(block):
+    # As closing a block with a view on it can fail, here in this process for the blocks of more than 20 codes
+    CLOSE(block)
+    if os.getpid() == MAIN_PID and block.size > 20:
+        raise BufferError("cannot close exported pointers exist")
+
+
+def test_run_codes_parallel_reports_the_error(monkeypatch):
+    # With chunk_size 4, the second parallel iteration fails while the codes are a view on a shared memory block
+    monkeypatch.setattr(l_system_implementation, "_rewrite_chunk", failing_rewrite_chunk)
+    blocks_before = set(os.listdir("/dev/shm"))
+    with pytest.raises(ValueError, match="rewrite failed"):
+        rules_complex().run_codes_parallel(initial_complex(), 5, processes=2, chunk_size=4)
+    assert set(os.listdir("/dev/shm")) <= blocks_before
+
+    # An error while cleaning up does not hide the one of the run, and the blocks are still unlinked
+    monkeypatch.setattr(SharedMemory, "close", failing_close)
+    with pytest.raises(ValueError, match="rewrite failed"):
+        rules_complex().run_codes_parallel(initial_complex(), 5, processes=2, chunk_size=4)
+    assert set(os.listdir("/dev/shm")) <= blocks_before
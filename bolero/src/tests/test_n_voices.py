@@ -0,0 +1,98 @@
+import random
+import numpy as np
+import pytest
+import harmonisation.harmonisation as harmonisation
+from harmonisation.n_voices import *
+
+"""
+With the SATB layout, filter_n_voices must accept exactly the chords that filter_w_rules accepts, whatever the rule
+switches and parameters.
+"""
+
+KEYS = [Key.DO_MAJOR, Key.LA_MINOR, Key.SOL_MAJOR]
+NB_TRANSITIONS = 300
+
+
+def random_transitions(seed: int):
+    """
+    :return: list of (key, current chord, next bass note, next next bass note, is_final_cadence)
+    """
+    rng = random.Random(seed)
+    transitions = []
+    while len(transitions) < NB_TRANSITIONS:
+        key = rng.choice(KEYS)
+        bass_notes = [note for note in range(MIN_B, MAX_B + 1) if note % 12 in key.value]
+        voicings = candidate_voicings(rng.choice(bass_notes), key)
+        if len(voicings) == 0:
+            continue
+        current = rng.choice(voicings)
+        next_note = rng.choice([note for note in bass_notes if abs(note - current.b) <= 7])
+        next_next_note = rng.choice(bass_notes + [-1])
+        transitions.append((key, current, next_note, next_next_note, rng.random() < 0.2))
+    return transitions
+
+
+def rule_switches():
+    """
+    :return: lists of the rules turned off: none, each rule alone, and a few random subsets
+    """
+    rng = random.Random(0)
+    return [[]] + [[n] for n in range(12)] + [rng.sample(range(12), 3) for _ in range(4)]
+
+
+def check_satb_filter(transitions):
+    """
+    Compares filter_n_voices on the candidates of n_voices_candidates with filter_w_rules on those of
+    complete_transition, both reading the current parameters.
+    """
+    for key, current, next_note, next_next_note, is_final_cadence in transitions:
+        current_notes = np.array(current.to_list(), dtype=np.int64)
+        next_simple_chord = Chord.simple_of(next_note, key.value)
+        candidates = n_voices_candidates(current_notes, next_note, next_simple_chord, satb_layout())
+        expected = filter_w_rules(current.to_list(),
+                                  complete_transition(current.to_list(), [next_note, -1, -1, -1], next_simple_chord),
+                                  next_next_note, is_final_cadence, key)
+        found = filter_n_voices(current_notes, candidates, next_next_note, is_final_cadence, key, satb_layout())
+        assert {tuple(row) for row in found.tolist()} == {tuple(option) for option in expected}, \
+            (key, current, next_note, next_next_note, is_final_cadence)
+
+
+@pytest.mark.parametrize("rules_off", rule_switches())
+def test_satb_filter_matches_filter_w_rules(monkeypatch, rules_off):
+    for n in rules_off:
+        monkeypatch.setattr(harmonisation, "RULE_{}_ACTIVE".format(n), False)
+    check_satb_filter(random_transitions(len(rules_off)))
+
+
+@pytest.mark.parametrize("settings", [
+    {"EPSILON": 4},
+    {"OVERTAKING_CADENCE": -3, "OVERTAKING_NO_CADENCE": 0},
+    {"MIN_T": DO + OCTAVE, "MAX_S": MI + 3 * OCTAVE},
+])
+def test_satb_filter_follows_the_parameters(monkeypatch, settings):
+    for name, value in settings.items():
+        monkeypatch.setattr(harmonisation, name, value)
+    check_satb_filter(random_transitions(100))
+
+
+def test_doubled_fifth_is_rejected(monkeypatch):
+    # A E A E: the fifth of VI is doubled, which rule 5 forbids with four voices
+    monkeypatch.setattr(harmonisation, "RULE_6_ACTIVE", False)
+    current_notes = np.array([12, 28, 31, 40], dtype=np.int64)
+    candidates = np.array([[9, 28, 33, 40]], dtype=np.int64)
+    assert len(filter_w_rules([12, 28, 31, 40], {(9, 28, 33, 40)}, -1, False, Key.DO_MAJOR)) == 0
+    assert len(filter_n_voices(current_notes, candidates, -1, False, Key.DO_MAJOR, satb_layout())) == 0
+
+
+def test_outer_pairs_only_is_an_opt_in():
+    ranges = [(MIN_B, MAX_B), (MIN_T, MAX_T), (MIN_T, MAX_A), (MIN_A, MAX_A), (MIN_A, MAX_S), (MIN_S, MAX_S)]
+    bass_line = [FA, SOL, DO, LA, RE, SOL, DO + OCTAVE]
+    start_chord = NChord([DO + OCTAVE, SOL + OCTAVE, DO + 2 * OCTAVE, MI + 2 * OCTAVE, SOL + 2 * OCTAVE,
+                          DO + 3 * OCTAVE])
+    layout = VoiceLayout(ranges)
+    assert len(layout.pairs_i) == 15
+    # Every pair of six voices leaves no harmonisation, the relaxed rules 9 and 10 do
+    assert NVoiceChordGraph(Key.DO_MAJOR, bass_line, layout).count(start_chord) == 0
+    relaxed = VoiceLayout(ranges, outer_pairs_only=True)
+    assert len(relaxed.pairs_i) == 9
+    assert NVoiceChordGraph(Key.DO_MAJOR, bass_line, relaxed).count(start_chord) > 0
@@ -0,0 +1,52 @@
+import pytest
+from l_system.l_system_data import *
+from l_system.periodicity import *
+
+"""
+Prefix function and periodic tails on known strings, and the convergence of rules_bolero as rhythm_main reports it.
+"""
+
+
+@pytest.mark.parametrize("sequence, expected", [
+    ("", []),
+    ("abacaba", [0, 0, 1, 0, 1, 2, 3]),
+    ("aabaaab", [0, 1, 0, 1, 2, 2, 3]),
+    ([1, 2, 1, 2, 1], [0, 0, 1, 2, 3]),
+])
+def test_prefix_function(sequence, expected):
+    assert prefix_function(sequence) == expected
+
+
+@pytest.mark.parametrize("sequence, min_repeats, ignore_last, expected", [
+    ("xyzabcabcabc", 2, 0, (3, 3)),
+    ("abcabcab", 2, 0, (3, 0)),
+    ("aaaa", 2, 0, (1, 0)),
+    ("abcd", 2, 0, None),
+    ("xabab!!", 2, 2, (2, 1)),
+    ("xyzabcabcabc", 4, 0, None),
+    ([0.5, 0.25, 0.5, 0.25, 0.5, 0.25], 3, 0, (2, 0)),
+    ("ab", 2, 2, None),
+])
+def test_tail_period(sequence, min_repeats, ignore_last, expected):
+    assert tail_period(sequence, min_repeats, ignore_last) == expected
+
+
+def test_detector_matches_tail_period():
+    string = run_bolero_for(4)
+    for window in (len(string), 50):
+        detector = PeriodicityDetector(window, ignore_last=4)
+        for start in range(0, len(string), 7):
+            detector.feed(string[start:start + 7])
+        period, offset = tail_period(string[-window:], ignore_last=4)
+        assert detector.period() == (period, offset + len(string) - min(window, len(string)))
+
+
+def test_bolero_convergence():
+    profile = list(convergence_profile(rules_bolero(), initial_bolero(), 6, ignore_last=4))
+    for depth, length, period, offset in profile:
+        string = run_bolero_for(depth)
+        assert length == len(string)
+        assert (period, offset) == (tail_period(string, ignore_last=4) or (None, None))
+    # One period of the tail is A B A C without its Z, 24 symbols
+    assert convergence_depth(rules_bolero(), initial_bolero(), 10, ignore_last=4) == (5, 24, 281)
+    assert convergence_depth(rules_bolero(), initial_bolero(), 5, ignore_last=4) is None
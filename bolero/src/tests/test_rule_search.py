@@ -0,0 +1,49 @@
+import random
+from l_system.rule_search import *
+
+"""
+Evaluation of rule sets against rules_bolero, whose tail converges to A B A C, and the random candidates of the search.
+"""
+
+# One period of the tail of rules_bolero: A B A C, without the Z of C
+BOLERO_TARGET = "ESSS" + "ESSSEE" + "ESSS" + "ESSSSSSSSS"
+
+
+def test_bolero_converges_at_depth_5():
+    evaluation = evaluate_rule_set(rules_bolero().rules, initial_bolero(), BOLERO_TARGET, ignore_last=4)
+    assert evaluation["depth"] == 5
+    assert evaluation["length"] == len(run_bolero_for(5))
+    assert evaluation["rules"] == rules_bolero().rules and "mean_duration" not in evaluation
+
+    with_durations = evaluate_rule_set(rules_bolero().rules, initial_bolero(), BOLERO_TARGET, grammar_bolero(),
+                                       ignore_last=4)
+    durations = [duration for duration in sequence_from_string_bolero(run_bolero_for(5)[:PREFIX_LENGTH])
+                 if duration is not None]
+    assert with_durations["depth"] == 5
+    assert with_durations["mean_duration"] == sum(abs(duration) for duration in durations) / len(durations)
+    assert with_durations["rest_fraction"] == sum(1 for duration in durations if duration < 0) / len(durations)
+
+
+def test_rejected_rule_sets():
+    rules = rules_bolero().rules
+    # Not converged by max_depth
+    assert evaluate_rule_set(rules, initial_bolero(), BOLERO_TARGET, max_depth=4, ignore_last=4) is None
+    # A target symbol that the rules never produce
+    assert evaluate_rule_set(rules, initial_bolero(), BOLERO_TARGET + "Q", ignore_last=4) is None
+    # Growing too fast
+    assert evaluate_rule_set({"A": "AA"}, "A", "A", max_depth=8, max_length=100) is None
+    assert evaluate_rule_set({"A": "AA"}, "A", "A", max_depth=6, max_length=100)["depth"] == 1
+
+
+def test_random_candidates():
+    rng = random.Random(0)
+    for _ in range(50):
+        rules = random_rule_set("ABC", rng, max_replacement=5)
+        assert sorted(rules) == ["A", "B", "C"]
+        assert all(1 <= len(replacement) <= 5 and set(replacement) <= set("ABC") for replacement in rules.values())
+
+        mutated = mutate_rule_set(rules, "ABC", rng)
+        changed = [base for base in rules if mutated[base] != rules[base]]
+        assert len(changed) <= 1 and len(mutated) == len(rules)
+        for base in changed:
+            assert abs(len(mutated[base]) - len(rules[base])) <= 1 and len(mutated[base]) >= 1
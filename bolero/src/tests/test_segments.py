@@ -0,0 +1,36 @@
+import random
+from harmonisation.segments import *
+
+"""
+Parallel harmonisation of segments against the ChordGraph of each segment.
+"""
+
+SEGMENT = [DO + OCTAVE, FA + OCTAVE, SOL + OCTAVE, DO + OCTAVE]
+FIRST_CHORD = Chord(DO + OCTAVE, SOL + OCTAVE, MI + 2 * OCTAVE, DO + 3 * OCTAVE)
+BASSES = [SEGMENT, SEGMENT, [DO + OCTAVE, SOL + OCTAVE, DO + OCTAVE]]
+
+
+def test_tables_match_chord_graph_counts():
+    tables = segment_tables(Key.DO_MAJOR, BASSES, FIRST_CHORD, processes=2)
+    graphs = [ChordGraph(Key.DO_MAJOR, bass[1:]) for bass in BASSES]
+    assert set(tables[0]) == {FIRST_CHORD}
+    for k, (table, graph) in enumerate(zip(tables, graphs)):
+        for start, ends in table.items():
+            assert sum(ends.values()) == graph.count(start)
+        if k > 0:
+            # Every chord the previous segment can end on has its row, without computing it on demand
+            for previous_start in tables[k - 1]:
+                assert set(tables[k - 1][previous_start]) <= set(table)
+
+
+def test_harmonise_segments_is_a_valid_chain():
+    paths = harmonise_segments(Key.DO_MAJOR, BASSES, FIRST_CHORD, processes=2, rng=random.Random(0))
+    assert len(paths) == len(BASSES)
+    previous_end = FIRST_CHORD
+    for bass, path in zip(BASSES, paths):
+        graph = ChordGraph(Key.DO_MAJOR, bass[1:])
+        assert path[0] == previous_end
+        assert [chord.b for chord in path[1:]] == bass[1:]
+        for layer in range(len(bass) - 1):
+            assert path[layer + 1] in graph.successors(path[layer], layer)
+        previous_end = path[-1]
@@ -0,0 +1,73 @@
+import pytest
+from harmonisation.service import *
+
+"""
+Requests of the harmonisation service, parsed and answered in this process (without any socket or worker).
+"""
+
+BASS = [DO + OCTAVE, FA + OCTAVE, SOL + OCTAVE, DO + OCTAVE]
+START_CHORD = [DO + OCTAVE, SOL + OCTAVE, MI + 2 * OCTAVE, DO + 3 * OCTAVE]
+
+
+def request(**fields):
+    body = {"key": "DO_MAJOR", "bass": list(BASS)}
+    body.update(fields)
+    return body
+
+
+def solve(**fields):
+    (key_name, bass), query = parse_request(request(**fields))
+    return answer(ChordGraph(Key[key_name], bass[1:]), Key[key_name], bass, query)
+
+
+@pytest.mark.parametrize("body", [
+    [],
+    {"bass": BASS},
+    {"key": "DO_MAJOR"},
+    request(key="DO"),
+    request(bass=[DO]),
+    request(bass=[DO, "FA"]),
+    request(bass=[True, FA]),
+    request(start_chord=[DO, SOL, MI]),
+    request(start_chord=[DO, SOL, MI, False]),
+    request(mode="all"),
+    request(samples=0),
+    request(samples=MAX_SAMPLES + 1),
+    request(samples=True),
+    request(samples=2.5),
+    request(seed=[1]),
+    request(seed="1"),
+    request(seed=False),
+])
+def test_invalid_requests(body):
+    with pytest.raises(ValueError):
+        parse_request(body)
+
+
+def test_count():
+    graph = ChordGraph(Key.DO_MAJOR, BASS[1:])
+    response = solve(mode="count")
+    assert response == {"count": sum(graph.count(chord) for chord in start_voicings(BASS[0], Key.DO_MAJOR)),
+                        "paths": []}
+    assert response["count"] > 0
+    assert solve(mode="count", start_chord=START_CHORD)["count"] == graph.count(Chord.of(START_CHORD))
+
+
+def test_sample():
+    graph = ChordGraph(Key.DO_MAJOR, BASS[1:])
+    response = solve(samples=20, seed=3)
+    assert len(response["paths"]) == 20
+    for path in response["paths"]:
+        chords = [Chord.of(notes) for notes in path]
+        assert [chord.b for chord in chords] == BASS
+        assert check_chord_rules(tuple(path[0]), False, Key.DO_MAJOR.value)
+        for layer in range(len(BASS) - 1):
+            assert chords[layer + 1] in graph.successors(chords[layer], layer)
+    assert solve(samples=20, seed=3) == response
+
+
+def test_best_and_feasible():
+    response = solve(mode="best", start_chord=START_CHORD)
+    assert response["paths"] == [[chord.to_list() for chord in
+                                  ChordGraph(Key.DO_MAJOR, BASS[1:]).best_path(Chord.of(START_CHORD))]]
+    assert solve(mode="feasible") == {"feasible": True}
@@ -0,0 +1,49 @@
+from collections import Counter
+import pytest
+import harmonisation.harmonisation as harmonisation
+from harmonisation.soprano import *
+
+"""
+SopranoChordGraph against the paths of the ChordGraph of the same bass line, grouped by their soprano line, under the
+default parameters and after changing them at run time.
+"""
+
+BASS = [DO + OCTAVE, FA, SOL, DO, LA, RE, SOL, SI, DO + OCTAVE]
+START_CHORD = Chord(DO + OCTAVE, DO + 2 * OCTAVE, SOL + 2 * OCTAVE, MI + 3 * OCTAVE)
+SETTINGS = [
+    {},
+    {"MAINTAIN_COMMON_NOTES": True},
+    {"EPSILON": 6},
+    {"MAX_A": SI + 2 * OCTAVE},
+    {"RULE_10_ACTIVE": False, "RULE_11_ACTIVE": False},
+]
+
+
+def all_paths(graph: ChordGraph, chord: Chord, layer: int = 0):
+    """
+    :return: every harmonisation of graph.bass_line[layer:] following chord, as lists of chords
+    """
+    if layer == len(graph.bass_line):
+        return [[]]
+    return [[next_chord] + path for next_chord in graph.successors(chord, layer)
+            for path in all_paths(graph, next_chord, layer + 1)]
+
+
+@pytest.mark.parametrize("settings", SETTINGS)
+def test_soprano_graph_matches_chord_graph_paths(settings, monkeypatch):
+    for name, value in settings.items():
+        monkeypatch.setattr(harmonisation, name, value)
+    graph = ChordGraph(Key.DO_MAJOR, BASS[1:])
+    paths = all_paths(graph, START_CHORD)
+    assert len(paths) == graph.count(START_CHORD) > 0
+
+    by_soprano = Counter(tuple(chord.s for chord in path) for path in paths)
+    for soprano_line, number in by_soprano.items():
+        soprano_graph = SopranoChordGraph(Key.DO_MAJOR, BASS[1:], soprano_line)
+        assert soprano_graph.count(START_CHORD) == number
+        best_path = soprano_graph.best_path(START_CHORD)
+        assert best_path[0] == START_CHORD and best_path[1:] in paths
+    # A soprano line that no harmonisation of the bass line follows
+    soprano_line = [START_CHORD.s] * (len(BASS) - 1)
+    assert soprano_line not in [list(line) for line in by_soprano]
+    assert SopranoChordGraph(Key.DO_MAJOR, BASS[1:], soprano_line).count(START_CHORD) == 0